@@ -0,0 +1,225 @@
+"""
+动作执行器 - 在独立线程中按时间顺序执行点击、延时校验等动作
+
+决策阶段只负责提交动作（一次入队），连续点击、点击间隔和"等待 N 秒后复查"
+都在执行器线程中完成，监控流水线在此期间继续捕获和检测。
+
+- 动作按计划执行时间排队，可按分组取消
+- 决策阶段每帧调用 observe(packet)，动作的 validate(packet) 返回 False 时
+  （新帧与动作的前提矛盾）动作被作废；正在执行的动作通过 action.cancelled 感知
+- 多个执行器可以共享一把锁（多窗口共用一个鼠标），动作执行期间持有该锁
+"""
+import contextlib
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from metrics import REGISTRY
+
+
+class Action:
+    """
+    已提交的动作
+
+    Attributes:
+        name: 动作名称（用于日志）
+        group: 分组，同组动作可一起取消
+        run_at: 计划执行时间（time.monotonic）
+        cancelled: 是否已取消/作废
+        reason: 取消原因
+        done: 动作结束（执行完成或被取消）时置位的 Event
+        result / error: 执行结果或异常
+    """
+
+    __slots__ = ('fn', 'name', 'group', 'run_at', 'validate',
+                 'cancelled', 'reason', 'done', 'result', 'error')
+
+    def __init__(self, fn, name, group, run_at, validate):
+        self.fn = fn
+        self.name = name
+        self.group = group
+        self.run_at = run_at
+        self.validate = validate
+        self.cancelled = False
+        self.reason = ''
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def cancel(self, reason=''):
+        if not self.cancelled:
+            self.cancelled = True
+            self.reason = reason
+
+    def __repr__(self):
+        return f"Action({self.name!r}, group={self.group!r}, cancelled={self.cancelled})"
+
+
+class ActionExecutor:
+    """
+    单线程定时动作队列
+
+    Args:
+        logger: 日志记录器
+        lock: 可选，多个执行器共享的锁；动作执行期间持有，等待期间被取消的动作不再执行
+    """
+
+    def __init__(self, logger=None, lock=None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.lock = lock
+
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._current = None
+        self._running = False
+        self._thread = None
+        # 执行线程是否仍在服务；只在 _cond 内修改，线程决定退出与 start() 不会交错
+        self._serving = False
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            if self._serving:
+                # 上次 stop() 时仍有动作在执行，原线程尚未决定退出，会继续服务
+                self._cond.notify_all()
+                return
+            self._serving = True
+            self._thread = threading.Thread(target=self._loop, name='action-executor', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=1.0):
+        """取消所有动作并停止执行线程"""
+        self.cancel(reason='执行器停止')
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=timeout)
+
+    def submit(self, fn, delay=0.0, name='', group=None, validate=None):
+        """
+        提交动作
+
+        Args:
+            fn: 在执行器线程中调用 fn(action)，长时间运行的动作应检查 action.cancelled
+            delay: 延迟执行的秒数
+            name: 动作名称
+            group: 分组
+            validate: 可选，validate(packet) 返回 False 时作废动作（等待中或执行中）
+
+        Returns:
+            Action
+        """
+        action = Action(fn, name or getattr(fn, '__name__', 'action'), group,
+                        time.monotonic() + max(0.0, delay), validate)
+        with self._cond:
+            heapq.heappush(self._heap, (action.run_at, next(self._seq), action))
+            self._cond.notify_all()
+        return action
+
+    def cancel(self, group=None, reason='已取消'):
+        """取消等待中和执行中的动作；group 为 None 时取消全部，返回取消的数量"""
+        count = 0
+        with self._cond:
+            for action in self._actions():
+                if (group is None or action.group == group) and not action.cancelled:
+                    self._cancel_locked(action, reason)
+                    count += 1
+            self._cond.notify_all()
+        if count:
+            REGISTRY.counter('redpocket_actions_cancelled_total', '被取消或作废的动作数').inc(count)
+        return count
+
+    def busy(self, group=None):
+        """是否有（指定分组的）动作在等待或执行"""
+        with self._cond:
+            return any(
+                not action.cancelled and (group is None or action.group == group)
+                for action in self._actions()
+            )
+
+    def _cancel_locked(self, action, reason):
+        action.cancel(reason)
+        if action is not self._current:
+            # 尚未执行的动作立即视为结束，执行中的动作在返回后结束
+            action.done.set()
+
+    def _actions(self):
+        actions = [entry[2] for entry in self._heap]
+        if self._current is not None:
+            actions.append(self._current)
+        return actions
+
+    def observe(self, packet):
+        """
+        用最新一帧的检测结果校验动作（在决策线程中每帧调用）
+
+        依次用各动作的 validate 校验，被新帧否定的动作立即作废。
+        """
+        with self._cond:
+            actions = [a for a in self._actions() if a.validate is not None and not a.cancelled]
+
+        invalidated = 0
+        for action in actions:
+            try:
+                valid = action.validate(packet)
+            except Exception as e:
+                self.logger.error(f"校验动作 {action.name} 出错: {e}")
+                valid = True
+            if not valid:
+                with self._cond:
+                    self._cancel_locked(action, '被新帧否定')
+                    self._cond.notify_all()
+                invalidated += 1
+                self.logger.info(f"动作 {action.name} 已作废: 新帧与其前提矛盾")
+        if invalidated:
+            REGISTRY.counter('redpocket_actions_cancelled_total', '被取消或作废的动作数').inc(invalidated)
+
+    def _next_action(self):
+        with self._cond:
+            while self._running:
+                while self._heap and self._heap[0][2].cancelled:
+                    heapq.heappop(self._heap)[2].done.set()
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                wait = self._heap[0][0] - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                action = heapq.heappop(self._heap)[2]
+                self._current = action
+                return action
+            # 在锁内决定退出：此后调用的 start() 会启动新线程，不会指望本线程继续服务
+            self._serving = False
+            pending = [entry[2] for entry in self._heap]
+            self._heap.clear()
+        for action in pending:
+            action.done.set()
+        return None
+
+    def _loop(self):
+        while True:
+            action = self._next_action()
+            if action is None:
+                break
+            start = time.perf_counter()
+            try:
+                with self.lock or contextlib.nullcontext():
+                    if not action.cancelled:
+                        action.result = action.fn(action)
+            except Exception as e:
+                action.error = e
+                REGISTRY.failure('action')
+                self.logger.error(f"执行动作 {action.name} 出错: {e}")
+            finally:
+                REGISTRY.stage('action').record(time.perf_counter() - start)
+                with self._cond:
+                    self._current = None
+                action.done.set()
@@ -0,0 +1,579 @@
+"""
+端到端基准测试 - 在录制的帧序列上无界面运行 捕获 → 推理 → 决策 → 点击 流程
+
+使用与主程序相同的 MonitorPipeline、RedPocketDetector 和决策→点击链
+（DetectionBus → GrabStateMachine → ActionExecutor，含状态超时、按钮稳定时长、
+已处理 track 和已处理红包记忆），点击由 MockClicker 记录而不移动鼠标。
+输出 JSON 报告，便于做回归对比：
+
+- 各阶段耗时的 p50 / p95 / p99，以及推理后端内部前处理 / 推理 / 解码的分解
+- 反应时间：目标首次出现在某帧（该帧被读取的时刻）到第一次点中该目标的时间
+- 吞吐量和进程峰值内存
+
+反应时间需要帧序列带标注：图像目录形如 dataset/images/val 时自动读取
+labels/val 下的 YOLO 标签；合成帧源自带每帧的真实位置。
+"""
+import sys
+import json
+import time
+import argparse
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime
+
+import numpy as np
+
+from action_executor import ActionExecutor
+from color_gate import ColorGate
+from detection_bus import DetectionBus
+from detector import RedPocketDetector
+from frame_diff import FrameChangeDetector
+from frame_sources import REPLAY_MODES, create_frame_source
+from metrics import REGISTRY
+from multi_monitor import MonitorTarget, MultiWindowMonitor
+from packet_memory import OpenedPacketMemory
+from pipeline import MonitorPipeline, StageStats
+from resolution_policy import ResolutionPolicy
+from state_machine import GrabStateMachine
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+TARGET_CLASSES = ('red_packet', 'open_button')
+
+
+def summarize_ms(values):
+    """耗时样本（秒）→ {count, mean, p50, p95, p99, max}（毫秒）"""
+    if not values:
+        return {'count': 0}
+    ms = np.asarray(values, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        'count': int(ms.size),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'max_ms': float(ms.max()),
+    }
+
+
+def peak_rss_mb():
+    """进程生命周期内的峰值常驻内存 (MB)"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位为 KB，macOS 为字节
+        return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1024 ** 2
+    except (ImportError, AttributeError):
+        return None
+
+
+class MockClicker:
+    """
+    模拟点击器，接口与 AutoClicker.click_center 一致，只记录点击时间和坐标
+
+    Args:
+        latency: 每次点击模拟的耗时（秒），用于近似真实鼠标事件的开销
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.clicks = []
+
+    def click_center(self, bbox, relative_to_window=True):
+        x1, y1, x2, y2 = bbox
+        center_x = (x1 + x2) // 2
+        center_y = (y1 + y2) // 2
+        if self.latency:
+            time.sleep(self.latency)
+        self.clicks.append((time.perf_counter(), center_x, center_y))
+        return center_x, center_y, True
+
+
+class ReactionTracker:
+    """
+    统计目标出现到被点击的反应时间
+
+    合成帧源的标注带 packet_id，按 packet_id 区分目标；回放标注没有身份信息，
+    此时把"目标类别从无到有"视为一个新目标，直到画面中不再有目标为止。
+    点击点落在点击时最新决策的那一帧中某个目标的标注框内即视为点中该目标。
+
+    observe_frame() 在捕获线程调用，on_click() 在动作执行器线程调用。
+    """
+
+    def __init__(self, target_classes=TARGET_CLASSES, history=512):
+        self.target_classes = set(target_classes)
+        self.history = history
+        self.reaction_times = []
+        self.appeared = 0
+        self.false_clicks = 0
+        self.repeat_clicks = 0
+        self.labelled = False
+        self._lock = threading.Lock()
+        self._frames = {}
+        self._pending = {}
+        self._resolved = set()
+        self._episode = 0
+        self._in_episode = False
+
+    def observe_frame(self, frame_id, timestamp, ground_truth):
+        if ground_truth is None:
+            return
+        targets = [gt for gt in ground_truth if gt['class_name'] in self.target_classes]
+        with self._lock:
+            self.labelled = True
+            if targets and not self._in_episode:
+                self._episode += 1
+            self._in_episode = bool(targets)
+
+            boxes = []
+            for gt in targets:
+                key = gt.get('packet_id', ('episode', self._episode))
+                if key not in self._pending and key not in self._resolved:
+                    self._pending[key] = timestamp
+                    self.appeared += 1
+                boxes.append((key, gt['bbox']))
+            self._frames[frame_id] = boxes
+            self._frames.pop(frame_id - self.history, None)
+
+    def on_click(self, frame_id, timestamp, x, y):
+        with self._lock:
+            boxes = self._frames.get(frame_id)
+            if boxes is None:
+                return
+            for key, (x1, y1, x2, y2) in boxes:
+                if x1 <= x <= x2 and y1 <= y <= y2:
+                    appeared = self._pending.pop(key, None)
+                    if appeared is None:
+                        self.repeat_clicks += 1
+                    else:
+                        self._resolved.add(key)
+                        self.reaction_times.append(timestamp - appeared)
+                    return
+            self.false_clicks += 1
+
+    def summary(self):
+        with self._lock:
+            if not self.labelled:
+                return None
+            return {
+                'reaction': summarize_ms(self.reaction_times),
+                'targets_appeared': self.appeared,
+                'targets_clicked': len(self.reaction_times),
+                'targets_missed': len(self._pending),
+                'repeat_clicks': self.repeat_clicks,
+                'false_clicks': self.false_clicks,
+            }
+
+
+class GrabSession:
+    """
+    与主程序相同的决策→点击链：DetectionBus → GrabStateMachine → ActionExecutor → MockClicker
+
+    点击在执行器线程中发生，计入 click 阶段耗时，并通知 ReactionTracker 和帧源。
+
+    Args:
+        detector: RedPocketDetector
+        source: 帧源（接收 on_click 通知）
+        tracker: ReactionTracker
+        clicker: MockClicker
+        conf: 置信度阈值
+        stats: StageStats，可选
+    """
+
+    def __init__(self, detector, source, tracker, clicker, conf, stats=None):
+        self.source = source
+        self.tracker = tracker
+        self.clicker = clicker
+        self.conf = conf
+        self.stats = stats
+        self.frame_id = 0
+        self.executor = ActionExecutor(logger)
+        self.bus = DetectionBus(logger)
+        self.grab_state = GrabStateMachine(
+            detector, self.executor,
+            focus_fn=lambda: None,
+            click_fn=self.click,
+            logger=logger,
+            memory=OpenedPacketMemory()
+        )
+        self.bus.subscribe('grab', conf=lambda: self.grab_state.detection_conf(self.conf),
+                           callback=self.handle_frame)
+
+    def inference_conf(self):
+        return self.bus.min_conf(self.conf)
+
+    def handle_frame(self, event):
+        self.frame_id = event.frame_id
+        self.executor.observe(event)
+        self.grab_state.update(event)
+
+    def click(self, bbox):
+        start = time.perf_counter()
+        x, y, success = self.clicker.click_center(bbox)
+        now = time.perf_counter()
+        if self.stats is not None:
+            self.stats.record('click', now - start)
+        self.tracker.on_click(self.frame_id, now, x, y)
+        self.source.on_click(x, y)
+        return x, y, success
+
+    def start(self):
+        self.grab_state.memory.begin_session()
+        self.executor.start()
+
+    def stop(self):
+        self.executor.stop()
+        self.grab_state.reset()
+
+
+def run_benchmark(detector, source, conf=0.5, change_detection=True, incremental=True,
+                  max_frames=None, clicker=None, drain_timeout=5.0, inference_threads=1):
+    """
+    在帧源上运行一次完整的流水线并返回报告
+
+    Args:
+        detector: 已加载模型的 RedPocketDetector
+        source: frame_sources 中的帧源
+        conf: 置信度阈值
+        change_detection: 是否启用帧差分跳过未变化的帧
+        incremental: 是否启用增量检测（需要 change_detection）
+        max_frames: 最多读取的帧数
+        clicker: 点击器，默认为 MockClicker()
+        drain_timeout: 帧源结束后等待在途帧处理完的最长时间（秒）
+        inference_threads: 流水线的推理线程数（配合推理进程池使用）
+    """
+    clicker = clicker or MockClicker()
+    tracker = ReactionTracker()
+    stats = StageStats(history=1_000_000)
+    session = GrabSession(detector, source, tracker, clicker, conf, stats)
+    if isinstance(detector.prefilter, ColorGate):
+        detector.prefilter.bypass_fn = lambda: session.grab_state.needs_full_inference
+    state = {'captured': 0, 'decided': 0, 'last_decided': 0, 'inferred': 0, 'done_at': None}
+
+    def capture():
+        if max_frames is not None and state['captured'] >= max_frames:
+            source.exhausted = True
+        result = source.read()
+        if result is None:
+            return None
+        state['captured'] += 1
+        tracker.observe_frame(state['captured'], time.perf_counter(), source.ground_truth)
+        return result
+
+    def decide(packet):
+        state['decided'] += 1
+        state['last_decided'] = packet.frame_id
+        if not packet.skipped:
+            state['inferred'] += 1
+        session.bus.publish(packet)
+
+    def should_continue():
+        if not source.exhausted:
+            return True
+        if state['done_at'] is None:
+            state['done_at'] = time.perf_counter()
+        # 帧都已决策、动作执行器中也没有待执行的点击
+        drained = state['last_decided'] >= state['captured'] and not session.executor.busy()
+        return not drained and time.perf_counter() - state['done_at'] < drain_timeout
+
+    pipeline = MonitorPipeline(
+        capture_fn=capture,
+        pace_fn=source.wait,
+        min_capture_interval=0.0,
+        detect_fn=lambda image: detector.detect(image, session.inference_conf()),
+        incremental_fn=(lambda image, change, previous: detector.detect_incremental(
+            image, change, previous, session.inference_conf())) if incremental else None,
+        decide_fn=decide,
+        stats=stats,
+        logger=logger,
+        change_detector=FrameChangeDetector() if change_detection else None,
+        inference_threads=inference_threads
+    )
+
+    REGISTRY.reset()
+    session.start()
+    start = time.perf_counter()
+    try:
+        pipeline.run(should_continue)
+    finally:
+        session.stop()
+    duration = time.perf_counter() - start
+    snapshot = REGISTRY.snapshot()
+    backend_stages = {
+        stage: summary for stage, summary in snapshot['stages'].items()
+        if stage in ('preprocess', 'inference', 'decode', 'ipc', 'gate') and summary['count']
+    }
+    gate = {
+        key.split('"')[1]: value for key, value in snapshot['counters'].items()
+        if key.startswith('redpocket_gate_total') and value
+    }
+
+    report = {
+        'frames': {
+            'captured': state['captured'],
+            'decided': state['decided'],
+            'inferred': state['inferred'],
+            'dropped': pipeline.frame_queue.dropped + pipeline.result_queue.dropped,
+            'skip_ratio': pipeline.skip_ratio,
+        },
+        'duration_s': duration,
+        'throughput_fps': state['decided'] / duration if duration else 0.0,
+        'capture_fps': state['captured'] / duration if duration else 0.0,
+        'stages': {stage: summarize_ms(stats.samples(stage)) for stage in stats.stages()},
+        'backend_stages': backend_stages,
+        'gate': gate,
+        'clicks': len(clicker.clicks),
+        'reaction': tracker.summary(),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    return report
+
+
+def run_multi_benchmark(detector, sources, conf=0.5, change_detection=True, max_batch=None,
+                        max_frames=None, click_latency=0.0, drain_timeout=5.0):
+    """
+    把多个帧源当作多个窗口，通过 MultiWindowMonitor 批量推理并返回报告
+
+    max_batch=1 时各窗口轮流单独推理，相当于 N 个独立监控循环共用一个推理线程，可作为对照。
+
+    Args:
+        detector: 已加载模型的 RedPocketDetector
+        sources: 帧源列表，每个帧源一个窗口
+        conf: 置信度阈值
+        change_detection: 是否启用帧差分
+        max_batch: 每次模型调用最多合并的帧数，默认为窗口数
+        max_frames: 每个窗口最多读取的帧数
+        click_latency: 模拟每次点击的耗时（秒）
+        drain_timeout: 帧源结束后等待在途帧处理完的最长时间（秒）
+    """
+    stats = StageStats(history=1_000_000)
+    windows = []
+
+    def make_target(index, source):
+        clicker = MockClicker(click_latency)
+        tracker = ReactionTracker()
+        session = GrabSession(detector, source, tracker, clicker, conf, stats)
+        state = {'captured': 0, 'decided': 0, 'last_decided': 0}
+        policy = ResolutionPolicy(detector.classes)
+        policy.enabled = detector.resolution_policy.enabled
+
+        def capture():
+            if max_frames is not None and state['captured'] >= max_frames:
+                source.exhausted = True
+            result = source.read()
+            if result is None:
+                return None
+            state['captured'] += 1
+            tracker.observe_frame(state['captured'], time.perf_counter(), source.ground_truth)
+            return result
+
+        def decide(packet):
+            state['decided'] += 1
+            state['last_decided'] = packet.frame_id
+            session.bus.publish(packet)
+
+        windows.append({'source': source, 'clicker': clicker, 'tracker': tracker, 'state': state,
+                        'session': session})
+        return MonitorTarget(
+            f'{source.name}#{index}', capture, decide, pace_fn=source.wait,
+            change_detector=FrameChangeDetector() if change_detection else None,
+            resolution_policy=policy,
+            prefilter=ColorGate(bypass_fn=lambda: session.grab_state.needs_full_inference)
+            if detector.prefilter is not None else None
+        )
+
+    targets = [make_target(i, source) for i, source in enumerate(sources)]
+    done = {'at': None}
+
+    def should_continue():
+        if not all(w['source'].exhausted for w in windows):
+            return True
+        if done['at'] is None:
+            done['at'] = time.perf_counter()
+        drained = all(w['state']['last_decided'] >= w['state']['captured']
+                      and not w['session'].executor.busy() for w in windows)
+        return not drained and time.perf_counter() - done['at'] < drain_timeout
+
+    monitor = MultiWindowMonitor(
+        targets,
+        lambda images, batch: detector.detect_batch(
+            images, min(w['session'].inference_conf() for w in windows), policies=[t.resolution_policy for t in batch],
+            prefilters=[t.prefilter for t in batch]),
+        max_batch=max_batch, min_capture_interval=0.0, stats=stats, logger=logger
+    )
+
+    REGISTRY.reset()
+    for w in windows:
+        w['session'].start()
+    start = time.perf_counter()
+    try:
+        monitor.run(should_continue)
+    finally:
+        for w in windows:
+            w['session'].stop()
+    duration = time.perf_counter() - start
+
+    decided = sum(w['state']['decided'] for w in windows)
+    return {
+        'windows': len(windows),
+        'max_batch': monitor.scheduler.max_batch,
+        'batches': monitor.batches,
+        'mean_batch_size': monitor.mean_batch_size,
+        'frames': {
+            'captured': sum(t.frames for t in targets),
+            'decided': decided,
+            'inferred': sum(t.inferred for t in targets),
+            'skipped': sum(t.skipped for t in targets),
+            'replaced': sum(t.replaced for t in targets),
+            'dropped': monitor.result_queue.dropped,
+        },
+        'duration_s': duration,
+        'throughput_fps': decided / duration if duration else 0.0,
+        'inferred_fps': sum(t.inferred for t in targets) / duration if duration else 0.0,
+        'stages': {stage: summarize_ms(stats.samples(stage)) for stage in stats.stages()},
+        'per_window': [
+            {
+                'name': target.name,
+                'decided': w['state']['decided'],
+                'inferred': target.inferred,
+                'clicks': len(w['clicker'].clicks),
+                'reaction': w['tracker'].summary(),
+            }
+            for target, w in zip(targets, windows)
+        ],
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='无界面端到端基准测试（检测 → 决策 → 点击）')
+    parser.add_argument('--source', choices=['replay', 'synthetic'], default='replay', help='帧源')
+    parser.add_argument('--path', default='dataset/images/val',
+                        help='回放的视频文件或图像目录；合成时为数据集目录')
+    parser.add_argument('--mode', choices=REPLAY_MODES, default='max', help='按原始节奏回放或全速回放')
+    parser.add_argument('--fps', type=float, default=None, help='回放/合成帧率')
+    parser.add_argument('--frames', type=int, default=None, help='最多处理的帧数（合成帧源默认 1000）')
+    parser.add_argument('--weights', default='models/best.pt', help='模型路径（.pt / .onnx / OpenVINO 目录）')
+    parser.add_argument('--backend', choices=['auto', 'torch', 'onnx', 'openvino'], default='auto', help='推理后端')
+    parser.add_argument('--threads', type=int, default=None, help='ONNX Runtime / OpenVINO 推理线程数')
+    parser.add_argument('--inference-workers', type=int, default=0,
+                        help='推理进程数，0 表示在主进程中推理；--threads 为每个进程的线程数')
+    parser.add_argument('--conf', type=float, default=0.5, help='置信度阈值')
+    parser.add_argument('--no-diff', action='store_true', help='关闭帧差分（每帧都推理）')
+    parser.add_argument('--no-incremental', action='store_true', help='关闭增量检测')
+    parser.add_argument('--fixed-resolution', action='store_true', help='关闭自适应推理分辨率')
+    parser.add_argument('--color-gate', action='store_true', help='启用推理前的颜色预筛选')
+    parser.add_argument('--windows', type=int, default=1,
+                        help='模拟的窗口数，大于 1 时通过 MultiWindowMonitor 跨窗口批量推理')
+    parser.add_argument('--max-batch', type=int, default=None,
+                        help='多窗口时每次模型调用最多合并的帧数，默认为窗口数；1 为逐窗口推理的对照')
+    parser.add_argument('--click-latency', type=float, default=0.0, help='模拟每次点击的耗时（毫秒）')
+    parser.add_argument('--output', default=None, help='JSON 报告路径，默认只输出到标准输出')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    detector = RedPocketDetector(logger=logger)
+    detector.num_threads = args.threads
+    detector.inference_workers = args.inference_workers
+    detector.resolution_policy.enabled = not args.fixed_resolution
+    if args.color_gate:
+        detector.prefilter = ColorGate()
+    if not Path(args.weights).exists():
+        logger.error(f"模型文件不存在: {args.weights}")
+        sys.exit(1)
+    if not detector.load_model(args.weights, backend=args.backend):
+        sys.exit(1)
+
+    def make_source(seed=0):
+        if args.source == 'synthetic':
+            return create_frame_source('synthetic', path=args.path, mode=args.mode, seed=seed,
+                                       fps=args.fps or 30.0, num_frames=args.frames or 1000)
+        return create_frame_source('replay', path=args.path, mode=args.mode,
+                                   fps=args.fps, preload=args.mode == 'max')
+
+    if args.windows > 1:
+        # 每个窗口一个独立的帧源（合成帧源使用不同的随机种子）
+        sources = [make_source(seed) for seed in range(args.windows)]
+        logger.info(f"开始多窗口基准测试: {args.windows} 个 {sources[0].name} 帧源, "
+                    f"后端 {detector.model.name}, 模式 {args.mode}")
+        result = run_multi_benchmark(
+            detector, sources, conf=args.conf,
+            change_detection=not args.no_diff,
+            max_batch=args.max_batch,
+            max_frames=args.frames,
+            click_latency=args.click_latency / 1000
+        )
+        for source in sources:
+            source.close()
+    else:
+        source = make_source()
+        logger.info(f"开始基准测试: 帧源 {source.name}, 后端 {detector.model.name}, 模式 {args.mode}")
+        result = run_benchmark(
+            detector, source, conf=args.conf,
+            change_detection=not args.no_diff,
+            incremental=not args.no_incremental,
+            max_frames=args.frames,
+            clicker=MockClicker(args.click_latency / 1000),
+            inference_threads=max(1, args.inference_workers)
+        )
+        source.close()
+    detector.close()
+
+    report = {
+        'timestamp': datetime.now().strftime("%Y%m%d_%H%M%S"),
+        'config': {
+            'source': args.source,
+            'path': args.path,
+            'mode': args.mode,
+            'weights': args.weights,
+            'backend': detector.model.name,
+            'threads': args.threads,
+            'inference_workers': args.inference_workers,
+            'conf': args.conf,
+            'change_detection': not args.no_diff,
+            'incremental': not args.no_incremental,
+            'adaptive_resolution': not args.fixed_resolution,
+            'color_gate': args.color_gate,
+            'windows': args.windows,
+            'max_batch': args.max_batch,
+        },
+        **result,
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(text, encoding='utf-8')
+        logger.info(f"基准测试报告已保存到: {args.output}")
+
+    if args.windows > 1:
+        logger.info(f"吞吐量: {result['throughput_fps']:.1f} FPS（{args.windows} 个窗口合计）, "
+                    f"平均批大小 {result['mean_batch_size']:.2f}, 峰值内存: {result['peak_rss_mb'] or 0:.0f} MB")
+        return
+
+    reaction = result['reaction']
+    if reaction and reaction['reaction']['count']:
+        logger.info(f"反应时间 p50 {reaction['reaction']['p50_ms']:.1f}ms / "
+                    f"p95 {reaction['reaction']['p95_ms']:.1f}ms / "
+                    f"p99 {reaction['reaction']['p99_ms']:.1f}ms, "
+                    f"点中 {reaction['targets_clicked']}/{reaction['targets_appeared']}")
+    logger.info(f"吞吐量: {result['throughput_fps']:.1f} FPS, 峰值内存: {result['peak_rss_mb'] or 0:.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
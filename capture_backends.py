@@ -0,0 +1,382 @@
+"""
+屏幕捕获后端 - 在 ScreenCapture 之下提供可替换的原始像素获取方式
+
+- mss: 通用跨平台实现，每帧按显示器区域抓取
+- xshm: Linux 下基于 MIT-SHM 扩展，直接对目标窗口调用 XShmGetImage，
+  共享内存段在帧间复用（窗口尺寸变化时才重建），省去经由 X 连接传输像素
+  和每帧分配缓冲区的开销
+
+所有后端的 grab() 都返回 (H, W, 4) 的 BGRA 视图，该视图指向后端内部缓冲区，
+只在下一次 grab() 之前有效，调用方应立即转换/拷贝（ScreenCapture 会写入 FrameRing）。
+"""
+import sys
+import ctypes
+import ctypes.util
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_BACKENDS = ('auto', 'mss', 'xshm')
+
+
+class CaptureBackend:
+    """捕获后端基类"""
+
+    name = ''
+
+    def grab(self, window_info, rect):
+        """
+        抓取窗口内容
+
+        Args:
+            window_info: 平台适配器返回的窗口信息
+            rect: 窗口位置 (left, top, right, bottom)
+
+        Returns:
+            np.ndarray: (H, W, 4) BGRA 视图
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """释放后端持有的资源，下一次 grab() 时会重新初始化"""
+
+
+class MssCaptureBackend(CaptureBackend):
+    name = 'mss'
+
+    def __init__(self):
+        self._sct = None
+
+    def grab(self, window_info, rect):
+        import mss
+
+        if self._sct is None:
+            self._sct = mss.mss()
+        left, top, right, bottom = rect
+        monitor = {"top": top, "left": left, "width": right - left, "height": bottom - top}
+        screenshot = self._sct.grab(monitor)
+        return np.frombuffer(screenshot.raw, dtype=np.uint8).reshape(screenshot.height, screenshot.width, 4)
+
+    def close(self):
+        if self._sct is not None:
+            try:
+                self._sct.close()
+            except Exception:
+                pass
+            self._sct = None
+
+
+class _XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ('shmseg', ctypes.c_ulong),
+        ('shmid', ctypes.c_int),
+        ('shmaddr', ctypes.c_void_p),
+        ('readOnly', ctypes.c_int),
+    ]
+
+
+class _XImage(ctypes.Structure):
+    # 只声明需要读取的前缀字段，结构体由 Xlib 分配
+    _fields_ = [
+        ('width', ctypes.c_int),
+        ('height', ctypes.c_int),
+        ('xoffset', ctypes.c_int),
+        ('format', ctypes.c_int),
+        ('data', ctypes.c_void_p),
+        ('byte_order', ctypes.c_int),
+        ('bitmap_unit', ctypes.c_int),
+        ('bitmap_bit_order', ctypes.c_int),
+        ('bitmap_pad', ctypes.c_int),
+        ('depth', ctypes.c_int),
+        ('bytes_per_line', ctypes.c_int),
+        ('bits_per_pixel', ctypes.c_int),
+    ]
+
+
+class _XErrorEvent(ctypes.Structure):
+    _fields_ = [
+        ('type', ctypes.c_int),
+        ('display', ctypes.c_void_p),
+        ('resourceid', ctypes.c_ulong),
+        ('serial', ctypes.c_ulong),
+        ('error_code', ctypes.c_ubyte),
+        ('request_code', ctypes.c_ubyte),
+        ('minor_code', ctypes.c_ubyte),
+    ]
+
+
+_XErrorHandler = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p)
+
+_Z_PIXMAP = 2
+_ALL_PLANES = ctypes.c_ulong(-1).value
+_IPC_PRIVATE = 0
+_IPC_CREAT = 0o1000
+_IPC_RMID = 0
+
+
+class _XErrorRouter:
+    """
+    进程内共享的 Xlib 错误处理函数
+
+    XSetErrorHandler 作用于整个进程（包括 Tk 自己的 X 连接），因此只安装一次：
+    本模块打开的 Display 上的错误按连接记录下来，其他连接的错误转交给安装前的处理函数。
+    最后一个连接注销时恢复原来的处理函数（期间被其他代码替换过则保持不动）；
+    回调对象属于模块级实例，不会在 Xlib 仍持有它时被释放。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._errors = {}
+        self._callback = _XErrorHandler(self._dispatch)
+        self._previous = None
+        self._installed = False
+
+    def _dispatch(self, display, event):
+        if display in self._errors:
+            self._errors[display] = _XErrorEvent.from_address(event).error_code
+            return 0
+        if self._previous:
+            return self._previous(display, event)
+        return 0
+
+    def register(self, x11, display):
+        with self._lock:
+            self._errors[display] = None
+            if not self._installed:
+                previous = x11.XSetErrorHandler(self._callback)
+                self._previous = _XErrorHandler(previous) if previous else None
+                self._installed = True
+
+    def unregister(self, x11, display):
+        with self._lock:
+            self._errors.pop(display, None)
+            if self._errors or not self._installed:
+                return
+            current = x11.XSetErrorHandler(self._previous or _XErrorHandler())
+            if current != ctypes.cast(self._callback, ctypes.c_void_p).value:
+                # 其他代码在我们之后安装了处理函数，放回原处，本函数继续留在它的调用链中
+                x11.XSetErrorHandler(_XErrorHandler(current))
+                return
+            self._installed = False
+
+    def take_error(self, display):
+        """返回并清除该连接上最近一次 X 错误码，没有错误时返回 None"""
+        code = self._errors.get(display)
+        if code is not None:
+            self._errors[display] = None
+        return code
+
+
+_ERROR_ROUTER = _XErrorRouter()
+
+
+class XShmCaptureBackend(CaptureBackend):
+    """
+    MIT-SHM 捕获后端（仅 Linux / X11）
+
+    使用独立的 Xlib 连接（通过 ctypes 调用 libX11/libXext），对 LinuxAdapter
+    找到的窗口直接抓取，坐标相对于窗口本身，因此不依赖窗口在屏幕上的位置。
+    没有合成管理器时，被遮挡部分的内容由 X 服务器决定（与 mss 抓屏幕一致）。
+
+    Xlib 连接只应在一个线程中使用（流水线中即捕获线程）。
+    本连接上的 X 错误由共享的错误处理函数记录并转换为异常，不会终止进程；
+    其他 X 连接（如 Tk）的错误仍交给原来的处理函数。
+    """
+
+    name = 'xshm'
+
+    def __init__(self):
+        self._x11 = self._load_library('X11')
+        self._xext = self._load_library('Xext')
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._declare_functions()
+
+        self._display = self._x11.XOpenDisplay(None)
+        if not self._display:
+            raise RuntimeError('无法连接 X 服务器')
+        if not self._xext.XShmQueryExtension(self._display):
+            self._x11.XCloseDisplay(self._display)
+            self._display = None
+            raise RuntimeError('X 服务器不支持 MIT-SHM 扩展')
+
+        screen = self._x11.XDefaultScreen(self._display)
+        self._visual = self._x11.XDefaultVisual(self._display, screen)
+        self._depth = self._x11.XDefaultDepth(self._display, screen)
+        if self._depth not in (24, 32):
+            self._x11.XCloseDisplay(self._display)
+            self._display = None
+            raise RuntimeError(f'不支持的颜色深度: {self._depth}')
+
+        _ERROR_ROUTER.register(self._x11, self._display)
+
+        self._shminfo = _XShmSegmentInfo()
+        self._image = None
+        self._size = None
+        self._frame = None
+
+    @staticmethod
+    def _load_library(name):
+        path = ctypes.util.find_library(name)
+        if not path:
+            raise OSError(f'未找到 lib{name}')
+        return ctypes.CDLL(path)
+
+    def _declare_functions(self):
+        x11, xext, libc = self._x11, self._xext, self._libc
+        vp, ul, c_int = ctypes.c_void_p, ctypes.c_ulong, ctypes.c_int
+        shm_p = ctypes.POINTER(_XShmSegmentInfo)
+        image_p = ctypes.POINTER(_XImage)
+
+        x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x11.XOpenDisplay.restype = vp
+        x11.XCloseDisplay.argtypes = [vp]
+        x11.XDefaultScreen.argtypes = [vp]
+        x11.XDefaultVisual.argtypes = [vp, c_int]
+        x11.XDefaultVisual.restype = vp
+        x11.XDefaultDepth.argtypes = [vp, c_int]
+        x11.XSync.argtypes = [vp, c_int]
+        x11.XFree.argtypes = [vp]
+        x11.XSetErrorHandler.argtypes = [_XErrorHandler]
+        x11.XSetErrorHandler.restype = vp
+
+        xext.XShmQueryExtension.argtypes = [vp]
+        xext.XShmCreateImage.argtypes = [vp, vp, ctypes.c_uint, c_int, vp, shm_p, ctypes.c_uint, ctypes.c_uint]
+        xext.XShmCreateImage.restype = image_p
+        xext.XShmAttach.argtypes = [vp, shm_p]
+        xext.XShmDetach.argtypes = [vp, shm_p]
+        xext.XShmGetImage.argtypes = [vp, ul, image_p, c_int, c_int, ul]
+
+        libc.shmget.argtypes = [c_int, ctypes.c_size_t, c_int]
+        libc.shmat.argtypes = [c_int, vp, c_int]
+        libc.shmat.restype = vp
+        libc.shmdt.argtypes = [vp]
+        libc.shmctl.argtypes = [c_int, c_int, vp]
+
+    def _check_error(self, what):
+        self._x11.XSync(self._display, 0)
+        code = _ERROR_ROUTER.take_error(self._display)
+        if code is not None:
+            raise RuntimeError(f'{what} 失败 (X 错误码 {code})')
+
+    def _create_segment(self, width, height):
+        self._destroy_segment()
+
+        image = self._xext.XShmCreateImage(
+            self._display, self._visual, self._depth, _Z_PIXMAP, None,
+            ctypes.byref(self._shminfo), width, height
+        )
+        if not image:
+            raise RuntimeError('XShmCreateImage 失败')
+        size = image.contents.bytes_per_line * height
+
+        shmid = self._libc.shmget(_IPC_PRIVATE, size, _IPC_CREAT | 0o600)
+        if shmid < 0:
+            self._x11.XFree(image)
+            raise OSError(ctypes.get_errno(), 'shmget 失败')
+        addr = self._libc.shmat(shmid, None, 0)
+        if addr is None or addr == ctypes.c_void_p(-1).value:
+            self._libc.shmctl(shmid, _IPC_RMID, None)
+            self._x11.XFree(image)
+            raise OSError(ctypes.get_errno(), 'shmat 失败')
+
+        self._shminfo.shmid = shmid
+        self._shminfo.shmaddr = addr
+        self._shminfo.readOnly = 0
+        image.contents.data = addr
+        self._image = image
+
+        self._xext.XShmAttach(self._display, ctypes.byref(self._shminfo))
+        try:
+            self._check_error('XShmAttach')
+        finally:
+            # 双方都已附加后立即标记删除，进程退出时段会被自动回收
+            self._libc.shmctl(shmid, _IPC_RMID, None)
+
+        stride = image.contents.bytes_per_line
+        raw = (ctypes.c_ubyte * size).from_address(addr)
+        rows = np.frombuffer(raw, dtype=np.uint8).reshape(height, stride)
+        self._frame = rows[:, :width * 4].reshape(height, width, 4)
+        self._size = (width, height)
+        logger.info(f"已创建 MIT-SHM 共享内存段: {width}x{height}, {size / 1024 ** 2:.1f} MB")
+
+    def _destroy_segment(self):
+        if self._image is None:
+            return
+        self._frame = None
+        self._xext.XShmDetach(self._display, ctypes.byref(self._shminfo))
+        self._x11.XSync(self._display, 0)
+        _ERROR_ROUTER.take_error(self._display)
+        self._libc.shmdt(ctypes.c_void_p(self._shminfo.shmaddr))
+        self._image.contents.data = None
+        self._x11.XFree(self._image)
+        self._image = None
+        self._size = None
+
+    def grab(self, window_info, rect):
+        window = window_info.get('window') if window_info else None
+        if window is None:
+            raise RuntimeError('XShm 后端需要 LinuxAdapter 提供的窗口')
+        if self._display is None:
+            raise RuntimeError('XShm 后端已关闭')
+
+        left, top, right, bottom = rect
+        size = (right - left, bottom - top)
+        if size != self._size:
+            self._create_segment(*size)
+
+        window_id = window.id if hasattr(window, 'id') else int(window)
+        ok = self._xext.XShmGetImage(self._display, window_id, self._image, 0, 0, _ALL_PLANES)
+        code = _ERROR_ROUTER.take_error(self._display)
+        if not ok or code is not None:
+            raise RuntimeError('XShmGetImage 失败')
+        return self._frame
+
+    def close(self):
+        """释放共享内存段（保留 X 连接，下一次 grab() 时重建）"""
+        if self._display is not None:
+            self._destroy_segment()
+
+    def __del__(self):
+        try:
+            self.close()
+            if self._display is not None:
+                _ERROR_ROUTER.unregister(self._x11, self._display)
+                self._x11.XCloseDisplay(self._display)
+                self._display = None
+        except Exception:
+            pass
+
+
+def is_capture_backend_available(name):
+    if name == 'mss':
+        return True
+    if name == 'xshm':
+        return sys.platform.startswith('linux') and all(
+            ctypes.util.find_library(lib) for lib in ('X11', 'Xext')
+        )
+    return False
+
+
+def create_capture_backend(name='auto'):
+    """
+    创建捕获后端
+
+    Args:
+        name: 'auto' / 'mss' / 'xshm'；'auto' 在 Linux 上优先尝试 xshm，失败时回退到 mss
+    """
+    if name not in CAPTURE_BACKENDS:
+        raise ValueError(f'未知的捕获后端: {name}')
+
+    if name in ('auto', 'xshm') and is_capture_backend_available('xshm'):
+        try:
+            return XShmCaptureBackend()
+        except Exception as e:
+            if name == 'xshm':
+                raise
+            logger.info(f"XShm 捕获不可用，使用 mss: {e}")
+    elif name == 'xshm':
+        raise RuntimeError('当前平台不支持 XShm 捕获')
+    return MssCaptureBackend()
@@ -0,0 +1,212 @@
+"""
+颜色预筛选 - 在 YOLO 推理之前用红包特有的橙红色做一次廉价的判断
+
+在降采样后的帧上做向量化的 HSV 阈值分割和连通域分析，
+画面中没有足够大的橙红色区域时直接返回空结果，不调用模型。
+以下情况总是放行，保证召回：
+- 状态机处于等待弹窗/结果页/返回的状态（按钮本身不是红色）
+- 群聊中正在确认返回/关闭按钮（被拒绝的帧会打断按钮的连续出现计时）
+- 距离上一次完整推理超过 force_interval 秒（兜底发现返回/关闭按钮等非红色目标）
+
+召回安全：validate_gate() 在带标注的 dataset/ 上统计预筛选会漏掉多少目标，
+主程序的 --color-gate safe 模式在启动时先做这项验证，召回率达不到要求则不启用。
+
+用法:
+    python color_gate.py --dataset dataset --split val
+"""
+import sys
+import json
+import time
+import logging
+import argparse
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+COLOR_GATE_MODES = ('off', 'on', 'safe')
+
+# OpenCV HSV（H: 0~180）。红包气泡为橙色（H≈15），开红包弹窗为红色（H≈0~5 / 175~180）；
+# 已领取的红包颜色较浅，饱和度低，不会通过
+DEFAULT_HSV_RANGES = (
+    ((0, 110, 120), (24, 255, 255)),
+    ((168, 110, 120), (180, 255, 255)),
+)
+
+IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+class ColorGate:
+    """
+    HSV 颜色预筛选
+
+    Args:
+        width: 降采样后的宽度（像素）
+        hsv_ranges: [(lower, upper), ...] HSV 阈值区间
+        min_area: 候选连通域的最小面积（相对降采样图面积）
+        force_interval: 距上一次放行超过该秒数时强制放行一次，<= 0 表示不强制
+        bypass_fn: 无参函数，返回 True 时直接放行（如状态机在等待弹窗）
+
+    Attributes:
+        enabled: 为 False 时 allow() 总是放行
+    """
+
+    def __init__(self, width=256, hsv_ranges=DEFAULT_HSV_RANGES, min_area=0.002,
+                 force_interval=1.0, bypass_fn=None):
+        self.width = width
+        self.hsv_ranges = [(np.array(lo, np.uint8), np.array(hi, np.uint8)) for lo, hi in hsv_ranges]
+        self.min_area = min_area
+        self.force_interval = force_interval
+        self.bypass_fn = bypass_fn
+        self.enabled = True
+        self._last_pass = None
+        self._kernel = np.ones((3, 3), np.uint8)
+
+    def mask(self, image):
+        """降采样后的二值掩码和缩放比例"""
+        h, w = image.shape[:2]
+        scale = min(1.0, self.width / w)
+        small = image if scale == 1.0 else cv2.resize(
+            image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_NEAREST)
+        hsv = cv2.cvtColor(small[..., :3], cv2.COLOR_BGR2HSV)
+        mask = None
+        for lower, upper in self.hsv_ranges:
+            part = cv2.inRange(hsv, lower, upper)
+            mask = part if mask is None else cv2.bitwise_or(mask, part)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self._kernel)
+        return mask, scale
+
+    def candidates(self, image):
+        """橙红色候选区域 [(x1, y1, x2, y2), ...]，原图坐标"""
+        mask, scale = self.mask(image)
+        min_pixels = max(4, int(self.min_area * mask.shape[0] * mask.shape[1]))
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        boxes = []
+        for x, y, w, h, area in stats[1:count]:
+            if area >= min_pixels:
+                boxes.append((int(x / scale), int(y / scale), int((x + w) / scale), int((y + h) / scale)))
+        return boxes
+
+    def allow(self, image):
+        """是否需要对该图像运行完整模型"""
+        if not self.enabled:
+            return True
+        if self.bypass_fn is not None and self.bypass_fn():
+            return self._pass('bypass')
+
+        now = time.monotonic()
+        if self.force_interval > 0 and (self._last_pass is None or now - self._last_pass >= self.force_interval):
+            return self._pass('forced')
+
+        with REGISTRY.timer('gate'):
+            has_candidates = bool(self.candidates(image))
+        if has_candidates:
+            return self._pass('pass')
+        REGISTRY.counter('redpocket_gate_total', '颜色预筛选结果', result='reject').inc()
+        return False
+
+    def _pass(self, result):
+        self._last_pass = time.monotonic()
+        REGISTRY.counter('redpocket_gate_total', '颜色预筛选结果', result=result).inc()
+        return True
+
+
+def _intersects(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def validate_gate(gate, dataset_dir='dataset', split='val', classes=('red_packet', 'open_button'),
+                  class_names=None, limit=None):
+    """
+    在带标注的数据集上验证预筛选的召回
+
+    Args:
+        gate: ColorGate
+        dataset_dir: 数据集目录（images/<split> 与 labels/<split>）
+        split: 数据集划分
+        classes: 需要预筛选保证召回的类别（非红色的按钮由状态机放行和定时强制推理兜底）
+        class_names: 类别名称列表，默认从 dataset.yaml 读取
+        limit: 最多验证的图像数
+
+    Returns:
+        dict: images / positive_images / image_recall / boxes / box_recall /
+              negative_images / negative_reject_rate / mean_ms / missed（漏检的图像文件名）
+    """
+    from config_utils import load_classes_from_config
+    from frame_sources import read_yolo_labels
+
+    class_names = class_names or load_classes_from_config('dataset.yaml', logger)
+    image_dir = Path(dataset_dir) / 'images' / split
+    label_dir = Path(dataset_dir) / 'labels' / split
+    if not image_dir.is_dir():
+        raise FileNotFoundError(f'数据集图像目录不存在: {image_dir}')
+    paths = sorted(p for p in image_dir.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)[:limit]
+
+    positives = passed = boxes_total = boxes_covered = negatives = rejected = 0
+    missed = []
+    elapsed = 0.0
+    for path in paths:
+        image = cv2.imread(str(path))
+        if image is None:
+            continue
+        h, w = image.shape[:2]
+        labels = [label for label in read_yolo_labels(label_dir / f'{path.stem}.txt', w, h, class_names)
+                  if label['class_name'] in classes]
+        start = time.perf_counter()
+        candidates = gate.candidates(image)
+        elapsed += time.perf_counter() - start
+
+        if not labels:
+            negatives += 1
+            rejected += not candidates
+            continue
+        positives += 1
+        passed += bool(candidates)
+        if not candidates:
+            missed.append(path.name)
+        for label in labels:
+            boxes_total += 1
+            boxes_covered += any(_intersects(label['bbox'], c) for c in candidates)
+
+    images = positives + negatives
+    return {
+        'images': images,
+        'positive_images': positives,
+        'image_recall': passed / positives if positives else 1.0,
+        'boxes': boxes_total,
+        'box_recall': boxes_covered / boxes_total if boxes_total else 1.0,
+        'negative_images': negatives,
+        'negative_reject_rate': rejected / negatives if negatives else 0.0,
+        'mean_ms': elapsed / images * 1000 if images else 0.0,
+        'missed': missed,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='在带标注的数据集上验证颜色预筛选的召回')
+    parser.add_argument('--dataset', default='dataset', help='数据集目录')
+    parser.add_argument('--split', default='val', help='数据集划分')
+    parser.add_argument('--width', type=int, default=256, help='降采样宽度')
+    parser.add_argument('--min-area', type=float, default=0.002, help='候选连通域最小相对面积')
+    parser.add_argument('--limit', type=int, default=None, help='最多验证的图像数')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    gate = ColorGate(width=args.width, min_area=args.min_area)
+    try:
+        report = validate_gate(gate, args.dataset, args.split, limit=args.limit)
+    except FileNotFoundError as e:
+        logger.error(str(e))
+        sys.exit(1)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
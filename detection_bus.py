@@ -0,0 +1,128 @@
+"""
+检测结果广播总线 - 一个生产者（监控流水线），多个订阅者
+
+流水线每帧只推理一次，并以所有订阅者中最低的置信度阈值运行；
+总线把同一份原始结果按各订阅者自己的阈值过滤后，在发布线程中依次回调各订阅者；
+需要跨帧的逻辑（如按钮的稳定确认）由订阅者自己在回调中累积状态（见 GrabStateMachine），
+不再自己调用捕获和模型。
+
+    bus = DetectionBus()
+    sub = bus.subscribe('grab', conf=lambda: 0.5, callback=handle)
+    pipeline = MonitorPipeline(..., decide_fn=bus.publish,
+                               detect_fn=lambda image: detector.detect(image, bus.min_conf(0.5)))
+"""
+import logging
+import threading
+
+from metrics import REGISTRY
+
+
+class DetectionEvent:
+    """
+    分发给订阅者的一帧检测结果（与 FramePacket 的常用字段一致）
+
+    Attributes:
+        frame_id / image / rect / timestamp / scroll_offset: 来自原始 FramePacket
+        detections: 按订阅者阈值过滤后的检测结果
+        conf: 过滤所用的阈值
+        packet: 原始 FramePacket
+    """
+
+    __slots__ = ('frame_id', 'image', 'rect', 'timestamp', 'scroll_offset', 'detections', 'conf', 'packet')
+
+    def __init__(self, packet, detections, conf):
+        self.frame_id = packet.frame_id
+        self.image = packet.image
+        self.rect = packet.rect
+        self.timestamp = packet.timestamp
+        self.scroll_offset = getattr(packet, 'scroll_offset', 0)
+        self.detections = detections
+        self.conf = conf
+        self.packet = packet
+
+
+def _filter(detections, conf):
+    if conf is None:
+        return detections
+    if hasattr(detections, 'filter_confidence'):
+        return detections.filter_confidence(conf)
+    return [det for det in detections if det['confidence'] >= conf]
+
+
+class Subscription:
+    """
+    总线订阅
+
+    Args:
+        bus: 所属总线
+        name: 订阅名称（用于日志）
+        conf: 置信度阈值，可以是数值、无参函数（每帧求值）或 None（不过滤）
+        callback: 可选，每帧在发布线程中调用 callback(event)
+    """
+
+    def __init__(self, bus, name, conf=None, callback=None):
+        self.bus = bus
+        self.name = name
+        self.conf = conf
+        self.callback = callback
+
+    def current_conf(self):
+        return self.conf() if callable(self.conf) else self.conf
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class DetectionBus:
+    """
+    检测结果广播总线（线程安全）
+
+    Args:
+        logger: 日志记录器
+    """
+
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._subscriptions = []
+
+    def subscribe(self, name, conf=None, callback=None):
+        subscription = Subscription(self, name, conf, callback)
+        with self._lock:
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def min_conf(self, default):
+        """所有订阅者中最低的阈值，作为流水线推理的阈值；没有订阅者设置阈值时返回 default"""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        confs = [c for c in (s.current_conf() for s in subscriptions) if c is not None]
+        return min(confs) if confs else default
+
+    def publish(self, packet):
+        """发布一帧（流水线决策阶段调用），同一阈值的订阅者共享同一份过滤结果"""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+
+        filtered = {}
+        deliveries = []
+        for subscription in subscriptions:
+            conf = subscription.current_conf()
+            event = filtered.get(conf)
+            if event is None:
+                event = filtered[conf] = DetectionEvent(packet, _filter(packet.detections, conf), conf)
+            deliveries.append((subscription, event))
+
+        for subscription, event in deliveries:
+            if subscription.callback is None:
+                continue
+            try:
+                subscription.callback(event)
+            except Exception as e:
+                REGISTRY.failure('subscriber')
+                self.logger.error(f"订阅者 {subscription.name} 处理检测结果出错: {e}")
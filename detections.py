@@ -0,0 +1,181 @@
+"""
+列式检测结果 - 以数组结构 (struct-of-arrays) 保存一帧的全部检测框
+
+解码时只做一次设备到主机的拷贝，边界框、置信度、类别分别存放在
+NumPy 数组中；原有的"字典列表"接口通过惰性适配器保留，
+只有在按下标访问或迭代时才会构造字典。
+
+构造时按整数类别 ID 一次性分桶，每个桶内按置信度降序排列，
+因此"某类别置信度最高的目标"是 O(1) 查询。
+"""
+import numpy as np
+
+
+class Detections:
+    """
+    一帧的检测结果
+
+    可以像原来的 list[dict] 一样使用（len、迭代、下标、布尔判断），
+    每个字典包含 'bbox'、'confidence'、'class'、'class_name' 四个键。
+
+    Attributes:
+        boxes: (N, 4) float32 数组，xyxy 格式
+        confidences: (N,) float32 数组
+        class_ids: (N,) int32 数组
+        class_names: 类别名称列表，按类别 ID 索引
+    """
+
+    __slots__ = ('boxes', 'confidences', 'class_ids', 'class_names',
+                 '_dicts', '_class_index')
+
+    _EMPTY_INDEX = np.empty(0, dtype=np.intp)
+
+    def __init__(self, boxes, confidences, class_ids, class_names):
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.confidences = np.asarray(confidences, dtype=np.float32).reshape(-1)
+        self.class_ids = np.asarray(class_ids, dtype=np.int32).reshape(-1)
+        self.class_names = class_names
+        self._dicts = None
+        self._class_index = self._build_class_index()
+
+    def _build_class_index(self):
+        """按类别分桶，桶内按置信度降序: {class_id: 下标数组}"""
+        if len(self.class_ids) == 0:
+            return {}
+        order = np.lexsort((-self.confidences, self.class_ids))
+        sorted_ids = self.class_ids[order]
+        starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+        ends = np.r_[starts[1:], len(order)]
+        return {
+            int(sorted_ids[start]): order[start:end]
+            for start, end in zip(starts, ends)
+        }
+
+    @classmethod
+    def empty(cls, class_names):
+        return cls(np.empty((0, 4), np.float32), np.empty(0, np.float32),
+                   np.empty(0, np.int32), class_names)
+
+    @classmethod
+    def from_result(cls, result, class_names):
+        """
+        从 ultralytics 的单个 Results 对象构造
+
+        boxes.data 的列为 [x1, y1, x2, y2, (track_id), conf, cls]，
+        整块拷贝到主机后再切片，每帧只有一次设备同步。
+        """
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            return cls.empty(class_names)
+        data = boxes.data.cpu().numpy()
+        return cls(data[:, :4], data[:, -2], data[:, -1], class_names)
+
+    @classmethod
+    def concat(cls, parts, class_names):
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls.empty(class_names)
+        if len(parts) == 1:
+            return parts[0]
+        return cls(np.concatenate([p.boxes for p in parts]),
+                   np.concatenate([p.confidences for p in parts]),
+                   np.concatenate([p.class_ids for p in parts]),
+                   class_names)
+
+    def __len__(self):
+        return self.class_ids.shape[0]
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def class_name(self, class_id):
+        class_id = int(class_id)
+        if 0 <= class_id < len(self.class_names):
+            return self.class_names[class_id]
+        return f'class_{class_id}'
+
+    def _make_dict(self, i):
+        x1, y1, x2, y2 = self.boxes[i]
+        cls = int(self.class_ids[i])
+        return {
+            'bbox': (int(x1), int(y1), int(x2), int(y2)),
+            'confidence': float(self.confidences[i]),
+            'class': cls,
+            'class_name': self.class_name(cls)
+        }
+
+    def to_list(self):
+        """转换为原来的字典列表格式（结果会被缓存）"""
+        if self._dicts is None:
+            self._dicts = [self._make_dict(i) for i in range(len(self))]
+        return self._dicts
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __getitem__(self, index):
+        if self._dicts is not None:
+            return self._dicts[index]
+        if isinstance(index, slice):
+            return self.to_list()[index]
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError('detection index out of range')
+        return self._make_dict(index)
+
+    def __repr__(self):
+        return f'Detections(n={len(self)})'
+
+    def select(self, indices):
+        """按下标数组或布尔掩码取子集"""
+        return Detections(self.boxes[indices], self.confidences[indices],
+                          self.class_ids[indices], self.class_names)
+
+    def class_indices(self, class_id):
+        """返回属于指定类别的检测框下标，按置信度降序"""
+        return self._class_index.get(class_id, self._EMPTY_INDEX)
+
+    def has_class(self, class_id):
+        return class_id in self._class_index
+
+    def best_index(self, class_id):
+        """返回指定类别中置信度最高的检测框下标，不存在时返回 None"""
+        indices = self._class_index.get(class_id)
+        if indices is None:
+            return None
+        return int(indices[0])
+
+    def best(self, class_id):
+        """返回指定类别中置信度最高的检测框字典，不存在时返回 None"""
+        index = self.best_index(class_id)
+        if index is None:
+            return None
+        return self[index]
+
+    def of_class_list(self, class_id):
+        """返回指定类别的字典列表，按置信度降序"""
+        return [self[int(i)] for i in self.class_indices(class_id)]
+
+    def of_class(self, class_id):
+        """返回只包含指定类别的子集"""
+        return self.select(self.class_indices(class_id))
+
+    def scale(self, sx, sy=None):
+        """返回坐标按比例缩放后的副本"""
+        boxes = self.boxes.copy()
+        boxes[:, [0, 2]] *= sx
+        boxes[:, [1, 3]] *= sx if sy is None else sy
+        return Detections(boxes, self.confidences, self.class_ids, self.class_names)
+
+    def filter_confidence(self, conf_threshold):
+        """返回置信度不低于阈值的子集"""
+        return self.select(self.confidences >= conf_threshold)
+
+    def translate(self, dx=0, dy=0):
+        """返回整体平移后的副本"""
+        boxes = self.boxes.copy()
+        boxes[:, [0, 2]] += dx
+        boxes[:, [1, 3]] += dy
+        return Detections(boxes, self.confidences, self.class_ids, self.class_names)
@@ -0,0 +1,396 @@
+"""
+红包检测器 - 封装模型加载、推理分辨率策略、增量检测和按类别查找目标
+
+不依赖 GUI 和鼠标控制，可以在无显示器的环境中（例如基准测试）单独使用。
+"""
+import logging
+
+from config_utils import load_classes_from_config
+from detections import Detections
+from resolution_policy import FrameResizer, ResolutionPolicy, round_up_to_stride
+from inference_backends import (
+    TorchBackend, backend_for_path, create_backend, export_model,
+    is_backend_available, sample_images, self_check
+)
+from inference_workers import WorkerPoolBackend
+
+
+class RedPocketDetector:
+    """
+    红包检测器类，使用YOLO模型进行目标检测
+    
+    Attributes:
+        model: 推理后端实例（TorchBackend / OnnxRuntimeBackend / OpenVINOBackend）
+        model_path: 模型文件路径
+        classes: 类别名称列表
+        device: 运行设备（cpu或cuda）
+        logger: 日志记录器
+        backend_preference: 推理后端偏好，'auto' 时在 CPU 上优先使用 OpenVINO，其次 ONNX Runtime
+        num_threads: ONNX Runtime / OpenVINO 的推理线程数，None 时自动选择；使用推理进程池时为每个进程的线程数
+        inference_workers: 推理进程数，> 0 时模型在 WorkerPoolBackend 的工作进程中运行
+        resolution_policy: 推理分辨率策略，空闲时使用较小的推理尺寸
+        incremental_margin: 增量检测时变化区域向外扩展的像素数
+        incremental_max_area: 变化区域超过画面面积该比例时退化为整帧检测
+        max_incremental_frames: 连续增量检测的最大次数，超过后强制整帧检测以消除累计误差
+    """
+    
+    BOX_COLORS = {
+        'red_packet': (0, 255, 0),
+        'open_button': (255, 0, 0),
+        'amount_text': (0, 0, 255),
+        'close_button': (255, 255, 0),
+        'back_button': (255, 128, 0),
+        'opened_red_packet': (128, 128, 128),
+        'play_button': (0, 255, 255)
+    }
+    
+    # 点击决策的优先级：开红包按钮 > 红包 > 返回按钮 > 关闭按钮
+    TARGET_PRIORITY = ('open_button', 'red_packet', 'back_button', 'close_button')
+    
+    def __init__(self, model_path=None, logger=None, config_path='dataset.yaml'):
+        """
+        初始化红包检测器
+        
+        Args:
+            model_path: 模型文件路径，可选
+            logger: 日志记录器，可选
+            config_path: 数据集配置文件路径，默认为dataset.yaml
+        """
+        self.model = None
+        self.model_path = model_path
+        self.device = 'cpu'
+        self.logger = logger or logging.getLogger('RedPocketDetector')
+        self.classes = load_classes_from_config(config_path, self.logger)
+        self.class_name_to_id = {name: i for i, name in enumerate(self.classes)}
+
+        self.backend_preference = 'auto'
+        self.num_threads = None
+        self.inference_workers = 0
+        self.resolution_policy = ResolutionPolicy(self.classes)
+        self.resizer = FrameResizer()
+        # 可选的推理前预筛选（如 color_gate.ColorGate），allow(image) 为 False 时跳过模型
+        self.prefilter = None
+
+        self.incremental_margin = 32
+        self.incremental_max_area = 0.5
+        self.max_incremental_frames = 20
+        self.incremental_count = 0
+
+    def _get_best_device(self):
+        """
+        自动检测并返回最佳可用设备
+        优先级: CUDA > MPS > RKNPU > CPU
+        """
+        import torch
+        
+        # 1. 检查 NVIDIA CUDA
+        if torch.cuda.is_available():
+            self.logger.info(f"检测到 CUDA 设备: {torch.cuda.get_device_name(0)}")
+            return 'cuda'
+        
+        # 2. 检查 Apple MPS (Apple Silicon)
+        if hasattr(torch.backends, 'mps') and torch.backends.mps.is_available():
+            self.logger.info("检测到 Apple MPS 设备")
+            return 'mps'
+        
+        # 3. 检查 Rockchip RKNPU (RK3588/RK3568 等)
+        try:
+            import rknnlite
+            self.logger.info("检测到 Rockchip RKNPU 设备")
+            return 'rknpu'
+        except ImportError:
+            pass
+        
+        # 4. 回退到 CPU
+        self.logger.warning("未检测到可用的硬件加速设备，使用 CPU")
+        return 'cpu'
+
+    def load_model(self, model_path, backend=None):
+        """
+        加载模型
+
+        .pt 权重先以 PyTorch 后端加载；在 CPU 上且已安装 OpenVINO / ONNX Runtime 时，
+        会导出（或复用已缓存的）对应模型并通过启动自检后切换过去。
+        直接传入 .onnx 文件或 OpenVINO IR 目录时使用对应后端加载。
+
+        Args:
+            model_path: 模型文件路径
+            backend: 推理后端 'auto' / 'torch' / 'onnx' / 'openvino'，默认使用 self.backend_preference
+        """
+        previous = self.model
+        try:
+            import torch
+            self.device = self._get_best_device()
+            self.logger.info(f"使用设备: {self.device}")
+            
+            path_backend = backend_for_path(model_path)
+            if path_backend != 'torch':
+                self.model = create_backend(path_backend, model_path, self.classes,
+                                            num_threads=self.num_threads)
+            else:
+                self.model = TorchBackend(model_path, self.classes, self.device)
+                self._switch_to_exported_backend(model_path, backend or self.backend_preference)
+            if self.inference_workers > 0:
+                self._start_worker_pool()
+            self.model_path = model_path
+            if previous is not None and previous is not self.model:
+                previous.close()
+            self.logger.info(f"推理后端: {self.model.name}")
+            return True
+        except ImportError as e:
+            self.logger.error(f"导入依赖库失败: {e}，请确保已安装torch和ultralytics")
+            return False
+        except FileNotFoundError as e:
+            self.logger.error(f"模型文件不存在: {model_path}")
+            return False
+        except RuntimeError as e:
+            self.logger.error(f"模型加载或设备切换失败: {e}")
+            return False
+        except Exception as e:
+            self.logger.error(f"加载模型失败: {e}")
+            return False
+
+    def _switch_to_exported_backend(self, weights_path, backend):
+        """在 CPU 上尝试切换到导出的 OpenVINO / ONNX Runtime 后端，失败时保留 PyTorch 后端"""
+        if backend == 'torch' or self.device != 'cpu':
+            return
+        candidates = ['openvino', 'onnx'] if backend == 'auto' else [backend]
+        reference = self.model
+        for name in candidates:
+            if not is_backend_available(name):
+                if backend != 'auto':
+                    self.logger.warning(f"未安装 {name} 运行时，继续使用 PyTorch 后端")
+                continue
+            try:
+                exported = export_model(weights_path, name, reference.imgsz, self.logger)
+                candidate = create_backend(name, exported, self.classes,
+                                           imgsz=reference.imgsz, num_threads=self.num_threads)
+            except Exception as e:
+                self.logger.warning(f"{name} 后端初始化失败: {e}")
+                continue
+            if self_check(reference, candidate, sample_images(), log=self.logger):
+                self.model = candidate
+                return
+
+    def _start_worker_pool(self):
+        """把已加载的模型换成推理进程池，每个工作进程各自加载同一个模型；启动失败时保留进程内推理"""
+        local = self.model
+        try:
+            self.model = WorkerPoolBackend(
+                local.model_path, self.classes, backend=local.name, device=self.device,
+                imgsz=None if local.name == 'torch' else local.imgsz,
+                num_workers=self.inference_workers, threads_per_worker=self.num_threads
+            )
+        except Exception as e:
+            self.logger.warning(f"推理进程池启动失败，继续在主进程中推理: {e}")
+
+    def close(self):
+        """释放推理后端（停止推理进程池）"""
+        if self.model is not None:
+            self.model.close()
+
+    def detect(self, image, conf_threshold=0.5):
+        """
+        执行目标检测
+
+        启用分辨率策略时，空闲状态以小尺寸推理寻找候选；发现红包候选后
+        对同一帧以全分辨率重新推理，保证点击决策始终基于全分辨率结果。
+        设置了 prefilter 且预筛选未通过时直接返回空结果。
+
+        Returns:
+            Detections: 列式检测结果，可按原来的字典列表方式使用
+        """
+        if self.model is None:
+            return Detections.empty(self.classes)
+        if self.prefilter is not None and not self.prefilter.allow(image):
+            return Detections.empty(self.classes)
+        
+        policy = self.resolution_policy
+        full_imgsz = policy.active_imgsz or self.model.imgsz
+        if not policy.enabled:
+            return self._predict(image, conf_threshold, self.model.imgsz)
+        
+        if policy.is_active():
+            detections = self._predict(image, conf_threshold, full_imgsz)
+            policy.observe(detections)
+            return detections
+        
+        candidates = self._predict(image, max(0.05, conf_threshold - policy.idle_conf_margin), policy.idle_imgsz)
+        if policy.observe(candidates):
+            return self._predict(image, conf_threshold, full_imgsz)
+        return candidates.filter_confidence(conf_threshold)
+
+    def _predict(self, image, conf_threshold, imgsz):
+        """按最长边预缩放到推理尺寸后推理，并把结果映射回原图坐标"""
+        h, w = image.shape[:2]
+        imgsz = min(imgsz, round_up_to_stride(max(h, w)))
+        resized, (sx, sy) = self.resizer.resize(image, imgsz)
+        detections = self.model.predict(resized, conf_threshold, imgsz)
+        if sx == 1.0 and sy == 1.0:
+            return detections
+        return detections.scale(1 / sx, 1 / sy)
+
+    def _predict_batch(self, images, conf_threshold, imgsz):
+        """
+        批量版 _predict：逐张按最长边预缩放后一次推理，结果映射回各自的原图坐标
+
+        推理尺寸不超过批内最大图像的最长边（按步长取整）；
+        推理进程池后端只需把缩放后的小图复制进共享内存。
+        """
+        imgsz = min(imgsz, max(round_up_to_stride(max(image.shape[:2])) for image in images))
+        resized = [self.resizer.resize(image, imgsz, reuse=False) for image in images]
+        batch = self.model.predict_batch([image for image, _ in resized], conf_threshold, imgsz)
+        return [detections if sx == 1.0 and sy == 1.0 else detections.scale(1 / sx, 1 / sy)
+                for detections, (_, (sx, sy)) in zip(batch, resized)]
+
+    def detect_batch(self, images, conf_threshold=0.5, policies=None, prefilters=None):
+        """
+        批量检测：多个窗口的帧合并为尽量少的模型调用
+
+        与 detect() 的分辨率策略一致：空闲的图像以小尺寸整批推理，其中发现候选的
+        再以全分辨率整批重新推理；活跃的图像直接以全分辨率推理。每批最多三次模型调用。
+
+        Args:
+            images: BGR 图像列表（尺寸可以不同）
+            conf_threshold: 置信度阈值
+            policies: 与 images 对应的 ResolutionPolicy 列表（每个窗口一个），默认共用 self.resolution_policy
+            prefilters: 与 images 对应的预筛选列表（元素可为 None），默认共用 self.prefilter
+
+        Returns:
+            list[Detections]: 与 images 一一对应
+        """
+        results = [Detections.empty(self.classes) for _ in images]
+        if self.model is None:
+            return results
+        policies = policies or [self.resolution_policy] * len(images)
+        prefilters = prefilters or [self.prefilter] * len(images)
+
+        full, idle = {}, {}
+        for i, image in enumerate(images):
+            if prefilters[i] is not None and not prefilters[i].allow(image):
+                continue
+            policy = policies[i]
+            full_imgsz = policy.active_imgsz or self.model.imgsz
+            if not policy.enabled:
+                full.setdefault(self.model.imgsz, []).append(i)
+            elif policy.is_active():
+                full.setdefault(full_imgsz, []).append(i)
+            else:
+                idle.setdefault((policy.idle_imgsz, policy.idle_conf_margin), []).append(i)
+
+        for (imgsz, margin), indices in idle.items():
+            candidates = self._predict_batch(
+                [images[i] for i in indices], max(0.05, conf_threshold - margin), imgsz)
+            for i, detections in zip(indices, candidates):
+                if policies[i].observe(detections):
+                    full.setdefault(policies[i].active_imgsz or self.model.imgsz, []).append(i)
+                else:
+                    results[i] = detections.filter_confidence(conf_threshold)
+
+        for imgsz, indices in full.items():
+            detections = self._predict_batch([images[i] for i in indices], conf_threshold, imgsz)
+            for i, result in zip(indices, detections):
+                if policies[i].enabled:
+                    policies[i].observe(result)
+                results[i] = result
+        return results
+
+    def detect_incremental(self, image, change, previous_detections, conf_threshold=0.5):
+        """
+        增量检测：只对变化区域推理，其余区域复用按滚动量平移后的上一帧结果
+
+        变化区域直接以全分辨率推理（不经过预筛选），分辨率策略根据合并后的结果更新，
+        沿用的旧目标同样会让策略保持在全分辨率。
+
+        Args:
+            image: 当前帧
+            change: frame_diff.FrameChange，提供变化区域和滚动量
+            previous_detections: 上一次推理得到的 Detections
+            conf_threshold: 置信度阈值
+
+        Returns:
+            Detections: 合并后的检测结果
+        """
+        if self.model is None:
+            return Detections.empty(self.classes)
+        h, w = image.shape[:2]
+        if (change is None or change.dirty_rect is None or change.is_full_frame
+                or previous_detections is None
+                or self.incremental_count >= self.max_incremental_frames):
+            self.incremental_count = 0
+            return self.detect(image, conf_threshold)
+
+        margin = self.incremental_margin
+        dx1, dy1, dx2, dy2 = change.dirty_rect
+        x1, y1 = max(0, dx1 - margin), max(0, dy1 - margin)
+        x2, y2 = min(w, dx2 + margin), min(h, dy2 + margin)
+
+        if (x2 - x1) * (y2 - y1) > self.incremental_max_area * w * h:
+            self.incremental_count = 0
+            return self.detect(image, conf_threshold)
+
+        self.incremental_count += 1
+
+        boxes = previous_detections.boxes
+        shifted_y1 = boxes[:, 1] - change.scroll_dy
+        shifted_y2 = boxes[:, 3] - change.scroll_dy
+        overlaps_roi = ((boxes[:, 0] < x2) & (boxes[:, 2] > x1)
+                        & (shifted_y1 < y2) & (shifted_y2 > y1))
+        keep = (shifted_y1 >= 0) & (shifted_y2 <= h) & ~overlaps_roi
+        kept = previous_detections.select(keep).translate(dy=-change.scroll_dy)
+
+        full_imgsz = self.resolution_policy.active_imgsz or self.model.imgsz
+        fresh = self._predict(image[y1:y2, x1:x2], conf_threshold, full_imgsz).translate(x1, y1)
+        merged = Detections.concat([kept, fresh], self.classes)
+        if self.resolution_policy.enabled:
+            self.resolution_policy.observe(merged)
+        return merged
+
+    def class_id(self, class_name):
+        """类别名称 → 整数类别 ID，未知类别返回 None"""
+        return self.class_name_to_id.get(class_name)
+
+    def find_best(self, detections, class_name):
+        """返回指定类别置信度最高的检测结果，不存在时返回 None"""
+        class_id = self.class_name_to_id.get(class_name)
+        if class_id is None:
+            return None
+        return detections.best(class_id)
+
+    def select_target(self, detections, classes=None):
+        """
+        按点击优先级选择目标
+        
+        Args:
+            detections: 检测结果
+            classes: 参与选择的类别，默认为 TARGET_PRIORITY；顺序即优先级
+        
+        Returns:
+            tuple: (类别名称, 检测结果字典)，没有目标时返回 (None, None)
+        """
+        for class_name in classes or self.TARGET_PRIORITY:
+            target = self.find_best(detections, class_name)
+            if target:
+                return class_name, target
+        return None, None
+
+    def _find_class(self, detections, class_name):
+        class_id = self.class_name_to_id.get(class_name)
+        if class_id is None:
+            return []
+        return detections.of_class_list(class_id)
+
+    def find_red_packets(self, detections):
+        return self._find_class(detections, 'red_packet')
+    
+    def find_open_button(self, detections):
+        return self._find_class(detections, 'open_button')
+    
+    def find_back_button(self, detections):
+        return self._find_class(detections, 'back_button')
+    
+    def find_close_button(self, detections):
+        return self._find_class(detections, 'close_button')
+    
+    def find_play_button(self, detections):
+        return self._find_class(detections, 'play_button')
@@ -0,0 +1,98 @@
+"""
+帧缓冲环 - 为屏幕捕获提供可复用的整帧缓冲区
+
+捕获结果直接转换到预分配的缓冲区中，对外只提供只读视图。
+缓冲区是否仍被使用通过引用计数判断：只要还有任何视图或切片
+指向某块缓冲区，它就不会被下一帧覆盖，稳定运行时每帧不再分配整帧内存。
+"""
+import sys
+import platform
+import threading
+
+import cv2
+import numpy as np
+
+
+class FrameRing:
+    """
+    可复用的整帧缓冲环
+
+    缓冲区是否空闲依赖 CPython 的引用计数（sys.getrefcount）：环本身之外
+    还有任何视图、切片或 FramePacket 持有某块缓冲区时，它的引用计数高于基线，不会被复用。
+    在其他解释器（如 PyPy）上引用计数不可靠，每帧都分配新的缓冲区，而不是冒险复用。
+
+    Args:
+        size: 初始缓冲区数量
+        max_size: 所有缓冲区都在使用时最多扩容到的数量；超过后临时分配不入环的缓冲区
+
+    Attributes:
+        allocations: 累计分配的缓冲区数量（用于确认稳定状态下不再分配）
+    """
+
+    def __init__(self, size=4, max_size=16):
+        self.size = max(1, size)
+        self.max_size = max(self.size, max_size)
+        self.allocations = 0
+        self._buffers = []
+        self._shape = None
+        self._next = 0
+        self._lock = threading.Lock()
+        self._free_refcount = self._calibrate_refcount()
+
+    def _calibrate_refcount(self):
+        """测量"无外部引用"时缓冲区的引用计数基线（与解释器版本相关）；非 CPython 返回 None"""
+        if platform.python_implementation() != 'CPython':
+            return None
+        probe = [np.empty(1, dtype=np.uint8)]
+        return self._refcount(probe, 0)
+
+    @staticmethod
+    def _refcount(buffers, index):
+        return sys.getrefcount(buffers[index])
+
+    def _allocate(self, shape):
+        self.allocations += 1
+        return np.empty(shape, dtype=np.uint8)
+
+    def _acquire(self, shape):
+        if self._free_refcount is None:
+            return self._allocate(shape)
+        if shape != self._shape:
+            self._buffers = [self._allocate(shape) for _ in range(self.size)]
+            self._shape = shape
+            self._next = 0
+
+        count = len(self._buffers)
+        for offset in range(count):
+            index = (self._next + offset) % count
+            if self._refcount(self._buffers, index) <= self._free_refcount:
+                self._next = (index + 1) % count
+                return self._buffers[index]
+
+        buffer = self._allocate(shape)
+        if count < self.max_size:
+            self._buffers.append(buffer)
+        return buffer
+
+    def convert(self, src, code, channels=3):
+        """
+        将 src 做颜色空间转换写入空闲缓冲区，返回只读视图
+
+        Args:
+            src: 源图像（例如 mss 原始缓冲区上的 BGRA 视图）
+            code: cv2 颜色转换代码，如 cv2.COLOR_BGRA2BGR
+            channels: 目标通道数
+        """
+        shape = (src.shape[0], src.shape[1], channels)
+        with self._lock:
+            buffer = self._acquire(shape)
+            cv2.cvtColor(src, code, dst=buffer)
+            view = buffer.view()
+        view.flags.writeable = False
+        return view
+
+    def reset(self):
+        with self._lock:
+            self._buffers = []
+            self._shape = None
+            self._next = 0
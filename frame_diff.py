@@ -0,0 +1,215 @@
+"""
+帧差分检测 - 判断新帧与上一帧相比是否发生了有意义的变化
+
+将帧降采样为灰度图后按块统计变化像素数，只有变化块数量超过阈值时
+才认为画面发生了变化，时钟跳动、光标闪烁这类细微变化会被忽略。
+"""
+import cv2
+import numpy as np
+
+
+class FrameChange:
+    """
+    单次帧差分的结果
+
+    Attributes:
+        changed: 画面是否发生了有意义的变化
+        dirty_rect: 变化区域在原图中的外接矩形 (x1, y1, x2, y2)，无变化时为 None
+        changed_tiles: 发生变化的块数量，-1 表示整帧视为变化
+        scroll_dy: 估计的垂直滚动量（原图像素），正值表示内容向上滚动、新内容出现在底部
+    """
+
+    __slots__ = ('changed', 'dirty_rect', 'changed_tiles', 'scroll_dy')
+
+    def __init__(self, changed, dirty_rect=None, changed_tiles=0, scroll_dy=0):
+        self.changed = changed
+        self.dirty_rect = dirty_rect
+        self.changed_tiles = changed_tiles
+        self.scroll_dy = scroll_dy
+
+    @property
+    def is_full_frame(self):
+        return self.changed_tiles < 0
+
+
+class FrameChangeDetector:
+    """
+    基于降采样灰度图分块绝对差的帧变化检测器
+
+    Args:
+        downscale: 降采样步长，原图每隔 downscale 个像素取一个
+        tile_size: 降采样图上的分块边长
+        pixel_threshold: 灰度差超过该值的像素视为变化像素
+        min_tile_pixels: 块内变化像素数达到该值时视为变化块
+        min_changed_tiles: 变化块数达到该值时视为画面变化
+        max_skip_frames: 连续跳过的最大帧数，超过后强制视为变化，防止长期漏检
+        ignore_regions: 需要忽略的区域列表，元素为归一化坐标 (x1, y1, x2, y2)
+        detect_scroll: 是否通过行相关估计聊天窗口的垂直滚动
+        max_scroll_ratio: 搜索滚动量的上限，占画面高度的比例
+    """
+
+    def __init__(self, downscale=4, tile_size=16, pixel_threshold=12,
+                 min_tile_pixels=6, min_changed_tiles=1, max_skip_frames=30,
+                 ignore_regions=None, detect_scroll=True, max_scroll_ratio=0.5):
+        self.downscale = max(1, int(downscale))
+        self.tile_size = max(1, int(tile_size))
+        self.pixel_threshold = pixel_threshold
+        self.min_tile_pixels = min_tile_pixels
+        self.min_changed_tiles = min_changed_tiles
+        self.max_skip_frames = max_skip_frames
+        self.ignore_regions = list(ignore_regions or [])
+        self.detect_scroll = detect_scroll
+        self.max_scroll_ratio = max_scroll_ratio
+
+        self._prev_gray = None
+        self._ignore_mask = None
+        self._skipped_in_row = 0
+        self.total_frames = 0
+        self.skipped_frames = 0
+
+    @property
+    def skip_ratio(self):
+        """被判定为未变化（可跳过推理）的帧占比"""
+        if self.total_frames == 0:
+            return 0.0
+        return self.skipped_frames / self.total_frames
+
+    def reset(self):
+        self._prev_gray = None
+        self._ignore_mask = None
+        self._skipped_in_row = 0
+
+    def reset_stats(self):
+        self.total_frames = 0
+        self.skipped_frames = 0
+
+    def _to_gray(self, image):
+        small = image[::self.downscale, ::self.downscale]
+        if small.ndim == 3:
+            code = cv2.COLOR_BGRA2GRAY if small.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+            return cv2.cvtColor(np.ascontiguousarray(small), code)
+        return np.ascontiguousarray(small)
+
+    def _build_ignore_mask(self, shape):
+        if not self.ignore_regions:
+            return None
+        h, w = shape
+        mask = np.ones(shape, dtype=bool)
+        for x1, y1, x2, y2 in self.ignore_regions:
+            mask[int(y1 * h):int(np.ceil(y2 * h)), int(x1 * w):int(np.ceil(x2 * w))] = False
+        return mask
+
+    def _tile_counts(self, mask):
+        row_starts = np.arange(0, mask.shape[0], self.tile_size)
+        col_starts = np.arange(0, mask.shape[1], self.tile_size)
+        return np.add.reduceat(
+            np.add.reduceat(mask.astype(np.int32), row_starts, axis=0),
+            col_starts, axis=1
+        )
+
+    def _estimate_scroll(self, prev, gray):
+        """
+        用行均值剖面的相关性估计垂直滚动量（降采样图上的行数）
+
+        当前帧第 r 行对应上一帧第 r + s 行时返回 s；找不到明显优于
+        不滚动的偏移时返回 0。
+        """
+        cur_profile = gray.mean(axis=1, dtype=np.float32)
+        prev_profile = prev.mean(axis=1, dtype=np.float32)
+        n = cur_profile.shape[0]
+        max_shift = int(n * self.max_scroll_ratio)
+        if max_shift < 1:
+            return 0
+
+        best_shift = 0
+        best_err = float(np.abs(cur_profile - prev_profile).mean())
+        for shift in range(1, max_shift + 1):
+            up = float(np.abs(cur_profile[:n - shift] - prev_profile[shift:]).mean())
+            if up < best_err:
+                best_shift, best_err = shift, up
+            down = float(np.abs(cur_profile[shift:] - prev_profile[:n - shift]).mean())
+            if down < best_err:
+                best_shift, best_err = -shift, down
+        return best_shift
+
+    def _scroll_compensated_mask(self, prev, gray, shift):
+        """按滚动量对齐两帧后计算变化掩码，滚动露出的新区域整体视为变化"""
+        n = gray.shape[0]
+        mask = np.ones(gray.shape, dtype=bool)
+        if shift > 0:
+            mask[:n - shift] = cv2.absdiff(gray[:n - shift], prev[shift:]) > self.pixel_threshold
+        else:
+            shift = -shift
+            mask[shift:] = cv2.absdiff(gray[shift:], prev[:n - shift]) > self.pixel_threshold
+        return mask
+
+    def _full_change(self, image):
+        h, w = image.shape[:2]
+        return FrameChange(True, (0, 0, w, h), -1)
+
+    def check(self, image):
+        """
+        将新帧与基准帧比较
+
+        只有判定为变化时才把新帧记为下一次比较的基准，这样缓慢累积的变化
+        最终也会超过阈值，而不会在逐帧比较中被"稀释"掉。
+
+        Args:
+            image: BGR/BGRA/灰度图像
+
+        Returns:
+            FrameChange: 比较结果
+        """
+        self.total_frames += 1
+        gray = self._to_gray(image)
+        prev = self._prev_gray
+
+        if prev is None or prev.shape != gray.shape:
+            self._prev_gray = gray
+            self._ignore_mask = self._build_ignore_mask(gray.shape)
+            self._skipped_in_row = 0
+            return self._full_change(image)
+
+        mask = cv2.absdiff(gray, prev) > self.pixel_threshold
+        if self._ignore_mask is not None:
+            mask &= self._ignore_mask
+
+        changed_tiles = self._tile_counts(mask) >= self.min_tile_pixels
+        n_changed = int(changed_tiles.sum())
+
+        if n_changed < self.min_changed_tiles:
+            if self._skipped_in_row < self.max_skip_frames:
+                self._skipped_in_row += 1
+                self.skipped_frames += 1
+                return FrameChange(False)
+            self._skipped_in_row = 0
+            self._prev_gray = gray
+            return self._full_change(image)
+
+        self._skipped_in_row = 0
+        self._prev_gray = gray
+
+        shift = self._estimate_scroll(prev, gray) if self.detect_scroll else 0
+        if shift != 0:
+            shifted_mask = self._scroll_compensated_mask(prev, gray, shift)
+            if self._ignore_mask is not None:
+                shifted_mask &= self._ignore_mask
+            shifted_tiles = self._tile_counts(shifted_mask) >= self.min_tile_pixels
+            if int(shifted_tiles.sum()) < n_changed:
+                changed_tiles = shifted_tiles
+            else:
+                shift = 0
+
+        rows = np.flatnonzero(changed_tiles.any(axis=1))
+        cols = np.flatnonzero(changed_tiles.any(axis=0))
+        if rows.size == 0:
+            return self._full_change(image)
+        step = self.tile_size * self.downscale
+        h, w = image.shape[:2]
+        dirty_rect = (
+            int(cols[0] * step),
+            int(rows[0] * step),
+            int(min(w, (cols[-1] + 1) * step)),
+            int(min(h, (rows[-1] + 1) * step)),
+        )
+        return FrameChange(True, dirty_rect, n_changed, shift * self.downscale)
@@ -0,0 +1,468 @@
+"""
+帧源 - 监控流水线的输入抽象
+
+- ScreenCaptureSource: 实时窗口捕获（包装 ScreenCapture）
+- ReplaySource: 回放视频文件或图像目录，支持按原始节奏回放和全速回放
+- SyntheticSource: 将 dataset/ 中标注的红包截图合成到模拟聊天背景上
+
+所有帧源的 read() 返回 (image, rect)，与 ScreenCapture.capture_window() 一致；
+结束时返回 None 并将 exhausted 置为 True。非实时帧源的 is_live 为 False，
+此时点击不应作用到真实屏幕上。
+"""
+import time
+import random
+import logging
+import threading
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from config_utils import load_classes_from_config
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg')
+VIDEO_SUFFIXES = ('.mp4', '.avi', '.mkv', '.mov', '.webm')
+REPLAY_MODES = ('timed', 'max')
+
+
+def _precise_sleep_until(deadline):
+    """睡眠到 deadline（time.perf_counter 时间），最后 2ms 自旋等待以提高精度"""
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return
+        if remaining > 0.002:
+            time.sleep(remaining - 0.002)
+
+
+def read_yolo_labels(label_path, width, height, class_names):
+    """读取 YOLO 格式标签，返回 [{'bbox', 'class', 'class_name'}]，像素坐标"""
+    label_path = Path(label_path)
+    if not label_path.exists():
+        return []
+    boxes = []
+    with open(label_path, 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) != 5:
+                continue
+            cls = int(parts[0])
+            xc, yc, bw, bh = (float(v) for v in parts[1:])
+            x1, y1 = (xc - bw / 2) * width, (yc - bh / 2) * height
+            x2, y2 = (xc + bw / 2) * width, (yc + bh / 2) * height
+            boxes.append({
+                'bbox': (int(x1), int(y1), int(x2), int(y2)),
+                'class': cls,
+                'class_name': class_names[cls] if 0 <= cls < len(class_names) else f'class_{cls}'
+            })
+    return boxes
+
+
+class FrameSource:
+    """
+    帧源基类
+
+    Attributes:
+        name: 帧源名称（用于日志）
+        is_live: 是否为真实屏幕（决定点击是否真正执行）
+        exhausted: 帧源是否已结束
+        frame_index: 最近一次 read() 返回的帧序号（从 0 开始）
+        ground_truth: 最近一帧的标注 [{'bbox', 'class', 'class_name'}]，没有标注时为 None
+    """
+
+    name = ''
+    is_live = False
+
+    def __init__(self):
+        self.exhausted = False
+        self.frame_index = -1
+        self.ground_truth = None
+
+    def wait(self):
+        """阻塞到下一帧应当被读取的时间（按节奏回放时使用），默认不等待"""
+
+    def read(self):
+        raise NotImplementedError
+
+    def on_click(self, x, y):
+        """通知帧源发生了一次点击（帧坐标），非实时帧源可以据此模拟点击后的画面变化"""
+
+    def close(self):
+        pass
+
+
+class ScreenCaptureSource(FrameSource):
+    """实时窗口捕获"""
+
+    name = 'screen'
+    is_live = True
+
+    def __init__(self, screen_capture):
+        super().__init__()
+        self.screen_capture = screen_capture
+
+    def read(self):
+        result = self.screen_capture.capture_window()
+        if result is not None:
+            self.frame_index += 1
+        return result
+
+    def close(self):
+        self.screen_capture.reset_mss()
+
+
+class _PacedSource(FrameSource):
+    """
+    按媒体时间戳回放的帧源基类
+
+    mode='timed' 时 wait() 按帧的媒体时间（除以 speed）对齐到单调时钟，
+    落后时不追帧也不跳帧，只是不再等待；mode='max' 时不等待。
+    """
+
+    def __init__(self, mode='timed', speed=1.0, loop=False):
+        super().__init__()
+        if mode not in REPLAY_MODES:
+            raise ValueError(f'未知的回放模式: {mode}')
+        self.mode = mode
+        self.speed = speed
+        self.loop = loop
+        self._start = None
+        self._next_media_time = 0.0
+
+    def _media_time(self, index):
+        raise NotImplementedError
+
+    def wait(self):
+        if self.mode != 'timed':
+            return
+        if self._start is None:
+            self._start = time.perf_counter()
+            return
+        _precise_sleep_until(self._start + self._next_media_time / self.speed)
+
+    def _advance(self, index):
+        self.frame_index = index
+        self._next_media_time = self._media_time(index + 1)
+
+    def rewind(self):
+        self._start = None
+        self._next_media_time = 0.0
+        self.frame_index = -1
+        self.exhausted = False
+
+
+class ReplaySource(_PacedSource):
+    """
+    回放视频文件或图像目录
+
+    图像目录按文件名排序，以 fps 作为帧率；如果目录形如 images/<split>，
+    会自动读取对应 labels/<split> 下的 YOLO 标签作为 ground_truth。
+
+    Args:
+        path: 视频文件或图像目录
+        mode: 'timed' 按原始节奏回放，'max' 全速回放
+        fps: 图像目录的帧率；视频文件默认使用文件自身的帧率
+        speed: 按节奏回放时的倍速
+        loop: 结束后是否从头开始
+        preload: 图像目录是否预先全部解码到内存（全速压测时避免受磁盘 I/O 限制）
+        class_names: 标签的类别名称列表，默认从 dataset.yaml 读取
+    """
+
+    name = 'replay'
+
+    def __init__(self, path, mode='timed', fps=None, speed=1.0, loop=False,
+                 preload=False, class_names=None):
+        super().__init__(mode, speed, loop)
+        self.path = Path(path)
+        self._capture = None
+        self._frames = None
+        self._images = []
+        self._labels_dir = None
+
+        if self.path.is_dir():
+            self._images = sorted(p for p in self.path.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+            if not self._images:
+                raise ValueError(f'目录中没有图像: {self.path}')
+            self.fps = fps or 10.0
+            labels_dir = self.path.parent.parent / 'labels' / self.path.name
+            if self.path.parent.name == 'images' and labels_dir.exists():
+                self._labels_dir = labels_dir
+                self.class_names = class_names or load_classes_from_config('dataset.yaml', logger)
+            if preload:
+                self._frames = [cv2.imread(str(p)) for p in self._images]
+        elif self.path.suffix.lower() in VIDEO_SUFFIXES:
+            self._capture = cv2.VideoCapture(str(self.path))
+            if not self._capture.isOpened():
+                raise ValueError(f'无法打开视频: {self.path}')
+            self.fps = fps or self._capture.get(cv2.CAP_PROP_FPS) or 30.0
+        else:
+            raise ValueError(f'不支持的回放源: {self.path}')
+
+        logger.info(f"回放源: {self.path} ({len(self)} 帧, {self.fps:.1f} FPS, 模式 {mode})")
+
+    def __len__(self):
+        if self._capture is not None:
+            return int(self._capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        return len(self._images)
+
+    def _media_time(self, index):
+        return index / self.fps
+
+    def _read_image(self, index):
+        if self._frames is not None:
+            return self._frames[index]
+        return cv2.imread(str(self._images[index]))
+
+    def _next_image(self):
+        """读取下一张可读的图像，跳过无法解码的文件；返回 (序号, 图像)，结束时返回 None"""
+        index = self.frame_index + 1
+        unreadable = 0
+        while unreadable < len(self._images):
+            if index >= len(self._images):
+                if not self.loop:
+                    return None
+                self.rewind()
+                index = 0
+            image = self._read_image(index)
+            if image is not None:
+                return index, image
+            logger.warning(f"无法读取图像: {self._images[index]}")
+            self._advance(index)
+            unreadable += 1
+            index += 1
+        logger.error(f"目录中没有可读取的图像: {self.path}")
+        return None
+
+    def read(self):
+        if self.exhausted:
+            return None
+        index = self.frame_index + 1
+
+        if self._capture is not None:
+            ok, image = self._capture.read()
+            if not ok and self.loop:
+                self._capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                self.rewind()
+                index = 0
+                ok, image = self._capture.read()
+            if not ok:
+                self.exhausted = True
+                return None
+        else:
+            result = self._next_image()
+            if result is None:
+                self.exhausted = True
+                return None
+            index, image = result
+
+        self._advance(index)
+        h, w = image.shape[:2]
+        if self._labels_dir is not None:
+            label_path = self._labels_dir / (self._images[index].stem + '.txt')
+            self.ground_truth = read_yolo_labels(label_path, w, h, self.class_names)
+        return image, (0, 0, w, h)
+
+    def close(self):
+        if self._capture is not None:
+            self._capture.release()
+            self._capture = None
+        self._frames = None
+
+
+class SyntheticSource(_PacedSource):
+    """
+    合成帧源 - 把数据集中标注的红包截图合成到模拟聊天背景上
+
+    从 dataset/images/<split> 中按 YOLO 标签裁出 crop_classes 类别的目标，
+    在浅灰色聊天背景上不断追加"消息"（文字气泡或红包），新消息出现在底部，
+    旧消息整体上移，与真实聊天窗口的滚动方式一致；两条消息之间画面保持不变。每一帧的红包位置
+    通过 ground_truth 给出，appeared_frame 记录红包首次出现的帧序号。
+    被 on_click() 点中的红包变为灰色的"已领取"红包（opened_red_packet）。
+
+    Args:
+        dataset_dir: 数据集目录
+        split: 裁剪目标使用的数据集划分
+        size: 输出帧尺寸 (宽, 高)
+        fps: 帧率（timed 模式下的节奏）
+        message_interval: 平均每隔多少帧出现一条新消息
+        packet_probability: 新消息是红包的概率
+        num_frames: 总帧数，None 表示无限
+        crop_classes: 裁剪的类别
+        seed: 随机种子，固定后生成的序列可复现
+    """
+
+    name = 'synthetic'
+
+    BACKGROUND = (237, 237, 237)
+    BUBBLE_COLORS = ((255, 255, 255), (119, 232, 149))
+
+    def __init__(self, dataset_dir='dataset', split='train', size=(720, 1280), fps=30.0,
+                 message_interval=15, packet_probability=0.3, num_frames=None,
+                 mode='timed', speed=1.0, crop_classes=('red_packet',), seed=0,
+                 class_names=None):
+        super().__init__(mode, speed, loop=False)
+        self.width, self.height = size
+        self.fps = fps
+        self.message_interval = message_interval
+        self.packet_probability = packet_probability
+        self.num_frames = num_frames
+        self.class_names = class_names or load_classes_from_config('dataset.yaml', logger)
+        self._rng = random.Random(seed)
+        self._crops = self._load_crops(Path(dataset_dir), split, crop_classes)
+        if not self._crops:
+            raise ValueError(f'数据集中没有可用的 {crop_classes} 标注: {dataset_dir}/images/{split}')
+
+        self._canvas = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self._messages = []
+        self._frame = None
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._opened_class = (self.class_names.index('opened_red_packet')
+                              if 'opened_red_packet' in self.class_names else -1)
+        self._next_message = 0
+        self._packet_serial = 0
+        logger.info(f"合成帧源: {len(self._crops)} 个目标截图, {self.width}x{self.height}, {fps:.1f} FPS")
+
+    def _load_crops(self, dataset_dir, split, crop_classes):
+        image_dir = dataset_dir / 'images' / split
+        label_dir = dataset_dir / 'labels' / split
+        if not image_dir.exists():
+            return []
+        max_width = int(self.width * 0.7)
+        crops = []
+        for image_path in sorted(image_dir.iterdir()):
+            if image_path.suffix.lower() not in IMAGE_SUFFIXES:
+                continue
+            label_path = label_dir / (image_path.stem + '.txt')
+            if not label_path.exists():
+                continue
+            image = cv2.imread(str(image_path))
+            if image is None:
+                continue
+            h, w = image.shape[:2]
+            for box in read_yolo_labels(label_path, w, h, self.class_names):
+                if box['class_name'] not in crop_classes:
+                    continue
+                x1, y1, x2, y2 = box['bbox']
+                crop = image[max(0, y1):y2, max(0, x1):x2]
+                if crop.size == 0:
+                    continue
+                if crop.shape[1] > max_width:
+                    scale = max_width / crop.shape[1]
+                    crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+                crops.append((box['class'], box['class_name'], np.ascontiguousarray(crop)))
+        return crops
+
+    def __len__(self):
+        return self.num_frames if self.num_frames is not None else 0
+
+    def _media_time(self, index):
+        return index / self.fps
+
+    def _new_message(self, frame_index):
+        margin = 24
+        incoming = self._rng.random() < 0.5
+        if self._rng.random() < self.packet_probability:
+            class_id, class_name, crop = self._rng.choice(self._crops)
+            self._packet_serial += 1
+            message = {
+                'crop': crop, 'class': class_id, 'class_name': class_name,
+                'height': crop.shape[0], 'width': crop.shape[1],
+                'appeared_frame': frame_index, 'packet_id': self._packet_serial
+            }
+        else:
+            width = self._rng.randint(self.width // 5, int(self.width * 0.6))
+            lines = self._rng.randint(1, 3)
+            message = {
+                'crop': None, 'height': 28 * lines + 20, 'width': width,
+                'color': self.BUBBLE_COLORS[0 if incoming else 1], 'lines': lines
+            }
+        message['x'] = margin + 56 if incoming else self.width - margin - 56 - message['width']
+        gap = 20
+        for existing in self._messages:
+            existing['y'] -= message['height'] + gap
+        message['y'] = self.height - margin - message['height']
+        self._messages.append(message)
+        self._messages = [m for m in self._messages if m['y'] + m['height'] > 0]
+
+    def _render(self):
+        canvas = self._canvas
+        canvas[:] = self.BACKGROUND
+        ground_truth = []
+        for m in self._messages:
+            x, y, w, h = m['x'], m['y'], m['width'], m['height']
+            top = max(0, y)
+            if m['crop'] is None:
+                cv2.rectangle(canvas, (x, top), (x + w, y + h), m['color'], -1)
+                for line in range(m['lines']):
+                    ly = y + 18 + line * 28
+                    if 0 <= ly < self.height:
+                        cv2.line(canvas, (x + 12, ly), (x + w - 12 - 30 * (line % 2), ly), (90, 90, 90), 6)
+            else:
+                canvas[top:y + h, x:x + w] = m['crop'][top - y:]
+                ground_truth.append({
+                    'bbox': (x, top, x + w, y + h),
+                    'class': m['class'],
+                    'class_name': m['class_name'],
+                    'packet_id': m['packet_id'],
+                    'appeared_frame': m['appeared_frame']
+                })
+        return canvas, ground_truth
+
+    def read(self):
+        if self.exhausted:
+            return None
+        index = self.frame_index + 1
+        if self.num_frames is not None and index >= self.num_frames:
+            self.exhausted = True
+            return None
+
+        with self._lock:
+            if index >= self._next_message or self._frame is None:
+                self._new_message(index)
+                self._next_message = index + self._rng.randint(
+                    max(1, self.message_interval // 2), self.message_interval * 3 // 2 + 1
+                )
+                self._dirty = True
+            if self._dirty:
+                image, self.ground_truth = self._render()
+                # 画面变化时才重新合成，并返回新的数组，下游可以像对待捕获帧一样长期持有
+                self._frame = image.copy()
+                self._frame.flags.writeable = False
+                self._dirty = False
+            frame = self._frame
+        self._advance(index)
+        return frame, (0, 0, self.width, self.height)
+
+    def on_click(self, x, y):
+        with self._lock:
+            for m in self._messages:
+                if (m['crop'] is None or m['class'] == self._opened_class
+                        or not (m['x'] <= x <= m['x'] + m['width'] and m['y'] <= y <= m['y'] + m['height'])):
+                    continue
+                gray = cv2.cvtColor(m['crop'], cv2.COLOR_BGR2GRAY)
+                m['crop'] = cv2.cvtColor(cv2.addWeighted(gray, 0.5, gray, 0, 110), cv2.COLOR_GRAY2BGR)
+                m['class'] = self._opened_class
+                m['class_name'] = 'opened_red_packet'
+                self._dirty = True
+                return
+
+
+def create_frame_source(kind, screen_capture=None, path=None, **kwargs):
+    """
+    创建帧源
+
+    Args:
+        kind: 'screen' / 'replay' / 'synthetic'
+        screen_capture: kind='screen' 时使用的 ScreenCapture
+        path: kind='replay' 时的视频文件或图像目录；kind='synthetic' 时的数据集目录
+    """
+    if kind == 'screen':
+        return ScreenCaptureSource(screen_capture)
+    if kind == 'replay':
+        return ReplaySource(path, **kwargs)
+    if kind == 'synthetic':
+        return SyntheticSource(path or 'dataset', **kwargs)
+    raise ValueError(f'未知的帧源: {kind}')
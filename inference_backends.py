@@ -0,0 +1,439 @@
+"""
+推理后端 - 为 RedPocketDetector 提供可插拔的模型执行层
+
+支持三种后端：
+- torch: ultralytics YOLO（PyTorch），与原有行为一致
+- onnx: ONNX Runtime，可调节 intra-op 线程数
+- openvino: OpenVINO，可调节推理线程数
+
+ONNX / OpenVINO 模型由 .pt 权重导出一次并缓存在权重旁边，
+之后只要权重没有更新就直接复用导出产物。
+"""
+import os
+import ast
+import time
+import logging
+import importlib.util
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from detections import Detections
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('torch', 'onnx', 'openvino')
+
+
+def default_num_threads():
+    """默认推理线程数：逻辑核数的一半（近似物理核数），至少为 1"""
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+def exported_model_path(weights_path, fmt):
+    """返回 .pt 权重导出为指定格式后的缓存路径（与 ultralytics 的命名一致）"""
+    weights_path = Path(weights_path)
+    if fmt == 'onnx':
+        return weights_path.with_suffix('.onnx')
+    if fmt == 'openvino':
+        return weights_path.parent / f'{weights_path.stem}_openvino_model'
+    raise ValueError(f'不支持的导出格式: {fmt}')
+
+
+def export_model(weights_path, fmt, imgsz=None, log=None):
+    """
+    将 .pt 权重导出为 ONNX 或 OpenVINO IR，已有且比权重新的产物直接复用
+
+    Args:
+        weights_path: .pt 权重路径
+        fmt: 'onnx' 或 'openvino'
+        imgsz: 导出时的输入尺寸，默认使用训练时的尺寸
+        log: 日志记录器，可选
+
+    Returns:
+        Path: 导出产物路径
+    """
+    log = log or logger
+    weights_path = Path(weights_path)
+    target = exported_model_path(weights_path, fmt)
+    if target.exists() and target.stat().st_mtime >= weights_path.stat().st_mtime:
+        log.info(f"复用已导出的 {fmt} 模型: {target}")
+        return target
+
+    from ultralytics import YOLO
+    log.info(f"正在导出 {fmt} 模型: {weights_path} -> {target}")
+    model = YOLO(str(weights_path))
+    kwargs = {'format': fmt, 'dynamic': True}
+    if imgsz:
+        kwargs['imgsz'] = imgsz
+    exported = Path(model.export(**kwargs))
+    if exported != target and exported.exists():
+        exported.rename(target)
+    return target
+
+
+def letterbox(image, new_shape, stride=32, auto=True, color=(114, 114, 114)):
+    """
+    与 ultralytics LetterBox 相同的等比缩放 + 填充
+
+    Returns:
+        tuple: (padded_image, gain, (pad_left, pad_top))
+    """
+    h, w = image.shape[:2]
+    gain = min(new_shape / h, new_shape / w)
+    new_w, new_h = int(round(w * gain)), int(round(h * gain))
+    dw, dh = new_shape - new_w, new_shape - new_h
+    if auto:
+        dw, dh = dw % stride, dh % stride
+    dw /= 2
+    dh /= 2
+
+    if (w, h) != (new_w, new_h):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return image, gain, (left, top)
+
+
+def to_blob(image):
+    """BGR HWC uint8 → RGB NCHW float32 [0, 1]"""
+    blob = cv2.dnn.blobFromImage(image, scalefactor=1 / 255.0, swapRB=True)
+    return np.ascontiguousarray(blob, dtype=np.float32)
+
+
+def decode_output(output, conf_threshold, iou_threshold=0.7, max_det=300):
+    """
+    将模型原始输出解码为 (boxes_xyxy, confidences, class_ids)
+
+    同时支持端到端输出 (1, N, 6) [x1, y1, x2, y2, conf, cls]
+    和需要 NMS 的输出 (1, 4 + nc, N) [cx, cy, w, h, scores...]。
+    """
+    output = np.asarray(output)[0]
+    if output.ndim == 2 and output.shape[1] == 6:
+        keep = output[:, 4] >= conf_threshold
+        output = output[keep][:max_det]
+        return output[:, :4], output[:, 4], output[:, 5]
+
+    preds = output.T
+    scores = preds[:, 4:]
+    class_ids = scores.argmax(axis=1)
+    confidences = scores[np.arange(len(scores)), class_ids]
+    keep = confidences >= conf_threshold
+    preds, class_ids, confidences = preds[keep], class_ids[keep], confidences[keep]
+    if len(preds) == 0:
+        return np.empty((0, 4), np.float32), confidences, class_ids
+
+    cx, cy, bw, bh = preds[:, 0], preds[:, 1], preds[:, 2], preds[:, 3]
+    boxes = np.stack([cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2], axis=1)
+    xywh = np.stack([boxes[:, 0], boxes[:, 1], bw, bh], axis=1)
+    indices = cv2.dnn.NMSBoxesBatched(
+        xywh.tolist(), confidences.tolist(), class_ids.tolist(), conf_threshold, iou_threshold
+    )
+    indices = np.asarray(indices, dtype=np.intp).reshape(-1)
+    indices = indices[np.argsort(-confidences[indices], kind='stable')][:max_det]
+    return boxes[indices], confidences[indices], class_ids[indices]
+
+
+class InferenceBackend:
+    """
+    推理后端基类
+
+    Attributes:
+        name: 后端名称
+        model_path: 模型文件路径
+        class_names: 类别名称列表
+        imgsz: 默认推理尺寸
+    """
+
+    name = 'base'
+
+    def __init__(self, model_path, class_names, imgsz=640):
+        self.model_path = str(model_path)
+        self.class_names = class_names
+        self.imgsz = imgsz
+
+    def predict(self, image, conf_threshold=0.5, imgsz=None):
+        """对单张 BGR 图像推理，返回 Detections"""
+        raise NotImplementedError
+
+    def predict_batch(self, images, conf_threshold=0.5, imgsz=None):
+        """对一批 BGR 图像（尺寸可以不同）推理，返回与 images 一一对应的 Detections 列表"""
+        return [self.predict(image, conf_threshold, imgsz) for image in images]
+
+    def close(self):
+        """释放后端持有的资源（如工作进程），默认无需处理"""
+
+
+class TorchBackend(InferenceBackend):
+    """ultralytics YOLO (PyTorch) 后端"""
+
+    name = 'torch'
+
+    def __init__(self, model_path, class_names, device='cpu'):
+        from ultralytics import YOLO
+        self.model = YOLO(model_path)
+        self.model.to(device)
+        self.device = device
+        super().__init__(model_path, class_names, self.model.overrides.get('imgsz', 640))
+
+    def predict(self, image, conf_threshold=0.5, imgsz=None):
+        results = self.model(image, conf=conf_threshold, verbose=False,
+                             device=self.device, imgsz=imgsz or self.imgsz)
+        start = time.perf_counter()
+        detections = Detections.concat(
+            [Detections.from_result(result, self.class_names) for result in results],
+            self.class_names
+        )
+        self._record_speed(results, start)
+        return detections
+
+    def predict_batch(self, images, conf_threshold=0.5, imgsz=None):
+        # YOLO 接受图像列表，整批一次前向
+        results = self.model(list(images), conf=conf_threshold, verbose=False,
+                             device=self.device, imgsz=imgsz or self.imgsz)
+        start = time.perf_counter()
+        detections = [Detections.from_result(result, self.class_names) for result in results]
+        self._record_speed(results, start, len(results))
+        return detections
+
+    def _record_speed(self, results, decode_start, batch_size=1):
+        if not results:
+            return
+        # ultralytics 自带的分阶段耗时（毫秒，批量推理时为每张图像的平均值）
+        speed = results[0].speed
+        REGISTRY.stage('preprocess').record(speed.get('preprocess', 0.0) * batch_size / 1000)
+        REGISTRY.stage('inference').record(speed.get('inference', 0.0) * batch_size / 1000)
+        REGISTRY.stage('decode').record(speed.get('postprocess', 0.0) * batch_size / 1000
+                                        + time.perf_counter() - decode_start)
+
+
+def _parse_imgsz(value):
+    """解析导出元数据中的 imgsz（如 "[800, 800]" 或 800），失败返回 None"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return None
+    if isinstance(value, (list, tuple)):
+        return int(max(value)) if value else None
+    return int(value)
+
+
+class _ExportedBackend(InferenceBackend):
+    """ONNX / OpenVINO 共用的前处理和后处理"""
+
+    def __init__(self, model_path, class_names, imgsz=None, iou_threshold=0.7):
+        super().__init__(model_path, class_names, imgsz or 640)
+        self.iou_threshold = iou_threshold
+
+    def _run(self, blob):
+        raise NotImplementedError
+
+    def predict(self, image, conf_threshold=0.5, imgsz=None):
+        with REGISTRY.timer('preprocess'):
+            padded, gain, (pad_x, pad_y) = letterbox(image, imgsz or self.imgsz)
+            blob = to_blob(padded)
+        with REGISTRY.timer('inference'):
+            output = self._run(blob)
+        with REGISTRY.timer('decode'):
+            return self._decode(output, image, gain, pad_x, pad_y, conf_threshold)
+
+    def predict_batch(self, images, conf_threshold=0.5, imgsz=None):
+        """整批 letterbox 到相同的正方形尺寸后拼成 (N, 3, S, S) 一次推理（导出时已启用动态批维度）"""
+        if len(images) <= 1:
+            return [self.predict(image, conf_threshold, imgsz) for image in images]
+        imgsz = imgsz or self.imgsz
+        with REGISTRY.timer('preprocess'):
+            letterboxed = [letterbox(image, imgsz, auto=False) for image in images]
+            blob = np.concatenate([to_blob(padded) for padded, _, _ in letterboxed])
+        with REGISTRY.timer('inference'):
+            output = self._run(blob)
+        with REGISTRY.timer('decode'):
+            return [
+                self._decode(output[i:i + 1], image, gain, pad_x, pad_y, conf_threshold)
+                for i, (image, (_, gain, (pad_x, pad_y))) in enumerate(zip(images, letterboxed))
+            ]
+
+    def _decode(self, output, image, gain, pad_x, pad_y, conf_threshold):
+        boxes, confidences, class_ids = decode_output(output, conf_threshold, self.iou_threshold)
+
+        boxes = np.array(boxes, dtype=np.float32).reshape(-1, 4)
+        boxes[:, [0, 2]] -= pad_x
+        boxes[:, [1, 3]] -= pad_y
+        boxes /= gain
+        h, w = image.shape[:2]
+        boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, w)
+        boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, h)
+        return Detections(boxes, confidences, class_ids, self.class_names)
+
+
+class OnnxRuntimeBackend(_ExportedBackend):
+    """ONNX Runtime CPU 后端"""
+
+    name = 'onnx'
+
+    def __init__(self, model_path, class_names, imgsz=None, num_threads=None):
+        import onnxruntime as ort
+        super().__init__(model_path, class_names, imgsz)
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads or default_num_threads()
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            self.model_path, sess_options=options, providers=['CPUExecutionProvider']
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        if imgsz is None:
+            metadata = self.session.get_modelmeta().custom_metadata_map
+            self.imgsz = _parse_imgsz(metadata.get('imgsz')) or self.imgsz
+
+    def _run(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVINOBackend(_ExportedBackend):
+    """OpenVINO CPU 后端，model_path 可以是 IR 目录或 .xml 文件"""
+
+    name = 'openvino'
+
+    def __init__(self, model_path, class_names, imgsz=None, num_threads=None):
+        import openvino as ov
+        import yaml
+        path = Path(model_path)
+        if path.is_dir():
+            path = next(path.glob('*.xml'))
+        super().__init__(path, class_names, imgsz)
+        metadata_file = path.parent / 'metadata.yaml'
+        if imgsz is None and metadata_file.exists():
+            with open(metadata_file, 'r', encoding='utf-8') as f:
+                self.imgsz = _parse_imgsz((yaml.safe_load(f) or {}).get('imgsz')) or self.imgsz
+        core = ov.Core()
+        config = {
+            'PERFORMANCE_HINT': 'LATENCY',
+            'INFERENCE_NUM_THREADS': num_threads or default_num_threads(),
+        }
+        self.compiled = core.compile_model(core.read_model(str(path)), 'CPU', config)
+        self.output = self.compiled.output(0)
+
+    def _run(self, blob):
+        return self.compiled([blob])[self.output]
+
+
+def backend_for_path(model_path):
+    """根据模型文件推断后端：.onnx → onnx，.xml / *_openvino_model → openvino，其余 → torch"""
+    path = Path(model_path)
+    if path.suffix == '.onnx':
+        return 'onnx'
+    if path.suffix == '.xml' or (path.is_dir() and path.name.endswith('_openvino_model')):
+        return 'openvino'
+    return 'torch'
+
+
+def is_backend_available(name):
+    """判断后端所需的运行时是否已安装"""
+    module = {'torch': 'ultralytics', 'onnx': 'onnxruntime', 'openvino': 'openvino'}.get(name)
+    return module is not None and importlib.util.find_spec(module) is not None
+
+
+def create_backend(name, model_path, class_names, device='cpu', imgsz=None, num_threads=None):
+    if name == 'torch':
+        return TorchBackend(model_path, class_names, device)
+    if name == 'onnx':
+        return OnnxRuntimeBackend(model_path, class_names, imgsz, num_threads)
+    if name == 'openvino':
+        return OpenVINOBackend(model_path, class_names, imgsz, num_threads)
+    raise ValueError(f'未知的推理后端: {name}')
+
+
+def _box_iou(a, b):
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+def compare_detections(reference, candidate, conf_threshold, min_iou=0.8, max_conf_delta=0.05):
+    """
+    比较两组检测结果是否一致
+
+    同类别的框按 IoU 贪心匹配；置信度接近阈值的框允许只出现在一侧。
+
+    Returns:
+        tuple: (是否一致, 问题描述列表)
+    """
+    problems = []
+    class_ids = set(np.unique(reference.class_ids)) | set(np.unique(candidate.class_ids))
+    for class_id in sorted(int(c) for c in class_ids):
+        ref_idx = reference.class_indices(class_id)
+        cand_idx = candidate.class_indices(class_id)
+        ref_boxes, cand_boxes = reference.boxes[ref_idx], candidate.boxes[cand_idx]
+        matched_cand = set()
+        iou = _box_iou(ref_boxes, cand_boxes) if len(ref_idx) and len(cand_idx) else None
+        for i, r in enumerate(ref_idx):
+            j, best_iou = -1, -1.0
+            if iou is not None:
+                row = iou[i].copy()
+                row[list(matched_cand)] = -1
+                j = int(row.argmax())
+                best_iou = float(row[j])
+            if j < 0 or best_iou < min_iou:
+                if reference.confidences[r] - conf_threshold > max_conf_delta:
+                    problems.append(f"{reference.class_name(class_id)}: 候选后端缺少目标 {reference[int(r)]['bbox']}")
+                continue
+            matched_cand.add(j)
+            delta = abs(float(reference.confidences[r]) - float(candidate.confidences[cand_idx[j]]))
+            if delta > max_conf_delta:
+                problems.append(f"{reference.class_name(class_id)}: 置信度差异 {delta:.3f}")
+        for j, c in enumerate(cand_idx):
+            if j not in matched_cand and candidate.confidences[c] - conf_threshold > max_conf_delta:
+                problems.append(f"{candidate.class_name(class_id)}: 候选后端多出目标 {candidate[int(c)]['bbox']}")
+    return not problems, problems
+
+
+def self_check(reference, candidate, images, conf_threshold=0.5, log=None):
+    """
+    启动自检：在样例图像上比较候选后端与参考后端 (PyTorch) 的输出
+
+    Returns:
+        bool: 所有样例都一致时返回 True；没有样例图像时同样返回 True 并给出警告
+    """
+    log = log or logger
+    if not images:
+        log.warning("没有可用于自检的样例图像，跳过后端一致性检查")
+        return True
+
+    for image_path in images:
+        image = cv2.imread(str(image_path))
+        if image is None:
+            continue
+        ok, problems = compare_detections(
+            reference.predict(image, conf_threshold),
+            candidate.predict(image, conf_threshold),
+            conf_threshold
+        )
+        if not ok:
+            log.warning(f"{candidate.name} 后端与 PyTorch 结果不一致 ({Path(image_path).name}):")
+            for problem in problems:
+                log.warning(f"  - {problem}")
+            return False
+    log.info(f"{candidate.name} 后端自检通过 ({len(images)} 张样例)")
+    return True
+
+
+def sample_images(dataset_dir='dataset', split='val', limit=4):
+    """从数据集中取少量图像用于自检"""
+    image_dir = Path(dataset_dir) / 'images' / split
+    if not image_dir.exists():
+        return []
+    images = sorted(p for p in image_dir.iterdir() if p.suffix.lower() in ('.png', '.jpg', '.jpeg'))
+    return images[:limit]
@@ -0,0 +1,355 @@
+"""
+推理进程池 - 把模型推理分散到多个工作进程，绕开 GIL 和单个 torch 线程池的争用
+
+每个工作进程持有自己的模型实例，推理线程数在进程启动时固定
+（OMP / MKL 环境变量、torch.set_num_threads、ONNX Runtime / OpenVINO 的线程数），
+可选地绑定到各自的 CPU 核心。
+
+帧和结果都不经过 pickle：
+- 父进程把图像复制进该工作进程专用的共享内存段（multiprocessing.shared_memory，一次内存拷贝），
+  通过管道只发送段名、形状和阈值；图像超过段大小时按需换一个更大的段
+- 工作进程把检测结果写入输出共享内存段，每行 [x1, y1, x2, y2, conf, cls]（float32），
+  通过管道只回传行数和耗时
+
+WorkerPoolBackend 实现了与其他推理后端相同的 predict() / predict_batch() 接口，
+由 RedPocketDetector 在 inference_workers > 0 时替换进程内的后端；
+分辨率策略、预缩放、增量检测等仍在父进程中完成，只有模型调用进入工作进程。
+predict() 可以被多个线程同时调用（每个调用占用一个空闲的工作进程），
+predict_batch() 把一批图像同时分发给多个工作进程。
+"""
+import os
+import time
+import queue
+import logging
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from detections import Detections
+from inference_backends import InferenceBackend, create_backend, default_num_threads
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+RESULT_COLUMNS = 6
+# 放入空闲队列表示进程池已关闭，唤醒所有等待空闲进程的线程
+_CLOSED = object()
+
+
+def _attach(name):
+    """在工作进程中按名称挂载共享内存段（不交给资源跟踪器管理，由父进程负责释放）"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 没有 track 参数
+        return shared_memory.SharedMemory(name=name)
+
+
+def _create_worker_backend(backend, model_path, class_names, device, imgsz, num_threads):
+    """在工作进程中创建推理后端"""
+    if backend == 'torch':
+        import torch
+        torch.set_num_threads(num_threads)
+        torch.set_num_interop_threads(1)
+        return create_backend('torch', model_path, class_names, device=device)
+    return create_backend(backend, model_path, class_names, imgsz=imgsz, num_threads=num_threads)
+
+
+def _run_request(model, in_shm, output, shape, dtype, conf_threshold, imgsz):
+    """对共享内存中的图像推理，结果写入输出段，返回 (行数, 推理耗时)"""
+    image = np.ndarray(shape, dtype, buffer=in_shm.buf)
+    start = time.perf_counter()
+    detections = model.predict(image, conf_threshold, imgsz)
+    elapsed = time.perf_counter() - start
+    count = min(len(detections), len(output))
+    output[:count, :4] = detections.boxes[:count]
+    output[:count, 4] = detections.confidences[:count]
+    output[:count, 5] = detections.class_ids[:count]
+    return count, elapsed
+
+
+def _worker_main(conn, out_name, factory, factory_args, num_threads, cores):
+    """工作进程入口：固定线程数，创建模型，循环处理推理请求"""
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(num_threads)
+    cv2.setNumThreads(num_threads)
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+
+    try:
+        model = factory(*factory_args, num_threads=num_threads)
+    except Exception as e:
+        conn.send(('error', f'{type(e).__name__}: {e}'))
+        return
+    conn.send(('ready', model.imgsz))
+
+    out_shm = _attach(out_name)
+    output = np.ndarray((len(out_shm.buf) // (RESULT_COLUMNS * 4), RESULT_COLUMNS), np.float32, buffer=out_shm.buf)
+    in_shm = None
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+            if message is None:
+                break
+            in_name, shape, dtype, conf_threshold, imgsz = message
+            try:
+                if in_shm is None or in_shm.name != in_name:
+                    if in_shm is not None:
+                        in_shm.close()
+                    in_shm = _attach(in_name)
+                count, elapsed = _run_request(model, in_shm, output, shape, dtype, conf_threshold, imgsz)
+                conn.send(('ok', count, elapsed))
+            except Exception as e:
+                conn.send(('error', f'{type(e).__name__}: {e}'))
+    finally:
+        del output
+        out_shm.close()
+        if in_shm is not None:
+            in_shm.close()
+
+
+class _Worker:
+    """父进程中的工作进程句柄：进程、管道和两个共享内存段"""
+
+    def __init__(self, index, cores):
+        self.index = index
+        self.cores = cores
+        self.process = None
+        self.conn = None
+        self.input = None
+        self.output = None
+        self.results = None
+
+    def ensure_input(self, nbytes):
+        """输入段不够大时换一个更大的段（按 1.5 倍预留，避免窗口尺寸小幅变化时反复分配）"""
+        if self.input is not None and self.input.size >= nbytes:
+            return self.input
+        if self.input is not None:
+            self.input.close()
+            self.input.unlink()
+        self.input = shared_memory.SharedMemory(create=True, size=int(nbytes * 1.5))
+        return self.input
+
+    def release(self):
+        self.results = None
+        for segment in (self.input, self.output):
+            if segment is None:
+                continue
+            try:
+                segment.close()
+                segment.unlink()
+            except (FileNotFoundError, BufferError):
+                pass
+        self.input = self.output = None
+
+
+class WorkerPoolBackend(InferenceBackend):
+    """
+    推理进程池后端
+
+    Args:
+        model_path: 模型路径（工作进程各自加载）
+        class_names: 类别名称列表
+        backend: 工作进程中使用的推理后端 'torch' / 'onnx' / 'openvino'
+        device: torch 后端的设备
+        imgsz: ONNX / OpenVINO 的推理尺寸，None 时读取模型元数据
+        num_workers: 工作进程数，默认为物理核数的一半
+        threads_per_worker: 每个工作进程的推理线程数，默认平分物理核
+        pin_cores: 是否把每个工作进程绑定到各自的 CPU 核心（仅支持 sched_setaffinity 的平台）
+        max_det: 每张图像最多回传的检测数
+        factory: 可选，在工作进程中创建后端的可 pickle 函数，
+            factory(backend, model_path, class_names, device, imgsz, num_threads=...)
+        start_timeout: 等待工作进程加载模型的最长时间（秒）
+    """
+
+    name = 'pool'
+
+    def __init__(self, model_path, class_names, backend='torch', device='cpu', imgsz=None,
+                 num_workers=None, threads_per_worker=None, pin_cores=False, max_det=300,
+                 factory=None, start_timeout=120.0):
+        super().__init__(model_path, class_names, imgsz or 640)
+        physical = default_num_threads()
+        self.num_workers = max(1, num_workers or physical // 2)
+        self.threads_per_worker = max(1, threads_per_worker or physical // self.num_workers)
+        self.backend = backend
+        self.max_det = max_det
+        self.start_timeout = start_timeout
+        self._factory = factory or _create_worker_backend
+        self._factory_args = (backend, str(model_path), list(class_names), device, imgsz)
+        self._context = multiprocessing.get_context('spawn')
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        cpu_count = os.cpu_count() or 1
+        self._workers = []
+        for index in range(self.num_workers):
+            cores = None
+            if pin_cores and hasattr(os, 'sched_setaffinity'):
+                first = index * self.threads_per_worker
+                cores = {(first + i) % cpu_count for i in range(self.threads_per_worker)}
+            self._workers.append(_Worker(index, cores))
+        try:
+            for worker in self._workers:
+                self._spawn(worker)
+            for worker in self._workers:
+                self._wait_ready(worker)
+                self._idle.put(worker)
+        except Exception:
+            self.close()
+            raise
+        logger.info(f"推理进程池已启动: {self.num_workers} 个 {backend} 进程, "
+                    f"每个 {self.threads_per_worker} 个线程")
+
+    def _spawn(self, worker):
+        worker.output = shared_memory.SharedMemory(create=True, size=self.max_det * RESULT_COLUMNS * 4)
+        worker.results = np.ndarray((self.max_det, RESULT_COLUMNS), np.float32, buffer=worker.output.buf)
+        worker.conn, child_conn = self._context.Pipe()
+        worker.process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, worker.output.name, self._factory, self._factory_args,
+                  self.threads_per_worker, worker.cores),
+            name=f'inference-worker-{worker.index}',
+            daemon=True
+        )
+        worker.process.start()
+        child_conn.close()
+
+    def _wait_ready(self, worker):
+        if not worker.conn.poll(self.start_timeout):
+            raise RuntimeError(f'推理进程 {worker.index} 启动超时')
+        status, value = worker.conn.recv()
+        if status != 'ready':
+            raise RuntimeError(f'推理进程 {worker.index} 加载模型失败: {value}')
+        self.imgsz = value
+
+    def _restart(self, worker):
+        """工作进程异常退出后重新启动（在调用线程中同步等待模型加载）；进程池已关闭时不再重启"""
+        if self._closed:
+            raise RuntimeError('推理进程池已关闭')
+        REGISTRY.failure('inference_worker')
+        logger.warning(f"推理进程 {worker.index} 已退出，正在重启")
+        self._stop(worker)
+        worker.release()
+        self._spawn(worker)
+        self._wait_ready(worker)
+
+    def _acquire(self, block=True):
+        """
+        取出一个空闲的工作进程；block 为 False 且没有空闲进程时返回 None
+
+        进程池已关闭（包括等待期间被关闭）时抛出 RuntimeError。
+        """
+        if self._closed:
+            raise RuntimeError('推理进程池已关闭')
+        try:
+            worker = self._idle.get(block)
+        except queue.Empty:
+            return None
+        if worker is _CLOSED:
+            # 放回去，继续唤醒其他等待的线程
+            self._idle.put(_CLOSED)
+            raise RuntimeError('推理进程池已关闭')
+        return worker
+
+    def _send(self, worker, image, conf_threshold, imgsz):
+        if worker.process is None or not worker.process.is_alive():
+            self._restart(worker)
+        segment = worker.ensure_input(image.nbytes)
+        np.ndarray(image.shape, image.dtype, buffer=segment.buf)[...] = image
+        worker.conn.send((segment.name, image.shape, image.dtype.str, conf_threshold, imgsz or self.imgsz))
+        return time.perf_counter()
+
+    def _receive(self, worker, sent_at):
+        """读取一个工作进程的结果并把它放回空闲队列"""
+        try:
+            try:
+                status, *values = worker.conn.recv()
+            except (EOFError, OSError):
+                self._restart(worker)
+                raise RuntimeError(f'推理进程 {worker.index} 异常退出')
+            if status != 'ok':
+                raise RuntimeError(f'推理进程 {worker.index} 推理失败: {values[0]}')
+            count, elapsed = values
+            rows = worker.results[:count].copy()
+        finally:
+            self._idle.put(worker)
+
+        REGISTRY.stage('inference').record(elapsed)
+        REGISTRY.stage('ipc').record(max(0.0, time.perf_counter() - sent_at - elapsed))
+        return Detections(rows[:, :4], rows[:, 4], rows[:, 5].astype(np.int64), self.class_names)
+
+    def predict(self, image, conf_threshold=0.5, imgsz=None):
+        worker = self._acquire()
+        try:
+            sent_at = self._send(worker, image, conf_threshold, imgsz)
+        except Exception:
+            self._idle.put(worker)
+            raise
+        return self._receive(worker, sent_at)
+
+    def predict_batch(self, images, conf_threshold=0.5, imgsz=None):
+        """把一批图像同时分发给空闲的工作进程；工作进程不够时先收回最早发出的结果"""
+        results = [None] * len(images)
+        pending = []
+        try:
+            for index, image in enumerate(images):
+                worker = None
+                while worker is None:
+                    worker = self._acquire(block=False)
+                    if worker is None:
+                        if pending:
+                            done_index, done_worker, sent_at = pending.pop(0)
+                            results[done_index] = self._receive(done_worker, sent_at)
+                        else:
+                            worker = self._acquire()
+                try:
+                    sent_at = self._send(worker, image, conf_threshold, imgsz)
+                except Exception:
+                    self._idle.put(worker)
+                    raise
+                pending.append((index, worker, sent_at))
+        finally:
+            # 出错时也要收回已发出的请求，保证工作进程回到空闲队列
+            errors = []
+            for index, worker, sent_at in pending:
+                try:
+                    results[index] = self._receive(worker, sent_at)
+                except RuntimeError as e:
+                    errors.append(e)
+            if errors:
+                raise errors[0]
+        return results
+
+    def _stop(self, worker, timeout=2.0):
+        if worker.process is None:
+            return
+        try:
+            worker.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        worker.process.join(timeout)
+        if worker.process.is_alive():
+            worker.process.terminate()
+            worker.process.join(timeout)
+        worker.conn.close()
+        worker.process = None
+
+    def close(self):
+        """停止所有工作进程并释放共享内存"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._idle.put(_CLOSED)
+        for worker in self._workers:
+            self._stop(worker)
+            worker.release()
+        logger.info("推理进程池已关闭")
@@ -1,21 +1,29 @@
-import sys
 import time
+import argparse
 import threading
 import logging
 from datetime import datetime
 from pathlib import Path
 
 import cv2
-import numpy as np
-import pyautogui
-import mss
-from PIL import Image, ImageTk
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, scrolledtext
 import yaml
 
-from config_utils import load_classes_from_config
-from platform_adapter import get_platform_adapter
+from pipeline import MonitorPipeline
+from frame_diff import FrameChangeDetector
+from capture_backends import CAPTURE_BACKENDS
+from frame_sources import REPLAY_MODES, ScreenCaptureSource, create_frame_source
+from window_control import AutoClicker, ScreenCapture
+from metrics import REGISTRY, MetricsReporter, MetricsServer
+from preview_renderer import PreviewRenderer
+from overlay import MonitoringOverlay
+from action_executor import ActionExecutor
+from state_machine import GrabStateMachine
+from detection_bus import DetectionBus
+from packet_memory import OpenedPacketMemory
+from color_gate import COLOR_GATE_MODES, ColorGate, validate_gate
+from detector import RedPocketDetector
 from ultralytics import YOLO
 
 try:
@@ -73,285 +81,6 @@ class LoggerHandler(logging.Handler):
         self.text_widget.after(0, append)
 
 
-class ScreenCapture:
-    def __init__(self):
-        self.platform_adapter = get_platform_adapter()
-        self.window_info = None
-        self.window_rect = None
-        self.window_title = ""
-        self._mss_instance = None
-    
-    def _get_mss(self):
-        if self._mss_instance is None:
-            self._mss_instance = mss.mss()
-        return self._mss_instance
-    
-    def reset_mss(self):
-        if self._mss_instance is not None:
-            try:
-                self._mss_instance.close()
-            except:
-                pass
-            self._mss_instance = None
-        
-    def find_wechat_window(self):
-        """查找微信窗口（跨平台）"""
-        window_info = self.platform_adapter.find_target_window('微信')
-        if window_info:
-            self.window_info = window_info
-            self.window_title = window_info.get('title', '')
-            rect = self.platform_adapter.get_window_rect(window_info)
-            if rect:
-                self.window_rect = rect
-            return True
-        return False
-    
-    def set_window_by_point(self, x, y):
-        """通过坐标设置窗口（目前仅 Windows 支持）"""
-        if self.platform_adapter.platform.startswith('win'):
-            try:
-                import win32gui
-                hwnd = win32gui.WindowFromPoint((x, y))
-                while win32gui.GetParent(hwnd) != 0:
-                    hwnd = win32gui.GetParent(hwnd)
-                
-                if hwnd and win32gui.IsWindowVisible(hwnd):
-                    self.window_info = {'hwnd': hwnd}
-                    self.window_title = win32gui.GetWindowText(hwnd)
-                    self.window_rect = win32gui.GetWindowRect(hwnd)
-                    return True
-            except Exception as e:
-                logging.warning(f"通过坐标选择窗口失败: {e}")
-        return False
-    
-    def get_window_rect(self):
-        """获取窗口位置（跨平台）"""
-        if self.window_info:
-            rect = self.platform_adapter.get_window_rect(self.window_info)
-            if rect:
-                self.window_rect = rect
-                return rect
-        return None
-    
-    def capture_window(self):
-        """捕获窗口内容（跨平台）"""
-        if not self.window_info:
-            return None
-            
-        rect = self.get_window_rect()
-        if not rect:
-            return None
-            
-        left, top, right, bottom = rect
-        width = right - left
-        height = bottom - top
-        
-        if width <= 0 or height <= 0:
-            return None
-        
-        try:
-            sct = self._get_mss()
-            monitor = {"top": top, "left": left, "width": width, "height": height}
-            screenshot = sct.grab(monitor)
-            im = np.array(screenshot)
-            im = cv2.cvtColor(im, cv2.COLOR_BGRA2BGR)
-            return im, rect
-        except Exception as e:
-            return None
-    
-    def bring_window_to_front(self):
-        """将窗口带到前台（跨平台）"""
-        if self.window_info:
-            self.platform_adapter.bring_window_to_front(self.window_info)
-    
-    def set_always_on_top(self, enable=True):
-        """设置窗口置顶（目前仅 Windows 支持）"""
-        if self.window_info and self.platform_adapter.platform.startswith('win'):
-            try:
-                import win32gui
-                import win32con
-                hwnd = self.window_info.get('hwnd')
-                if hwnd:
-                    if enable:
-                        win32gui.SetWindowPos(
-                            hwnd,
-                            win32con.HWND_TOPMOST,
-                            0, 0, 0, 0,
-                            win32con.SWP_NOMOVE | win32con.SWP_NOSIZE
-                        )
-                    else:
-                        win32gui.SetWindowPos(
-                            hwnd,
-                            win32con.HWND_NOTOPMOST,
-                            0, 0, 0, 0,
-                            win32con.SWP_NOMOVE | win32con.SWP_NOSIZE
-                        )
-            except Exception as e:
-                pass
-
-
-class RedPocketDetector:
-    """
-    红包检测器类，使用YOLO模型进行目标检测
-    
-    Attributes:
-        model: YOLO模型实例
-        model_path: 模型文件路径
-        classes: 类别名称列表
-        device: 运行设备（cpu或cuda）
-        logger: 日志记录器
-    """
-    
-    BOX_COLORS = {
-        'red_packet': (0, 255, 0),
-        'open_button': (255, 0, 0),
-        'amount_text': (0, 0, 255),
-        'close_button': (255, 255, 0),
-        'back_button': (255, 128, 0),
-        'opened_red_packet': (128, 128, 128),
-        'play_button': (0, 255, 255)
-    }
-    
-    def __init__(self, model_path=None, logger=None, config_path='dataset.yaml'):
-        """
-        初始化红包检测器
-        
-        Args:
-            model_path: 模型文件路径，可选
-            logger: 日志记录器，可选
-            config_path: 数据集配置文件路径，默认为dataset.yaml
-        """
-        self.model = None
-        self.model_path = model_path
-        self.device = 'cpu'
-        self.logger = logger or logging.getLogger('RedPocketDetector')
-        self.classes = load_classes_from_config(config_path, self.logger)
-        
-    def _get_best_device(self):
-        """
-        自动检测并返回最佳可用设备
-        优先级: CUDA > MPS > RKNPU > CPU
-        """
-        import torch
-        
-        # 1. 检查 NVIDIA CUDA
-        if torch.cuda.is_available():
-            self.logger.info(f"检测到 CUDA 设备: {torch.cuda.get_device_name(0)}")
-            return 'cuda'
-        
-        # 2. 检查 Apple MPS (Apple Silicon)
-        if hasattr(torch.backends, 'mps') and torch.backends.mps.is_available():
-            self.logger.info("检测到 Apple MPS 设备")
-            return 'mps'
-        
-        # 3. 检查 Rockchip RKNPU (RK3588/RK3568 等)
-        try:
-            import rknnlite
-            self.logger.info("检测到 Rockchip RKNPU 设备")
-            return 'rknpu'
-        except ImportError:
-            pass
-        
-        # 4. 回退到 CPU
-        self.logger.warning("未检测到可用的硬件加速设备，使用 CPU")
-        return 'cpu'
-
-    def load_model(self, model_path):
-        try:
-            import torch
-            self.device = self._get_best_device()
-            self.logger.info(f"使用设备: {self.device}")
-            
-            self.model = YOLO(model_path)
-            self.model.to(self.device)
-            self.model_path = model_path
-            return True
-        except ImportError as e:
-            self.logger.error(f"导入依赖库失败: {e}，请确保已安装torch和ultralytics")
-            return False
-        except FileNotFoundError as e:
-            self.logger.error(f"模型文件不存在: {model_path}")
-            return False
-        except RuntimeError as e:
-            self.logger.error(f"模型加载或设备切换失败: {e}")
-            return False
-        except Exception as e:
-            self.logger.error(f"加载模型失败: {e}")
-            return False
-    
-    def detect(self, image, conf_threshold=0.5):
-        if self.model is None:
-            return []
-        
-        results = self.model(image, conf=conf_threshold, verbose=False, device=self.device)
-        detections = []
-        
-        for result in results:
-            boxes = result.boxes
-            for box in boxes:
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                conf = box.conf[0].cpu().numpy()
-                cls = int(box.cls[0].cpu().numpy())
-                detections.append({
-                    'bbox': (int(x1), int(y1), int(x2), int(y2)),
-                    'confidence': float(conf),
-                    'class': cls,
-                    'class_name': self.classes[cls] if cls < len(self.classes) else f'class_{cls}'
-                })
-        
-        return detections
-    
-    def find_red_packets(self, detections):
-        return [d for d in detections if d['class_name'] == 'red_packet']
-    
-    def find_open_button(self, detections):
-        return [d for d in detections if d['class_name'] == 'open_button']
-    
-    def find_back_button(self, detections):
-        return [d for d in detections if d['class_name'] == 'back_button']
-    
-    def find_close_button(self, detections):
-        return [d for d in detections if d['class_name'] == 'close_button']
-    
-    def find_play_button(self, detections):
-        return [d for d in detections if d['class_name'] == 'play_button']
-
-
-class AutoClicker:
-    def __init__(self, screen_capture):
-        self.screen_capture = screen_capture
-        self.click_delay = 0.02
-        
-    def click_at_position(self, x, y, relative_to_window=True):
-        if relative_to_window and self.screen_capture.window_rect:
-            window_x, window_y, _, _ = self.screen_capture.window_rect
-            x += window_x
-            y += window_y
-        
-        try:
-            win32api.SetCursorPos((x, y))
-            time.sleep(0.01)
-            win32api.mouse_event(win32con.MOUSEEVENTF_LEFTDOWN, x, y, 0, 0)
-            time.sleep(0.01)
-            win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP, x, y, 0, 0)
-            time.sleep(self.click_delay)
-            return True
-        except Exception as e:
-            try:
-                pyautogui.click(x, y)
-                time.sleep(self.click_delay)
-                return True
-            except:
-                return False
-    
-    def click_center(self, bbox, relative_to_window=True):
-        x1, y1, x2, y2 = bbox
-        center_x = (x1 + x2) // 2
-        center_y = (y1 + y2) // 2
-        success = self.click_at_position(center_x, center_y, relative_to_window)
-        return center_x, center_y, success
-
-
 class DataLabeler:
     def __init__(self, data_dir='dataset'):
         self.data_dir = Path(data_dir)
@@ -390,7 +119,23 @@ class DataLabeler:
 
 
 class RedPocketApp:
-    def __init__(self, root):
+    """
+    主界面
+    
+    Args:
+        root: Tk 根窗口
+        frame_source: 帧源，默认为实时窗口捕获；传入回放/合成帧源时不需要选择窗口，点击只做模拟
+        preview_fps: 预览的最大刷新帧率
+        headless: 为 True 时关闭预览渲染（监控和点击照常运行）
+        packet_memory_path: 已处理红包指纹记忆的 JSON 快照路径，None 时只保存在内存中
+        color_gate: 推理前的颜色预筛选，'off' / 'on' / 'safe'（先在 dataset/ 上验证召回）
+        inference_workers: 推理进程数，> 0 时模型在推理进程池中运行，流水线使用同样数量的推理线程
+    """
+    
+    COLOR_GATE_MIN_RECALL = 0.99
+    
+    def __init__(self, root, frame_source=None, preview_fps=15, headless=False, packet_memory_path=None,
+                 color_gate='off', inference_workers=0):
         self.root = root
         self.root.title("微信红包自动抢夺器 - YOLO版")
         self.root.geometry("1600x1000")
@@ -400,12 +145,10 @@ class RedPocketApp:
         self.is_running = False
         self.auto_grab_enabled = False
         self.monitor_thread = None
+        self.pipeline = None
         self.current_detections = []
         self.current_image = None
-        self.preview_scale = 1.0
-        self.preview_offset_x = 0
-        self.preview_offset_y = 0
-        self.is_handling_red_packet = False
+        self._detection_count = None
         
         self.is_paused = False
         self.last_pause_time = 0
@@ -418,15 +161,67 @@ class RedPocketApp:
         
         self.screen_capture = ScreenCapture()
         self.detector = RedPocketDetector(logger=self.logger)
+        self.detector.inference_workers = inference_workers
         self.auto_clicker = AutoClicker(self.screen_capture)
+        self.frame_source = frame_source or ScreenCaptureSource(self.screen_capture)
+        self.auto_clicker.dry_run = not self.frame_source.is_live
         self.data_labeler = DataLabeler()
         
+        self.overlay = MonitoringOverlay(RedPocketDetector.BOX_COLORS)
+        self.action_executor = ActionExecutor(self.logger)
+        self.detection_bus = DetectionBus(self.logger)
+        self.grab_events = self.detection_bus.subscribe(
+            'grab',
+            conf=lambda: self.grab_state.detection_conf(self.conf_var.get()),
+            callback=self.handle_frame
+        )
+        self.packet_memory = OpenedPacketMemory(path=packet_memory_path)
+        self.packet_memory.load()
+        self.grab_state = GrabStateMachine(
+            self.detector, self.action_executor,
+            focus_fn=self.focus_window,
+            click_fn=self.auto_clicker.click_center,
+            logger=self.logger,
+            memory=self.packet_memory
+        )
+        self.setup_color_gate(color_gate)
         self.setup_ui()
+        self.preview_renderer = PreviewRenderer(
+            self.root, self.preview_canvas,
+            draw_fn=self.draw_preview_overlay,
+            fps=preview_fps,
+            headless=headless,
+            on_frame=self.update_detection_info
+        )
+        if not headless:
+            self.detection_bus.subscribe('preview', conf=self.conf_var.get,
+                                         callback=self.preview_renderer.submit)
         self.load_default_model()
         self.setup_hotkeys()
         
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         
+    def setup_color_gate(self, mode):
+        if mode == 'off':
+            return
+        gate = ColorGate(bypass_fn=lambda: self.grab_state.needs_full_inference)
+        if mode == 'safe':
+            try:
+                report = validate_gate(gate, class_names=self.detector.classes)
+            except FileNotFoundError as e:
+                self.logger.warning(f"无法验证颜色预筛选，不启用: {e}")
+                return
+            self.logger.info(
+                f"颜色预筛选验证: 召回 {report['image_recall']*100:.1f}% "
+                f"({report['positive_images']} 张含红包/开红包按钮的图像), "
+                f"无目标图像拒绝率 {report['negative_reject_rate']*100:.1f}%"
+            )
+            if report['image_recall'] < self.COLOR_GATE_MIN_RECALL:
+                self.logger.warning(f"颜色预筛选召回低于 {self.COLOR_GATE_MIN_RECALL*100:.0f}%，不启用")
+                return
+        self.detector.prefilter = gate
+        self.logger.info("已启用颜色预筛选")
+    
     def setup_logging(self):
         self.logger = logging.getLogger('RedPocketApp')
         self.logger.setLevel(logging.INFO)
@@ -580,7 +375,7 @@ class RedPocketApp:
     def load_model(self):
         file_path = filedialog.askopenfilename(
             title="选择YOLO模型文件",
-            filetypes=[("PyTorch模型", "*.pt"), ("所有文件", "*.*")]
+            filetypes=[("PyTorch模型", "*.pt"), ("ONNX模型", "*.onnx"), ("OpenVINO模型", "*.xml"), ("所有文件", "*.*")]
         )
         if file_path:
             if self.detector.load_model(file_path):
@@ -636,7 +431,7 @@ class RedPocketApp:
         self.root.config(cursor="")
             
     def start_monitoring(self):
-        if not self.screen_capture.window_info:
+        if self.frame_source.is_live and not self.screen_capture.window_info:
             messagebox.showwarning("警告", "请先选择要监控的窗口")
             return
                 
@@ -658,6 +453,8 @@ class RedPocketApp:
         
         self.monitor_thread = threading.Thread(target=self.monitor_loop, daemon=True)
         self.monitor_thread.start()
+        self.action_executor.start()
+        self.preview_renderer.start()
         
         self.logger.info("开始监控...")
         
@@ -665,6 +462,10 @@ class RedPocketApp:
         self.is_running = False
         self.auto_grab_enabled = False
         self.is_paused = False
+        self.action_executor.stop()
+        self.grab_state.reset()
+        self.save_packet_memory()
+        self.preview_renderer.stop()
         self.start_btn.configure(state=tk.NORMAL)
         self.stop_btn.configure(state=tk.DISABLED)
         self.auto_btn.configure(state=tk.DISABLED, text="开始抢红包")
@@ -677,6 +478,9 @@ class RedPocketApp:
         
         self.screen_capture.reset_mss()
         
+        if self.pipeline is not None:
+            self.logger.info(f"画面未变化跳过推理比例: {self.pipeline.skip_ratio*100:.1f}%")
+        self.logger.info(f"窗口位置缓存命中率: {self.screen_capture.geometry_hit_rate*100:.1f}%")
         self.logger.info("停止监控")
     
     def toggle_auto_grab(self):
@@ -754,7 +558,15 @@ class RedPocketApp:
         else:
             self.logger.info("非Windows平台，备用全局快捷键不可用，仅支持窗口内快捷键")
     
+    def save_packet_memory(self):
+        try:
+            self.packet_memory.save()
+        except OSError as e:
+            self.logger.warning(f"保存已处理红包记录失败: {e}")
+    
     def on_closing(self):
+        self.save_packet_memory()
+        self.detector.close()
         if HAS_WINTYPES:
             try:
                 import ctypes
@@ -786,351 +598,73 @@ class RedPocketApp:
             self.logger.info("抢红包功能已恢复")
             self.root.after(0, lambda: self.auto_status_label.configure(text="抢红包: 运行中", foreground='green'))
     
-    def recheck_and_verify_button(self, button_type, delay_seconds, find_method, current_target):
-        self.logger.info(f"{button_type}检测到，先延时{delay_seconds}秒钟...")
-        time.sleep(delay_seconds)
-        
-        self.logger.info(f"延时结束，重新检测是否还有{button_type}...")
-        result = self.screen_capture.capture_window()
-        if not result:
-            self.logger.warning("屏幕捕获失败，继续使用原检测结果")
-            return True, current_target
-        
-        image, _ = result
-        new_detections = self.detector.detect(image, self.conf_var.get())
-        new_buttons = find_method(new_detections)
-        
-        if not new_buttons:
-            self.logger.info(f"重新检测未发现{button_type}，终止点击")
-            return False, None
-        else:
-            self.logger.info(f"重新检测仍发现{button_type}，继续点击")
-            return True, new_buttons[0]
-        
-    def monitor_loop(self):
-        flash_state = False
-        last_flash = time.time()
-        last_fps_time = time.time()
-        frame_count = 0
-        fps = 0
-        inference_time = 0
-        
-        while self.is_running:
-            loop_start = time.time()
-            
-            try:
-                capture_start = time.time()
-                result = self.screen_capture.capture_window()
-                capture_time = time.time() - capture_start
-                
-                if result is None:
-                    self.logger.warning("无法捕获窗口")
-                    time.sleep(0.3)
-                    continue
-                    
-                image, rect = result
-                self.current_image = image.copy()
-                
-                conf_threshold = self.conf_var.get()
-                
-                infer_start = time.time()
-                detections = self.detector.detect(image, conf_threshold)
-                inference_time = time.time() - infer_start
-                
-                self.current_detections = detections
-                
-                display_image = self.draw_monitoring_overlay(image, detections, flash_state, fps, inference_time, capture_time)
-                self.update_preview(display_image, detections)
-                
-                frame_count += 1
-                if time.time() - last_fps_time >= 1.0:
-                    fps = frame_count / (time.time() - last_fps_time)
-                    frame_count = 0
-                    last_fps_time = time.time()
-                
-                if time.time() - last_flash > 0.5:
-                    flash_state = not flash_state
-                    last_flash = time.time()
-                
-                if self.auto_grab_enabled and not self.is_paused:
-                    open_buttons = self.detector.find_open_button(detections)
-                    
-                    if open_buttons:
-                        self.logger.info(f"[最高优先级] 检测到开红包按钮! 置信度: {open_buttons[0]['confidence']:.2f}")
-                        self.screen_capture.bring_window_to_front()
-                        time.sleep(0.01)
-                        
-                        self.screen_capture.get_window_rect()
-                        
-                        click_start = time.time()
-                        click_count = 0
-                        bbox = open_buttons[0]['bbox']
-                        
-                        while time.time() - click_start < 0.2:
-                            _, _, success = self.auto_clicker.click_center(bbox)
-                            if success:
-                                click_count += 1
-                            time.sleep(0.01)
-                        
-                        self.logger.info(f"开红包按钮连续点击 {click_count} 次!")
-                        time.sleep(0.3)
-                        
-                        import threading
-                        threading.Thread(
-                            target=self.return_to_chat,
-                            daemon=True
-                        ).start()
-                    elif not self.is_handling_red_packet:
-                        red_packets = self.detector.find_red_packets(detections)
-                        
-                        if red_packets:
-                            self.logger.info(f"[第二优先级] 检测到红包! 置信度: {red_packets[0]['confidence']:.2f}")
-                            self.is_handling_red_packet = True
-                            import threading
-                            threading.Thread(
-                                target=self.process_red_packet_simple,
-                                args=(red_packets[0],),
-                                daemon=True
-                            ).start()
-                        else:
-                            back_buttons = self.detector.find_back_button(detections)
-                            close_buttons = self.detector.find_close_button(detections)
-                            
-                            if back_buttons or close_buttons:
-                                target_button = back_buttons[0] if back_buttons else close_buttons[0]
-                                button_type = "返回按钮" if back_buttons else "关闭按钮"
-                                self.logger.info(f"[第三优先级] 检测到{button_type}! 置信度: {target_button['confidence']:.2f}")
-                                self.screen_capture.bring_window_to_front()
-                                
-                                if button_type == "关闭按钮":
-                                    should_click, target_button = self.recheck_and_verify_button(
-                                        button_type="关闭按钮",
-                                        delay_seconds=2,
-                                        find_method=self.detector.find_close_button,
-                                        current_target=target_button
-                                    )
-                                elif button_type == "返回按钮":
-                                    should_click, target_button = self.recheck_and_verify_button(
-                                        button_type="返回按钮",
-                                        delay_seconds=0.2,
-                                        find_method=self.detector.find_back_button,
-                                        current_target=target_button
-                                    )
-                                
-                                if not should_click:
-                                    continue
-                                
-                                time.sleep(0.01)
-                                
-                                self.screen_capture.get_window_rect()
-                                
-                                _, _, success = self.auto_clicker.click_center(target_button['bbox'])
-                                if success:
-                                    self.logger.info(f"已点击{button_type}")
-                                time.sleep(0.1)
-                
-                loop_time = time.time() - loop_start
-                sleep_time = max(0, 0.03 - loop_time)
-                time.sleep(sleep_time)
-                
-            except Exception as e:
-                self.logger.error(f"监控循环错误: {e}")
-                time.sleep(0.3)
+    def inference_conf(self):
+        """每帧只推理一次，阈值取各订阅者中最低的一个，再由总线按订阅者过滤"""
+        return self.detection_bus.min_conf(self.conf_var.get())
     
-    def draw_monitoring_overlay(self, image, detections, flash_state, fps=0, inference_time=0, capture_time=0):
-        display = image.copy()
-        h, w = display.shape[:2]
-        
-        ref_w, ref_h = 2560, 1440
-        scale_factor = min(w / ref_w, h / ref_h)
-        
-        scale_boost = 2.0
-        
-        if self.auto_grab_enabled and not self.is_paused:
-            overlay_color = (0, 255, 0)
-            status_text = "AUTO GRAB"
-        elif self.auto_grab_enabled and self.is_paused:
-            overlay_color = (0, 165, 255)
-            status_text = "PAUSED"
-        else:
-            overlay_color = (255, 200, 0)
-            status_text = "MONITORING"
-        
-        cv2.rectangle(display, (0, 0), (w, max(3, int(3 * scale_boost))), overlay_color, -1)
-        cv2.rectangle(display, (0, h - max(3, int(3 * scale_boost))), (w, h), overlay_color, -1)
-        cv2.rectangle(display, (0, 0), (max(3, int(3 * scale_boost)), h), overlay_color, -1)
-        cv2.rectangle(display, (w - max(3, int(3 * scale_boost)), 0), (w, h), overlay_color, -1)
-        
-        font_scale_status = 2.0 * scale_factor * scale_boost
-        font_scale_timestamp = 1.8 * scale_factor * scale_boost
-        font_scale_perf = 1.2 * scale_factor * scale_boost
-        font_scale_label = 0.5 * scale_factor * scale_boost
-        thickness_status = int(4 * scale_factor * scale_boost)
-        thickness_timestamp = int(4 * scale_factor * scale_boost)
-        thickness_perf = int(3 * scale_factor * scale_boost)
-        thickness_label = int(2 * scale_factor * scale_boost)
-        thickness_box = max(2, int(2 * scale_factor * scale_boost))
-        
-        y_offset_status = int(60 * scale_factor * scale_boost)
-        y_offset_perf = int(30 * scale_factor * scale_boost)
-        label_offset = int(10 * scale_factor * scale_boost)
-        
-        cv2.putText(display, status_text, (int(20 * scale_factor * scale_boost), y_offset_status), 
-                   cv2.FONT_HERSHEY_SIMPLEX, font_scale_status, overlay_color, thickness_status)
-        
-        timestamp = datetime.now().strftime('%H:%M:%S')
-        (ts_w, ts_h), _ = cv2.getTextSize(timestamp, cv2.FONT_HERSHEY_SIMPLEX, font_scale_timestamp, thickness_timestamp)
-        cv2.putText(display, timestamp, (int(w - ts_w - int(20 * scale_factor * scale_boost)), y_offset_status),
-                   cv2.FONT_HERSHEY_SIMPLEX, font_scale_timestamp, overlay_color, thickness_timestamp)
-        
-        perf_text = f"FPS: {fps:.1f} | Capture: {capture_time*1000:.0f}ms | Inference: {inference_time*1000:.0f}ms"
-        (pt_w, pt_h), _ = cv2.getTextSize(perf_text, cv2.FONT_HERSHEY_SIMPLEX, font_scale_perf, thickness_perf)
-        cv2.putText(display, perf_text, (int(20 * scale_factor * scale_boost), h - y_offset_perf),
-                   cv2.FONT_HERSHEY_SIMPLEX, font_scale_perf, (255, 255, 255), thickness_perf)
-        
-        for det in detections:
-            x1, y1, x2, y2 = det['bbox']
-            conf = det['confidence']
-            class_name = det['class_name']
-            
-            color = RedPocketDetector.BOX_COLORS.get(class_name, (128, 128, 128))
-            
-            cv2.rectangle(display, (x1, y1), (x2, y2), color, thickness_box)
-            
-            label = f"{class_name}: {conf:.2f}"
-            cv2.putText(display, label, (x1, y1 - label_offset), 
-                       cv2.FONT_HERSHEY_SIMPLEX, font_scale_label, color, thickness_label)
-        
-        return display
-                
-    def process_red_packet_simple(self, red_packet):
-        try:
-            if not self.auto_grab_enabled:
-                self.logger.info("抢红包已暂停，跳过此红包")
-                return
-            
-            self.logger.info(f"检测到红包! 置信度: {red_packet['confidence']:.2f}")
-            
-            self.screen_capture.bring_window_to_front()
-            time.sleep(0.03)
-            
-            self.screen_capture.get_window_rect()
-            
-            bbox = red_packet['bbox']
-            center_x, center_y, success = self.auto_clicker.click_center(bbox)
-            
-            if success:
-                self.logger.info(f"点击红包位置: ({center_x}, {center_y})")
-            else:
-                self.logger.error(f"点击红包失败: ({center_x}, {center_y})")
-            
-            time.sleep(0.1)
-            self.logger.info("红包已点击，等待监控循环检测开红包按钮...")
-        except Exception as e:
-            self.logger.error(f"处理红包出错: {e}")
-        finally:
-            self.is_handling_red_packet = False
+    def monitor_loop(self):
+        # 新流水线的累计滚动量从 0 开始，之前记录的红包位置不再可比
+        self.packet_memory.begin_session()
+        self.pipeline = MonitorPipeline(
+            capture_fn=self.frame_source.read,
+            pace_fn=self.frame_source.wait,
+            min_capture_interval=0.03 if self.frame_source.is_live else 0.0,
+            detect_fn=lambda image: self.detector.detect(image, self.inference_conf()),
+            incremental_fn=lambda image, change, previous: self.detector.detect_incremental(
+                image, change, previous, self.inference_conf()
+            ),
+            decide_fn=self.detection_bus.publish,
+            logger=self.logger,
+            change_detector=FrameChangeDetector(),
+            metrics=REGISTRY,
+            inference_threads=max(1, self.detector.inference_workers)
+        )
+        self.pipeline.run(lambda: self.is_running and not self.frame_source.exhausted)
+        if self.frame_source.exhausted:
+            self.logger.info(f"帧源 {self.frame_source.name} 已结束")
+    
+    def draw_preview_overlay(self, preview, packet, scale):
+        """在预览分辨率的图像上原地绘制监控叠加层（由 PreviewRenderer 在 Tk 主线程调用）"""
+        stats = self.pipeline.stats if self.pipeline is not None else None
+        with REGISTRY.timer('overlay'):
+            return self.overlay.draw(
+                preview, packet.detections, self.overlay_status(),
+                datetime.now().strftime('%H:%M:%S'),
+                frame_scale=scale,
+                fps=self.pipeline.fps if stats else 0,
+                inference_time=stats.last('inference') if stats else 0,
+                capture_time=stats.last('capture') if stats else 0,
+                skip_ratio=self.pipeline.skip_ratio if stats else 0
+            )
     
-
+    def update_detection_info(self, packet):
+        count = len(packet.detections)
+        if count != self._detection_count:
+            self._detection_count = count
+            self.detection_info_label.configure(text=f"检测结果: {count} 个目标")
     
-    def return_to_chat(self, max_attempts=10):
-        """
-        尝试返回群聊界面
+    def handle_frame(self, packet):
+        """'grab' 订阅的回调：packet 为按当前阈值过滤后的 DetectionEvent"""
+        self.current_image = packet.image
+        self.current_detections = packet.detections
+        self.action_executor.observe(packet)
         
-        Args:
-            max_attempts: 最大尝试次数，默认为10次
-        """
-        if not self.auto_grab_enabled:
-            self.logger.info("抢红包已暂停，跳过返回群聊")
+        if not (self.auto_grab_enabled and not self.is_paused):
+            self.grab_state.reset()
             return
-        
-        for attempt in range(max_attempts):
-            if not self.auto_grab_enabled:
-                self.logger.info("抢红包已暂停，停止返回")
-                return
-            result = self.screen_capture.capture_window()
-            if not result:
-                time.sleep(0.1)
-                continue
-                
-            current_image, _ = result
-            
-            lower_conf = max(0.3, self.conf_var.get() - 0.2)
-            current_detections = self.detector.detect(current_image, lower_conf)
-            
-            self.logger.info(f"检测到 {len(current_detections)} 个目标")
-            for det in current_detections:
-                self.logger.info(f"  - {det['class_name']}: {det['confidence']:.2f}")
-            
-            red_packets = self.detector.find_red_packets(current_detections)
-            if red_packets:
-                self.logger.info("已返回群聊")
-                return
-            
-            back_buttons = self.detector.find_back_button(current_detections)
-            if back_buttons:
-                self.logger.info(f"检测到返回按钮，点击返回")
-                self.screen_capture.bring_window_to_front()
-                time.sleep(0.05)
-                
-                self.screen_capture.get_window_rect()
-                
-                _, _, success = self.auto_clicker.click_center(back_buttons[0]['bbox'])
-                if success:
-                    self.logger.info("已点击返回按钮")
-                time.sleep(0.1)
-                continue
-            
-            close_buttons = self.detector.find_close_button(current_detections)
-            if close_buttons:
-                self.logger.info(f"检测到关闭按钮，点击关闭")
-                self.screen_capture.bring_window_to_front()
-                time.sleep(0.05)
-                
-                self.screen_capture.get_window_rect()
-                
-                _, _, success = self.auto_clicker.click_center(close_buttons[0]['bbox'])
-                if success:
-                    self.logger.info("已点击关闭按钮")
-                time.sleep(0.1)
-                continue
-            
-            self.logger.info(f"未检测到返回/关闭按钮 (尝试 {attempt + 1}/{max_attempts})")
-            time.sleep(0.1)
-        
-        self.logger.warning("多次尝试后仍未返回群聊，继续监控...")
+        self.grab_state.update(packet)
+    
+    def focus_window(self):
+        """点击前激活窗口并刷新窗口位置（在执行器线程中调用）"""
+        self.screen_capture.bring_window_to_front()
+        time.sleep(0.01)
+        self.screen_capture.get_window_rect()
+    
+    def overlay_status(self):
+        if self.auto_grab_enabled:
+            return 'paused' if self.is_paused else 'auto'
+        return 'monitoring'
     
-    def update_preview(self, image, detections):
-        display_image = image.copy()
-        
-        h, w = display_image.shape[:2]
-        canvas_w = self.preview_canvas.winfo_width()
-        canvas_h = self.preview_canvas.winfo_height()
-        
-        if canvas_w < 10 or canvas_h < 10:
-            return
-            
-        self.preview_scale = min(canvas_w / w, canvas_h / h)
-        new_w, new_h = int(w * self.preview_scale), int(h * self.preview_scale)
-        
-        self.preview_offset_x = (canvas_w - new_w) // 2
-        self.preview_offset_y = (canvas_h - new_h) // 2
-        
-        display_image = cv2.resize(display_image, (new_w, new_h))
-        display_image = cv2.cvtColor(display_image, cv2.COLOR_BGR2RGB)
-        
-        self.photo = ImageTk.PhotoImage(Image.fromarray(display_image))
-        
-        self.preview_canvas.delete("all")
-        self.preview_canvas.create_image(
-            self.preview_offset_x, self.preview_offset_y,
-            image=self.photo, anchor=tk.NW
-        )
-        
-        self.detection_info_label.configure(
-            text=f"检测结果: {len(detections)} 个目标"
-        )
-        
     def capture_and_save(self):
         if self.current_image is not None:
             filepath = self.data_labeler.save_image(self.current_image)
@@ -1321,9 +855,53 @@ class RedPocketApp:
         ttk.Button(train_window, text="开始训练", command=start_training).pack(pady=20)
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description='微信红包自动抢夺器 - YOLO版')
+    parser.add_argument('--source', choices=['screen', 'replay', 'synthetic'], default='screen',
+                        help='帧源：实时窗口 / 回放视频或图像目录 / 数据集合成')
+    parser.add_argument('--path', default=None, help='回放的视频文件或图像目录；合成时为数据集目录')
+    parser.add_argument('--mode', choices=REPLAY_MODES, default='timed', help='按原始节奏回放或全速回放')
+    parser.add_argument('--fps', type=float, default=None, help='回放/合成帧率')
+    parser.add_argument('--loop', action='store_true', help='回放结束后从头开始')
+    parser.add_argument('--capture-backend', choices=CAPTURE_BACKENDS, default='auto', help='实时捕获后端')
+    parser.add_argument('--preview-fps', type=float, default=15, help='预览的最大刷新帧率')
+    parser.add_argument('--headless', action='store_true', help='关闭预览渲染，监控和点击照常运行')
+    parser.add_argument('--packet-memory', default=None, metavar='PATH',
+                        help='已处理红包指纹记忆的 JSON 快照路径（启动时加载，停止监控和退出时保存）')
+    parser.add_argument('--color-gate', choices=COLOR_GATE_MODES, default='off',
+                        help='推理前的颜色预筛选；safe 时先在 dataset/ 上验证召回，达标才启用')
+    parser.add_argument('--inference-workers', type=int, default=0, metavar='N',
+                        help='推理进程数，N 个进程同时推理相邻的帧以利用多核 CPU，0 表示在主进程中推理')
+    parser.add_argument('--metrics-port', type=int, default=0,
+                        help='在 127.0.0.1 的该端口上提供 Prometheus 格式的 /metrics，0 表示不启用')
+    parser.add_argument('--metrics-interval', type=float, default=0,
+                        help='每隔多少秒输出一次 JSON 格式的指标快照，0 表示不输出')
+    parser.add_argument('--metrics-file', default=None, help='指标快照写入的 JSON Lines 文件，默认写入日志')
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
+    frame_source = None
+    if args.source == 'replay':
+        frame_source = create_frame_source('replay', path=args.path, mode=args.mode,
+                                           fps=args.fps, loop=args.loop, preload=args.mode == 'max')
+    elif args.source == 'synthetic':
+        frame_source = create_frame_source('synthetic', path=args.path, mode=args.mode,
+                                           fps=args.fps or 30.0)
+    
+    if args.metrics_port:
+        MetricsServer(REGISTRY, port=args.metrics_port).start()
+    if args.metrics_interval > 0:
+        MetricsReporter(REGISTRY, interval=args.metrics_interval, path=args.metrics_file).start()
+    
     root = tk.Tk()
-    app = RedPocketApp(root)
+    app = RedPocketApp(root, frame_source=frame_source,
+                       preview_fps=args.preview_fps, headless=args.headless,
+                       packet_memory_path=args.packet_memory,
+                       color_gate=args.color_gate,
+                       inference_workers=args.inference_workers)
+    app.screen_capture.set_capture_backend(args.capture_backend)
     root.mainloop()
 
 
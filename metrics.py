@@ -0,0 +1,373 @@
+"""
+进程内指标 - 各阶段耗时直方图、计数器，以及 Prometheus 文本格式导出和周期性 JSON 日志
+
+直方图采用 HDR 风格的对数-线性分桶：每个 2 的幂区间再等分为若干子桶，
+在固定内存下覆盖 1µs ~ 数分钟的范围，分位数相对误差约 1.6%，
+记录一次只是一次整数运算加一次计数，适合放在热路径上。
+
+默认使用模块级的 REGISTRY，各模块直接向其中记录：
+
+    from metrics import REGISTRY
+    with REGISTRY.timer('capture'):
+        ...
+    REGISTRY.counter('redpocket_clicks_total', '点击次数').inc()
+"""
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+STAGE_METRIC = 'redpocket_stage_seconds'
+SUMMARY_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class Histogram:
+    """
+    HDR 风格的耗时直方图（线程安全），数值以秒记录、以微秒分桶
+
+    Args:
+        precision_bits: 每个 2 的幂区间的子桶数为 2^(precision_bits-1)，
+            默认 6 位，相对误差约 1/32
+        max_seconds: 可记录的最大值，超过的样本计入最后一个桶
+    """
+
+    def __init__(self, precision_bits=6, max_seconds=600.0):
+        self.precision_bits = precision_bits
+        self._sub_count = 1 << precision_bits
+        self._half = self._sub_count >> 1
+        self._max_value = int(max_seconds * 1e6)
+        self._counts = [0] * (self._index(self._max_value) + 1)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        if value < self._sub_count:
+            return value
+        shift = value.bit_length() - self.precision_bits
+        return self._sub_count + (shift - 1) * self._half + ((value >> shift) - self._half)
+
+    def _bucket_range(self, index):
+        """桶 index 覆盖的微秒范围 [low, high]"""
+        if index < self._sub_count:
+            return index, index
+        k = index - self._sub_count
+        shift = k // self._half + 1
+        sub = k % self._half + self._half
+        return sub << shift, ((sub + 1) << shift) - 1
+
+    def record(self, seconds):
+        value = min(self._max_value, max(0, int(seconds * 1e6)))
+        index = self._index(value)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+            if self.min is None or seconds < self.min:
+                self.min = seconds
+            if self.max is None or seconds > self.max:
+                self.max = seconds
+
+    def quantiles(self, qs):
+        """
+        返回各分位数（秒），取所在桶的中点
+
+        Args:
+            qs: 0~1 之间的分位数序列，需升序
+        """
+        with self._lock:
+            total = self.count
+            if total == 0:
+                return [0.0 for _ in qs]
+            results = []
+            targets = iter(qs)
+            q = next(targets, None)
+            cumulative = 0
+            for index, c in enumerate(self._counts):
+                if not c:
+                    continue
+                cumulative += c
+                while q is not None and cumulative >= max(1, q * total):
+                    low, high = self._bucket_range(index)
+                    value = (low + high) / 2 / 1e6
+                    results.append(min(max(value, self.min), self.max))
+                    q = next(targets, None)
+                if q is None:
+                    break
+            while len(results) < len(qs):
+                results.append(self.max)
+            return results
+
+    def snapshot(self):
+        """{count, mean_ms, p50_ms, p90_ms, p99_ms, p999_ms, max_ms}"""
+        p50, p90, p99, p999 = self.quantiles(SUMMARY_QUANTILES)
+        with self._lock:
+            count, total, maximum = self.count, self.sum, self.max or 0.0
+        return {
+            'count': count,
+            'mean_ms': total / count * 1000 if count else 0.0,
+            'p50_ms': p50 * 1000,
+            'p90_ms': p90 * 1000,
+            'p99_ms': p99 * 1000,
+            'p999_ms': p999 * 1000,
+            'max_ms': maximum * 1000,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * len(self._counts)
+            self.count = 0
+            self.sum = 0.0
+            self.min = None
+            self.max = None
+
+
+class Counter:
+    """单调递增计数器（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def reset(self):
+        with self._lock:
+            self.value = 0
+
+
+class Gauge:
+    """瞬时值"""
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def reset(self):
+        self.value = 0.0
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape_label(value)}"' for key, value in items) + '}'
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+
+    同名指标按标签区分，首次访问时创建；help 文本以第一次注册时为准。
+    """
+
+    _TYPES = {Histogram: 'summary', Counter: 'counter', Gauge: 'gauge'}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._help = {}
+
+    def _get(self, kind, name, help_text, labels):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = self._metrics[key] = kind()
+                    self._help.setdefault(name, (help_text, self._TYPES[kind]))
+        return metric
+
+    def histogram(self, name, help_text='', **labels):
+        return self._get(Histogram, name, help_text, labels)
+
+    def counter(self, name, help_text='', **labels):
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text='', **labels):
+        return self._get(Gauge, name, help_text, labels)
+
+    def stage(self, stage):
+        """某处理阶段的耗时直方图"""
+        return self.histogram(STAGE_METRIC, '各处理阶段耗时（秒）', stage=stage)
+
+    @contextmanager
+    def timer(self, stage):
+        """记录 with 代码块的耗时到对应阶段（代码块抛出异常时同样记录）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage(stage).record(time.perf_counter() - start)
+
+    def failure(self, kind):
+        """失败计数"""
+        self.counter('redpocket_failures_total', '各类失败次数', kind=kind).inc()
+
+    def render_prometheus(self):
+        """导出 Prometheus 文本格式（直方图以 summary 形式导出分位数）"""
+        with self._lock:
+            items = sorted(self._metrics.items(), key=lambda item: item[0])
+        lines = []
+        current = None
+        for (name, labels), metric in items:
+            if name != current:
+                help_text, kind = self._help[name]
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                current = name
+            if isinstance(metric, Histogram):
+                for q, value in zip(SUMMARY_QUANTILES, metric.quantiles(SUMMARY_QUANTILES)):
+                    lines.append(f'{name}{_format_labels(labels, [("quantile", q)])} {value:.9g}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {metric.sum:.9g}')
+                lines.append(f'{name}_count{_format_labels(labels)} {metric.count}')
+            else:
+                lines.append(f'{name}{_format_labels(labels)} {metric.value:.9g}')
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """返回可 JSON 序列化的快照：{'stages': {...}, 'counters': {...}, 'gauges': {...}}"""
+        with self._lock:
+            items = list(self._metrics.items())
+        result = {'stages': {}, 'histograms': {}, 'counters': {}, 'gauges': {}}
+        for (name, labels), metric in items:
+            label_dict = dict(labels)
+            if isinstance(metric, Histogram):
+                if name == STAGE_METRIC and set(label_dict) == {'stage'}:
+                    result['stages'][label_dict['stage']] = metric.snapshot()
+                else:
+                    result['histograms'][name + _format_labels(labels)] = metric.snapshot()
+            else:
+                group = 'counters' if isinstance(metric, Counter) else 'gauges'
+                result[group][name + _format_labels(labels)] = metric.value
+        if not result['histograms']:
+            del result['histograms']
+        return result
+
+    def reset(self):
+        with self._lock:
+            for metric in self._metrics.values():
+                metric.reset()
+
+
+REGISTRY = MetricsRegistry()
+
+
+class MetricsServer:
+    """
+    在本地端口上以 Prometheus 文本格式提供 /metrics
+
+    Args:
+        registry: 指标注册表
+        port: 监听端口
+        host: 监听地址，默认只监听本机
+    """
+
+    def __init__(self, registry=REGISTRY, port=9464, host='127.0.0.1'):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def _make_handler(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        if self._server is not None:
+            return
+        self._server = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True)
+        self._thread.start()
+        logger.info(f"指标接口已启动: http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+
+
+class MetricsReporter:
+    """
+    周期性地把指标快照写成一行 JSON
+
+    Args:
+        registry: 指标注册表
+        interval: 输出间隔（秒）
+        path: JSON Lines 文件路径，None 时写入日志
+        log: 日志记录器
+    """
+
+    def __init__(self, registry=REGISTRY, interval=60.0, path=None, log=None):
+        self.registry = registry
+        self.interval = interval
+        self.path = path
+        self.log = log or logger
+        self._stop = threading.Event()
+        self._thread = None
+
+    def report(self):
+        record = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), **self.registry.snapshot()}
+        line = json.dumps(record, ensure_ascii=False)
+        if self.path:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        else:
+            self.log.info(f"指标: {line}")
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.report()
+            except Exception as e:
+                self.log.warning(f"输出指标失败: {e}")
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='metrics-reporter', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+        self._thread = None
@@ -0,0 +1,589 @@
+"""
+多窗口监控 - 同时监控多个微信实例（多开 / 多账号），跨窗口批量推理
+
+    轮流捕获所有窗口 → FairScheduler → 批量推理（一次模型调用）→ 按窗口分发决策
+
+每个窗口是一个 MonitorTarget：有自己的捕获函数、帧差分和决策函数
+（通常是该窗口 DetectionBus 的 publish，驱动独立的 GrabStateMachine 和点击器）。
+所有窗口共用一个推理线程和一个模型：FairScheduler 每次从有新帧的窗口中
+按"最久未被服务"的顺序取出最多 max_batch 帧，合并为一次 detect_batch() 调用，
+相比 N 个各自推理的监控循环，省去了 N-1 次逐帧的模型调度开销，推理库也能在更大的批上并行。
+画面未变化的窗口复用上一次的结果，不进入批次。
+
+所有窗口的点击动作共用一把鼠标锁（ActionExecutor(lock=...)），不同窗口的点击不会交错。
+
+用法:
+    python multi_monitor.py --title 微信 --weights models/best.pt --max-batch 4
+"""
+import sys
+import time
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from action_executor import ActionExecutor
+from color_gate import ColorGate
+from detection_bus import DetectionBus
+from frame_diff import FrameChangeDetector
+from metrics import REGISTRY
+from packet_memory import OpenedPacketMemory
+from pipeline import FramePacket, MonitorPipeline, StageStats
+from resolution_policy import ResolutionPolicy
+from state_machine import GrabStateMachine
+from window_control import AutoClicker, ScreenCapture
+
+
+class MonitorTarget:
+    """
+    被监控的一个窗口
+
+    Args:
+        name: 窗口名称（用于日志）
+        capture_fn: 无参函数，返回 (image, rect) 或 None
+        decide_fn: 接收 FramePacket，执行该窗口的点击决策
+        pace_fn: 每次捕获前调用的无参函数，可选（按节奏回放的帧源）
+        change_detector: FrameChangeDetector，可选；画面未变化时复用上一次的检测结果
+        resolution_policy: 该窗口自己的 ResolutionPolicy，可选，供 detect_fn 使用
+        prefilter: 该窗口自己的推理前预筛选，可选，供 detect_fn 使用
+
+    Attributes:
+        frames: 捕获的帧数
+        inferred: 参与推理的帧数
+        skipped: 画面未变化而跳过推理的帧数
+        replaced: 等待推理期间被新帧覆盖的帧数
+    """
+
+    def __init__(self, name, capture_fn, decide_fn, pace_fn=None, change_detector=None,
+                 resolution_policy=None, prefilter=None):
+        self.name = name
+        self.capture_fn = capture_fn
+        self.decide_fn = decide_fn
+        self.pace_fn = pace_fn
+        self.change_detector = change_detector
+        self.resolution_policy = resolution_policy
+        self.prefilter = prefilter
+
+        self.last_detections = None
+        self.in_flight = False
+        self.retry_at = 0.0
+        self.scroll_offset = 0
+        self.frames = 0
+        self.inferred = 0
+        self.skipped = 0
+        self.replaced = 0
+
+    def reset(self):
+        self.last_detections = None
+        self.in_flight = False
+        self.retry_at = 0.0
+        self.scroll_offset = 0
+        if self.change_detector is not None:
+            self.change_detector.reset()
+
+    def __repr__(self):
+        return f"MonitorTarget({self.name!r})"
+
+
+class FairScheduler:
+    """
+    多窗口的公平批调度器（线程安全）
+
+    每个窗口只保留最新的一帧（新帧覆盖尚未推理的旧帧），
+    next_batch() 按"最久未被服务"的顺序从有新帧的窗口中取出最多 max_batch 帧，
+    max_batch 小于窗口数时各窗口轮流进入批次，不会因为某个窗口画面变化频繁而饿死其他窗口。
+
+    Args:
+        max_batch: 每批最多的帧数
+    """
+
+    def __init__(self, max_batch=4):
+        self.max_batch = max(1, max_batch)
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._served = {}
+        self._sequence = 0
+        self._closed = False
+
+    def submit(self, items):
+        """提交一轮捕获得到的 [(target, packet)]，同一窗口未推理的旧帧被覆盖"""
+        with self._cond:
+            if self._closed:
+                return
+            for target, packet in items:
+                if target in self._pending:
+                    target.replaced += 1
+                self._pending[target] = packet
+                target.in_flight = True
+            self._cond.notify()
+
+    def next_batch(self, timeout=None):
+        """
+        取出下一批
+
+        Returns:
+            list[(target, packet)]，超时或调度器已关闭时为空列表
+        """
+        with self._cond:
+            if not self._pending and not self._closed:
+                self._cond.wait(timeout)
+            if not self._pending:
+                return []
+            order = sorted(self._pending, key=lambda target: self._served.get(target, 0))
+            batch = []
+            for target in order[:self.max_batch]:
+                self._sequence += 1
+                self._served[target] = self._sequence
+                batch.append((target, self._pending.pop(target)))
+            return batch
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def reopen(self):
+        with self._cond:
+            for target in self._pending:
+                target.in_flight = False
+            self._pending.clear()
+            self._served.clear()
+            self._closed = False
+
+
+class LatestResults:
+    """
+    每个窗口一个"最新结果"槽位（线程安全）
+
+    新结果只覆盖同一窗口尚未决策的旧结果（新帧的结果已包含旧帧的信息），
+    不会挤掉其他窗口的结果；get() 按窗口首次有结果等待的先后顺序取出。
+
+    Attributes:
+        dropped: 被同一窗口的新结果覆盖的结果数
+    """
+
+    def __init__(self):
+        self.dropped = 0
+        self._slots = OrderedDict()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, target, packet):
+        with self._cond:
+            if self._closed:
+                return
+            if target in self._slots:
+                self.dropped += 1
+            self._slots[target] = packet
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """取出等待最久的窗口的最新结果 (target, packet)，超时或已关闭时返回 None"""
+        with self._cond:
+            if not self._slots and not self._closed:
+                self._cond.wait(timeout)
+            if not self._slots:
+                return None
+            return self._slots.popitem(last=False)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def reopen(self):
+        with self._cond:
+            self._slots.clear()
+            self._closed = False
+
+    def __len__(self):
+        with self._cond:
+            return len(self._slots)
+
+
+class MultiWindowMonitor:
+    """
+    多窗口 捕获 → 批量推理 → 决策 的流水线
+
+    捕获线程每轮依次捕获所有窗口并做帧差分，变化的帧交给 FairScheduler；
+    推理线程每次取一批调用 detect_fn；决策阶段运行在调用 run() 的线程中，
+    按窗口调用各自的 decide_fn。结果按窗口各保留最新一份（LatestResults），
+    某个窗口的结果再多也不会挤掉其他窗口还没决策的推理结果。
+
+    Args:
+        targets: MonitorTarget 列表
+        detect_fn: detect_fn(images, targets) -> 与 images 一一对应的检测结果列表
+        max_batch: 每次模型调用最多合并的帧数，None 表示窗口数；为 1 时相当于各窗口轮流单独推理
+        min_capture_interval: 两轮捕获之间的最小间隔（秒）
+        stats: StageStats 实例，可选
+        logger: 日志记录器
+        metrics: metrics.MetricsRegistry，可选；记录各阶段耗时、帧数和批大小
+    """
+
+    METRIC_STAGES = MonitorPipeline.METRIC_STAGES
+
+    def __init__(self, targets, detect_fn, max_batch=None, min_capture_interval=0.03,
+                 stats=None, logger=None, metrics=None):
+        self.targets = list(targets)
+        self.detect_fn = detect_fn
+        self.min_capture_interval = min_capture_interval
+        self.stats = stats or StageStats()
+        self.logger = logger or logging.getLogger('MultiWindowMonitor')
+        self.metrics = metrics
+        self.scheduler = FairScheduler(max_batch or len(self.targets))
+        self.result_queue = LatestResults()
+
+        self.fps = 0.0
+        self.batches = 0
+        self.batched_frames = 0
+        self._running = False
+        self._threads = []
+
+    def _record(self, stage, seconds):
+        self.stats.record(stage, seconds)
+        if self.metrics is not None:
+            self.metrics.stage(self.METRIC_STAGES.get(stage, stage)).record(seconds)
+
+    def _count(self, name, help_text, amount=1):
+        if self.metrics is not None:
+            self.metrics.counter(name, help_text).inc(amount)
+
+    def _failure(self, kind):
+        if self.metrics is not None:
+            self.metrics.failure(kind)
+
+    @property
+    def is_running(self):
+        return self._running
+
+    @property
+    def mean_batch_size(self):
+        return self.batched_frames / self.batches if self.batches else 0.0
+
+    def _capture(self, target):
+        """捕获一个窗口，返回需要推理的 FramePacket；捕获失败或画面未变化时返回 None"""
+        if target.pace_fn is not None:
+            target.pace_fn()
+        start = time.perf_counter()
+        try:
+            result = target.capture_fn()
+        except Exception as e:
+            self.logger.error(f"捕获窗口 {target.name} 出错: {e}")
+            result = None
+        elapsed = time.perf_counter() - start
+
+        if result is None:
+            self._failure('capture')
+            self.logger.warning(f"无法捕获窗口 {target.name}")
+            target.retry_at = time.monotonic() + 0.3
+            return None
+
+        self._record('capture', elapsed)
+        self._count('redpocket_frames_total', '捕获的帧数')
+        target.frames += 1
+        image, rect = result
+        packet = FramePacket(target.frames, image, rect, time.time(), elapsed)
+
+        if target.change_detector is not None:
+            start = time.perf_counter()
+            packet.change = target.change_detector.check(image)
+            self._record('diff', time.perf_counter() - start)
+            target.scroll_offset += packet.change.scroll_dy
+            packet.scroll_offset = target.scroll_offset
+            if not packet.change.changed and target.last_detections is not None:
+                if target.in_flight:
+                    # 上一帧仍在等待推理，它的结果同样适用于这一帧
+                    return None
+                self._count('redpocket_frames_skipped_total', '画面未变化而跳过推理的帧数')
+                target.skipped += 1
+                packet.detections = target.last_detections
+                packet.skipped = True
+                self.result_queue.put(target, packet)
+                return None
+        return packet
+
+    def _capture_loop(self):
+        while self._running:
+            start = time.perf_counter()
+            now = time.monotonic()
+            batch = []
+            attempted = False
+            for target in self.targets:
+                if not self._running:
+                    break
+                if now < target.retry_at:
+                    continue
+                attempted = True
+                packet = self._capture(target)
+                if packet is not None:
+                    batch.append((target, packet))
+            if batch:
+                self.scheduler.submit(batch)
+
+            wait = self.min_capture_interval - (time.perf_counter() - start)
+            if not attempted:
+                wait = max(wait, 0.05)
+            if wait > 0:
+                time.sleep(wait)
+
+    def _inference_loop(self):
+        while self._running:
+            batch = self.scheduler.next_batch(timeout=0.1)
+            if not batch:
+                continue
+            targets = [target for target, _ in batch]
+            start = time.perf_counter()
+            try:
+                results = self.detect_fn([packet.image for _, packet in batch], targets)
+            except Exception as e:
+                self._failure('inference')
+                self.logger.error(f"批量推理错误: {e}")
+                for target in targets:
+                    target.in_flight = False
+                    if target.change_detector is not None:
+                        target.change_detector.reset()
+                continue
+            elapsed = time.perf_counter() - start
+            self._record('inference', elapsed)
+            self.batches += 1
+            self.batched_frames += len(batch)
+            self._count('redpocket_batches_total', '批量推理次数')
+            self._count('redpocket_batched_frames_total', '参与批量推理的帧数', len(batch))
+
+            for (target, packet), detections in zip(batch, results):
+                packet.detections = detections
+                packet.inference_time = elapsed
+                target.last_detections = detections
+                target.in_flight = False
+                target.inferred += 1
+                self.result_queue.put(target, packet)
+
+    def _spawn(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self.stats.reset()
+        for target in self.targets:
+            target.reset()
+            if target.change_detector is not None:
+                target.change_detector.reset_stats()
+        self.scheduler.reopen()
+        self.result_queue.reopen()
+        self._spawn(self._capture_loop, 'multi-capture')
+        self._spawn(self._inference_loop, 'multi-inference')
+
+    def stop(self, timeout=1.0):
+        self._running = False
+        self.scheduler.close()
+        self.result_queue.close()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+        self._threads = []
+
+    def run(self, should_continue=lambda: True):
+        """
+        启动捕获和推理线程，并在当前线程中运行决策阶段，直到 should_continue() 返回 False
+        """
+        self.start()
+        last_fps_time = time.time()
+        frame_count = 0
+        try:
+            while self._running and should_continue():
+                item = self.result_queue.get(timeout=0.1)
+                if item is None:
+                    continue
+                target, packet = item
+
+                start = time.perf_counter()
+                try:
+                    target.decide_fn(packet)
+                except Exception as e:
+                    self._failure('decide')
+                    self.logger.error(f"窗口 {target.name} 决策阶段错误: {e}")
+                self._record('decide', time.perf_counter() - start)
+
+                frame_count += 1
+                now = time.time()
+                if now - last_fps_time >= 1.0:
+                    self.fps = frame_count / (now - last_fps_time)
+                    if self.metrics is not None:
+                        self.metrics.gauge('redpocket_fps', '决策阶段帧率').set(self.fps)
+                        self.metrics.gauge('redpocket_batch_size', '平均批大小').set(self.mean_batch_size)
+                    frame_count = 0
+                    last_fps_time = now
+        finally:
+            self.stop()
+
+
+class WindowSession:
+    """
+    一个真实微信窗口的完整处理链：捕获、检测总线、抢红包状态机、动作执行器和点击器
+
+    每个窗口（账号）有独立的已处理红包记忆：同一个红包在不同账号中都可以领取。
+
+    Args:
+        index: 窗口序号
+        window_info: platform_adapter 返回的窗口信息
+        detector: 所有窗口共用的 RedPocketDetector
+        conf: 置信度阈值
+        mouse_lock: 所有窗口共用的鼠标锁
+        capture_backend: 捕获后端
+        dry_run: 只记录点击而不移动鼠标
+        color_gate: 是否为该窗口启用颜色预筛选
+    """
+
+    def __init__(self, index, window_info, detector, conf, mouse_lock,
+                 capture_backend='auto', dry_run=False, color_gate=False):
+        self.name = f"#{index} {window_info.get('title', '')}"
+        self.logger = logging.getLogger(f'Window#{index}')
+        self.conf = conf
+        self.screen_capture = ScreenCapture(capture_backend)
+        self.screen_capture.set_window(window_info)
+        self.clicker = AutoClicker(self.screen_capture)
+        self.clicker.dry_run = dry_run
+
+        self.executor = ActionExecutor(self.logger, lock=mouse_lock)
+        self.bus = DetectionBus(self.logger)
+        self.grab_state = GrabStateMachine(
+            detector, self.executor,
+            focus_fn=self.focus_window,
+            click_fn=self.clicker.click_center,
+            logger=self.logger,
+            memory=OpenedPacketMemory()
+        )
+        self.bus.subscribe('grab', conf=lambda: self.grab_state.detection_conf(self.conf),
+                           callback=self.handle_frame)
+
+        policy = ResolutionPolicy(detector.classes)
+        policy.enabled = detector.resolution_policy.enabled
+        self.target = MonitorTarget(
+            self.name, self.screen_capture.capture_window, self.bus.publish,
+            change_detector=FrameChangeDetector(),
+            resolution_policy=policy,
+            prefilter=ColorGate(bypass_fn=lambda: self.grab_state.needs_full_inference) if color_gate else None
+        )
+
+    def handle_frame(self, event):
+        self.executor.observe(event)
+        self.grab_state.update(event)
+
+    def focus_window(self):
+        """点击前激活窗口并刷新窗口位置（在执行器线程中调用，持有鼠标锁）"""
+        self.screen_capture.bring_window_to_front()
+        time.sleep(0.01)
+        self.screen_capture.get_window_rect()
+
+    def inference_conf(self):
+        return self.bus.min_conf(self.conf)
+
+    def start(self):
+        self.grab_state.memory.begin_session()
+        self.executor.start()
+
+    def stop(self):
+        self.executor.stop()
+        self.grab_state.reset()
+        self.screen_capture.reset_mss()
+
+
+def find_windows(title_contains):
+    """查找所有标题包含指定文字的窗口"""
+    from platform_adapter import get_platform_adapter
+    return get_platform_adapter().find_target_windows(title_contains)
+
+
+def parse_args():
+    from capture_backends import CAPTURE_BACKENDS
+
+    parser = argparse.ArgumentParser(description='多窗口（多开 / 多账号）无界面监控，跨窗口批量推理')
+    parser.add_argument('--title', default='微信', help='窗口标题包含的文字')
+    parser.add_argument('--max-windows', type=int, default=None, help='最多监控的窗口数')
+    parser.add_argument('--max-batch', type=int, default=None, help='每次模型调用最多合并的帧数，默认为窗口数')
+    parser.add_argument('--weights', default='models/best.pt', help='模型路径（.pt / .onnx / OpenVINO 目录）')
+    parser.add_argument('--backend', choices=['auto', 'torch', 'onnx', 'openvino'], default='auto', help='推理后端')
+    parser.add_argument('--threads', type=int, default=None, help='ONNX Runtime / OpenVINO 推理线程数')
+    parser.add_argument('--inference-workers', type=int, default=0,
+                        help='推理进程数，一批中的帧同时分发给多个进程；0 表示在主进程中推理')
+    parser.add_argument('--conf', type=float, default=0.5, help='置信度阈值')
+    parser.add_argument('--capture-backend', choices=CAPTURE_BACKENDS, default='auto', help='实时捕获后端')
+    parser.add_argument('--fixed-resolution', action='store_true', help='关闭自适应推理分辨率')
+    parser.add_argument('--color-gate', action='store_true', help='为每个窗口启用推理前的颜色预筛选')
+    parser.add_argument('--dry-run', action='store_true', help='只记录点击而不移动鼠标')
+    return parser.parse_args()
+
+
+def main():
+    from detector import RedPocketDetector
+
+    args = parse_args()
+    logger = logging.getLogger('MultiWindowMonitor')
+
+    windows = find_windows(args.title)[:args.max_windows]
+    if not windows:
+        logger.error(f"未找到标题包含 '{args.title}' 的窗口")
+        sys.exit(1)
+
+    detector = RedPocketDetector(logger=logger)
+    detector.num_threads = args.threads
+    detector.inference_workers = args.inference_workers
+    detector.resolution_policy.enabled = not args.fixed_resolution
+    if not Path(args.weights).exists():
+        logger.error(f"模型文件不存在: {args.weights}")
+        sys.exit(1)
+    if not detector.load_model(args.weights, backend=args.backend):
+        sys.exit(1)
+
+    mouse_lock = threading.Lock()
+    sessions = [
+        WindowSession(i, info, detector, args.conf, mouse_lock,
+                      capture_backend=args.capture_backend, dry_run=args.dry_run,
+                      color_gate=args.color_gate)
+        for i, info in enumerate(windows, 1)
+    ]
+    for session in sessions:
+        logger.info(f"监控窗口 {session.name}")
+
+    def detect(images, targets):
+        conf = min(session.inference_conf() for session in sessions)
+        return detector.detect_batch(images, conf,
+                                     policies=[t.resolution_policy for t in targets],
+                                     prefilters=[t.prefilter for t in targets])
+
+    monitor = MultiWindowMonitor(
+        [session.target for session in sessions], detect,
+        max_batch=args.max_batch, logger=logger, metrics=REGISTRY
+    )
+    for session in sessions:
+        session.start()
+    logger.info(f"开始监控 {len(sessions)} 个窗口（每批最多 {monitor.scheduler.max_batch} 帧），Ctrl+C 停止")
+    try:
+        monitor.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        monitor.stop()
+        for session in sessions:
+            session.stop()
+        detector.close()
+
+    logger.info(f"平均批大小: {monitor.mean_batch_size:.2f} ({monitor.batches} 次模型调用)")
+    for session in sessions:
+        target = session.target
+        logger.info(f"窗口 {target.name}: 捕获 {target.frames} 帧, 推理 {target.inferred} 帧, "
+                    f"跳过 {target.skipped} 帧, 被覆盖 {target.replaced} 帧")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
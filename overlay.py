@@ -0,0 +1,179 @@
+"""
+监控叠加层 - 在预览分辨率的图像上绘制状态边框、文字和检测框
+
+原实现先在全分辨率帧的拷贝上绘制，再整体缩放到预览尺寸；
+这里改为在已经缩放好的预览图上原地绘制，检测框坐标按预览比例换算：
+
+- 边框颜色、粗细和状态文字按 (预览尺寸, 状态) 预先生成为静态图层并缓存
+- 文字预先渲染为掩码精灵（状态、时间戳、检测标签），每帧只做小区域的掩码赋值
+- 只有每帧都变化的性能文字仍直接调用 cv2.putText
+
+尺寸参数仍以 2560x1440 的原始捕获分辨率为参考，保证缩放后的外观与原来一致。
+"""
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+STATUS_STYLES = {
+    'auto': ((0, 255, 0), "AUTO GRAB"),
+    'paused': ((0, 165, 255), "PAUSED"),
+    'monitoring': ((255, 200, 0), "MONITORING"),
+}
+
+
+class _TextSprite:
+    """预先渲染的单色文字掩码，origin 为 putText 的基线起点相对掩码左上角的偏移"""
+
+    __slots__ = ('mask', 'color', 'width', 'height', 'origin')
+
+    def __init__(self, text, font_scale, thickness, color):
+        (text_w, text_h), baseline = cv2.getTextSize(text, FONT, font_scale, thickness)
+        pad = thickness + 1
+        self.width = text_w + 2 * pad
+        self.height = text_h + baseline + 2 * pad
+        self.origin = (pad, pad + text_h)
+        canvas = np.zeros((self.height, self.width), dtype=np.uint8)
+        cv2.putText(canvas, text, self.origin, FONT, font_scale, 255, thickness)
+        self.mask = canvas.astype(bool)
+        self.color = np.array(color, dtype=np.uint8)
+
+    def blit(self, image, x, y):
+        """把文字绘制到 image 上，(x, y) 与 cv2.putText 的 org 含义相同"""
+        left = x - self.origin[0]
+        top = y - self.origin[1]
+        h, w = image.shape[:2]
+        x0, y0 = max(0, left), max(0, top)
+        x1, y1 = min(w, left + self.width), min(h, top + self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        mask = self.mask[y0 - top:y1 - top, x0 - left:x1 - left]
+        image[y0:y1, x0:x1][mask] = self.color
+
+
+class _Layout:
+    """某一预览尺寸和状态下的静态图层与字号参数"""
+
+    def __init__(self, w, h, frame_scale, status):
+        self.color, status_text = STATUS_STYLES[status]
+
+        # 以原始捕获分辨率计算参数，再按预览比例换算
+        boost = MonitoringOverlay.SCALE_BOOST
+        ref_w, ref_h = MonitoringOverlay.REF_SIZE
+        full_unit = min(w / frame_scale / ref_w, h / frame_scale / ref_h) * boost
+        unit = full_unit * frame_scale
+
+        def thickness(full_px):
+            return max(1, int(round(full_px * frame_scale)))
+
+        self.border = thickness(max(3, int(3 * boost)))
+        self.margin = int(20 * unit)
+        self.y_status = int(60 * unit)
+        self.y_perf = int(30 * unit)
+        self.label_offset = int(10 * unit)
+
+        self.timestamp_style = (1.8 * unit, thickness(int(4 * full_unit)))
+        self.perf_style = (1.2 * unit, thickness(int(3 * full_unit)))
+        self.label_style = (0.5 * unit, thickness(int(2 * full_unit)))
+        self.box_thickness = thickness(max(2, int(2 * full_unit)))
+
+        status_style = (2.0 * unit, thickness(int(4 * full_unit)))
+        self.status_sprite = _TextSprite(status_text, *status_style, self.color)
+
+    def draw_static(self, image):
+        h, w = image.shape[:2]
+        b = self.border
+        image[:b, :] = self.color
+        image[h - b:, :] = self.color
+        image[:, :b] = self.color
+        image[:, w - b:] = self.color
+        self.status_sprite.blit(image, self.margin, self.y_status)
+
+
+class MonitoringOverlay:
+    """
+    监控预览叠加层
+
+    Args:
+        box_colors: {类别名: BGR 颜色}
+        max_sprites: 文字精灵缓存的最大条目数（检测标签随置信度变化，需要限制）
+    """
+
+    REF_SIZE = (2560, 1440)
+    SCALE_BOOST = 2.0
+
+    def __init__(self, box_colors, max_sprites=256):
+        self.box_colors = box_colors
+        self.max_sprites = max_sprites
+        self._layouts = {}
+        self._sprites = OrderedDict()
+
+    def _layout(self, w, h, frame_scale, status):
+        key = (w, h, round(frame_scale, 6), status)
+        layout = self._layouts.get(key)
+        if layout is None:
+            if len(self._layouts) >= 16:
+                self._layouts.clear()
+            layout = self._layouts[key] = _Layout(w, h, frame_scale, status)
+        return layout
+
+    def _sprite(self, text, style, color):
+        key = (text, style, color)
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            sprite = self._sprites[key] = _TextSprite(text, *style, color)
+            if len(self._sprites) > self.max_sprites:
+                self._sprites.popitem(last=False)
+        else:
+            self._sprites.move_to_end(key)
+        return sprite
+
+    def draw(self, image, detections, status, timestamp, frame_scale=1.0,
+             fps=0, inference_time=0, capture_time=0, skip_ratio=0):
+        """
+        在 image 上原地绘制叠加层
+
+        Args:
+            image: 预览分辨率的 BGR 图像（会被修改）
+            detections: 原始捕获坐标下的检测结果（Detections 或字典列表）
+            status: 'auto' / 'paused' / 'monitoring'
+            timestamp: 右上角显示的时间字符串
+            frame_scale: image 相对原始捕获帧的缩放比例
+
+        Returns:
+            image
+        """
+        h, w = image.shape[:2]
+        layout = self._layout(w, h, frame_scale, status)
+        layout.draw_static(image)
+
+        ts_sprite = self._sprite(timestamp, layout.timestamp_style, layout.color)
+        ts_x = w - (ts_sprite.width - 2 * ts_sprite.origin[0]) - layout.margin
+        ts_sprite.blit(image, ts_x, layout.y_status)
+
+        perf_text = (f"FPS: {fps:.1f} | Capture: {capture_time*1000:.0f}ms | "
+                     f"Inference: {inference_time*1000:.0f}ms | Skip: {skip_ratio*100:.0f}%")
+        cv2.putText(image, perf_text, (layout.margin, h - layout.y_perf),
+                    FONT, layout.perf_style[0], (255, 255, 255), layout.perf_style[1])
+
+        for bbox, conf, class_name in self._iter_boxes(detections, frame_scale):
+            color = self.box_colors.get(class_name, (128, 128, 128))
+            x1, y1, x2, y2 = bbox
+            cv2.rectangle(image, (x1, y1), (x2, y2), color, layout.box_thickness)
+            label = self._sprite(f"{class_name}: {conf:.2f}", layout.label_style, color)
+            label.blit(image, x1, y1 - layout.label_offset)
+        return image
+
+    @staticmethod
+    def _iter_boxes(detections, frame_scale):
+        boxes = getattr(detections, 'boxes', None)
+        if boxes is not None:
+            scaled = (boxes * frame_scale).astype(np.int32).tolist()
+            names = [detections.class_name(c) for c in detections.class_ids.tolist()]
+            return zip(scaled, detections.confidences.tolist(), names)
+        return (
+            ([int(v * frame_scale) for v in det['bbox']], det['confidence'], det['class_name'])
+            for det in detections
+        )
@@ -0,0 +1,261 @@
+"""
+已处理红包记忆 - 以视觉指纹记住点过的红包，避免返回群聊后再次点击
+
+指纹由三部分组成：
+- 红包气泡裁剪图（向两侧外扩一些，带上头像/昵称等上下文）的 pHash 和 dHash，各 64 位
+- 气泡正上方一段（与气泡等高）的 aHash：同一发送者连发的红包外观相同，
+  但上方的消息不同，新红包的上方正是上一个红包，据此区分先后到达的红包
+- 气泡中心的相对位置，按流水线累计的滚动量换算到聊天记录坐标：
+  新消息把旧红包顶上去后，出现在同一槽位的新红包与旧记录位置不再接近
+
+候选红包与记忆中的某条记录哈希距离都不超过阈值、且位置足够接近时视为已处理，
+在派发点击之前跳过。每次命中会把记录的位置更新为当前位置，从而跟随滚动估计的误差。
+
+累计滚动量只在一次监控会话内有意义（流水线重建或程序重启时归零），
+记录因此带有会话编号：begin_session() 开始新的坐标系后，之前会话的记录
+和从快照加载的记录不再比较位置，只按气泡哈希和上方区域哈希匹配
+（没有上方区域哈希的记录无法与新到达的相同红包区分，不再参与匹配）；
+命中后记录换到当前会话，位置重新生效。
+
+记录按 LRU 淘汰，可选地保存为 JSON 快照，重启后继续生效。
+"""
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _pack64(bits):
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def dhash(gray):
+    """差值哈希：缩放到 9×8，比较水平相邻像素，64 位"""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    return _pack64((small[:, 1:] > small[:, :-1]).ravel())
+
+
+def ahash(gray):
+    """均值哈希：缩放到 8×8，与均值比较，64 位；大片纯色背景上也有足够多的有效位"""
+    small = cv2.resize(gray, (8, 8), interpolation=cv2.INTER_AREA)
+    return _pack64((small > small.mean()).ravel())
+
+
+def phash(gray):
+    """感知哈希：32×32 DCT 取左上 8×8 低频系数，与中位数比较，64 位"""
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8]
+    return _pack64((low > np.median(low)).ravel())
+
+
+class Fingerprint:
+    """
+    红包的视觉指纹
+
+    Attributes:
+        phash / dhash: 气泡裁剪图的 64 位哈希
+        cx / cy: 气泡中心的相对位置；cy 已加上滚动偏移，是聊天记录坐标而非屏幕坐标
+        above: 气泡上方一段的 aHash，上方空间不足（气泡贴近顶部）时为 None
+    """
+
+    __slots__ = ('phash', 'dhash', 'cx', 'cy', 'above')
+
+    def __init__(self, phash, dhash, cx, cy, above=None):
+        self.phash = phash
+        self.dhash = dhash
+        self.cx = cx
+        self.cy = cy
+        self.above = above
+
+    def distance(self, other):
+        """
+        (pHash 汉明距离, dHash 汉明距离, 上方区域 aHash 汉明距离, 相对位置距离)
+
+        任一方没有上方区域哈希时，上方区域距离记为 0（只靠其余条件判断）。
+        """
+        above = 0
+        if self.above is not None and other.above is not None:
+            above = (self.above ^ other.above).bit_count()
+        return ((self.phash ^ other.phash).bit_count(),
+                (self.dhash ^ other.dhash).bit_count(),
+                above,
+                max(abs(self.cx - other.cx), abs(self.cy - other.cy)))
+
+    def to_dict(self):
+        data = {'phash': f'{self.phash:016x}', 'dhash': f'{self.dhash:016x}',
+                'cx': round(self.cx, 4), 'cy': round(self.cy, 4)}
+        if self.above is not None:
+            data['above'] = f'{self.above:016x}'
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        above = data.get('above')
+        return cls(int(data['phash'], 16), int(data['dhash'], 16), float(data['cx']), float(data['cy']),
+                   int(above, 16) if above is not None else None)
+
+
+def _gray(crop):
+    return cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+
+
+def fingerprint(image, bbox, context=0.25, scroll_offset=0):
+    """
+    计算红包指纹
+
+    Args:
+        image: BGR 图像
+        bbox: [x1, y1, x2, y2]
+        context: 裁剪时向左右各外扩的比例（相对框宽度），带上头像等上下文
+        scroll_offset: 流水线累计的滚动量（像素，内容向上滚动为正），
+            加到气泡中心的纵坐标上，使位置不随滚动漂移
+    """
+    h, w = image.shape[:2]
+    x1, y1, x2, y2 = (int(v) for v in bbox)
+    pad = int((x2 - x1) * context)
+    left, right = max(0, x1 - pad), min(w, x2 + pad)
+    crop = image[max(0, y1):min(h, y2), left:right]
+    if crop.size == 0:
+        return None
+    gray = _gray(crop)
+
+    above = None
+    band = image[max(0, 2 * y1 - y2):max(0, y1), left:right]
+    if band.size and band.shape[0] * 2 >= y2 - y1:
+        above = ahash(_gray(band))
+
+    return Fingerprint(phash(gray), dhash(gray), (x1 + x2) / 2 / w,
+                       ((y1 + y2) / 2 + scroll_offset) / h, above)
+
+
+class OpenedPacketMemory:
+    """
+    已处理红包的 LRU 指纹记忆（线程安全）
+
+    Args:
+        capacity: 最多保留的记录数
+        phash_threshold / dhash_threshold / above_threshold: 视为同一红包的最大汉明距离
+        position_tolerance: 视为同一位置的最大相对距离（按宽、高分别计算）
+        context: 裁剪外扩比例，见 fingerprint()
+        path: JSON 快照路径，None 时只保存在内存中
+    """
+
+    def __init__(self, capacity=256, phash_threshold=8, dhash_threshold=10, above_threshold=8,
+                 position_tolerance=0.06, context=0.25, path=None):
+        self.capacity = capacity
+        self.phash_threshold = phash_threshold
+        self.dhash_threshold = dhash_threshold
+        self.above_threshold = above_threshold
+        self.position_tolerance = position_tolerance
+        self.context = context
+        self.path = path
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._session = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def begin_session(self):
+        """滚动量重新从 0 累计时调用（新建或重启流水线），之前记录的位置不再可比"""
+        with self._lock:
+            self._session += 1
+
+    def fingerprint(self, image, bbox, scroll_offset=0):
+        return fingerprint(image, bbox, self.context, scroll_offset)
+
+    def remember(self, image, bbox, scroll_offset=0):
+        """记住一个已处理的红包，返回其指纹；scroll_offset 见 fingerprint()"""
+        fp = self.fingerprint(image, bbox, scroll_offset)
+        if fp is not None:
+            self.remember_fingerprint(fp)
+        return fp
+
+    def remember_fingerprint(self, fp, timestamp=None, session=True):
+        """
+        Args:
+            session: True 表示当前会话；None 表示位置不可比的记录（如从快照加载）
+        """
+        with self._lock:
+            if session is True:
+                session = self._session
+            self._entries[self._next_id] = (fp, timestamp or time.time(), session)
+            self._next_id += 1
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def contains(self, image, bbox, scroll_offset=0):
+        """候选红包是否已处理过；命中时刷新该记录的 LRU 顺序和位置"""
+        fp = self.fingerprint(image, bbox, scroll_offset)
+        return fp is not None and self.match(fp) is not None
+
+    def match(self, fp):
+        """返回匹配的记录指纹，没有则返回 None"""
+        with self._lock:
+            best_key, best_score = None, None
+            for key, (entry, _, session) in self._entries.items():
+                p_dist, d_dist, above_dist, pos_dist = fp.distance(entry)
+                if session == self._session:
+                    position_ok = pos_dist <= self.position_tolerance
+                else:
+                    position_ok = fp.above is not None and entry.above is not None
+                if (p_dist <= self.phash_threshold and d_dist <= self.dhash_threshold
+                        and above_dist <= self.above_threshold and position_ok):
+                    score = p_dist + d_dist
+                    if best_score is None or score < best_score:
+                        best_key, best_score = key, score
+            if best_key is None:
+                return None
+            entry, _, _ = self._entries.pop(best_key)
+            entry.cx, entry.cy = fp.cx, fp.cy
+            self._entries[best_key] = (entry, time.time(), self._session)
+            self.hits += 1
+            return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def save(self, path=None):
+        """保存 JSON 快照（先写临时文件再替换）"""
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            records = [{**fp.to_dict(), 'time': round(ts, 3)} for fp, ts, _ in self._entries.values()]
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'entries': records}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        logger.info(f"已保存 {len(records)} 条已处理红包记录: {path}")
+
+    def load(self, path=None):
+        """加载 JSON 快照，文件不存在时忽略，返回加载的记录数"""
+        path = path or self.path
+        if not path or not os.path.exists(path):
+            return 0
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            records = data.get('entries', [])
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取已处理红包记录失败: {e}")
+            return 0
+        for record in records[-self.capacity:]:
+            try:
+                self.remember_fingerprint(Fingerprint.from_dict(record), record.get('time'), session=None)
+            except (KeyError, ValueError):
+                continue
+        logger.info(f"已加载 {len(self)} 条已处理红包记录: {path}")
+        return len(records)
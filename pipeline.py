@@ -0,0 +1,423 @@
+"""
+流水线监控引擎 - 将捕获、推理、决策、渲染拆分为并行阶段
+
+各阶段之间通过有界的"最新帧优先"队列连接，慢阶段只会丢弃过期帧，
+不会阻塞上游，整体帧率由最慢的阶段决定，而不是所有阶段耗时之和。
+"""
+import time
+import logging
+import threading
+from collections import deque
+
+
+class LatestFrameQueue:
+    """
+    有界的最新帧优先队列
+
+    队列满时丢弃最旧的元素，保证消费者总是拿到最新的数据。
+
+    Attributes:
+        maxsize: 队列容量
+        dropped: 因队列已满而被丢弃的元素数量
+    """
+
+    def __init__(self, maxsize=1):
+        self.maxsize = max(1, maxsize)
+        self.dropped = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, item):
+        with self._cond:
+            if self._closed:
+                return
+            while len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """取出最旧的元素，超时或队列已关闭时返回 None"""
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def reopen(self):
+        with self._cond:
+            self._items.clear()
+            self._closed = False
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+
+class StageStats:
+    """
+    各阶段耗时统计（线程安全）
+
+    每个阶段记录最近一次耗时、指数滑动平均和累计次数，单位为秒。
+    history > 0 时额外保留每个阶段最近 history 个样本，用于计算分位数（见 samples()）。
+    """
+
+    def __init__(self, smoothing=0.1, history=0):
+        self.smoothing = smoothing
+        self.history = history
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def record(self, stage, seconds):
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = {'last': seconds, 'avg': seconds, 'count': 1}
+                if self.history:
+                    entry['samples'] = deque(maxlen=self.history)
+            else:
+                entry['last'] = seconds
+                entry['avg'] += self.smoothing * (seconds - entry['avg'])
+                entry['count'] += 1
+            if self.history:
+                entry['samples'].append(seconds)
+
+    def last(self, stage):
+        with self._lock:
+            entry = self._stages.get(stage)
+            return entry['last'] if entry else 0.0
+
+    def snapshot(self):
+        """返回 {阶段: {'last_ms', 'avg_ms', 'count'}} 形式的副本"""
+        with self._lock:
+            return {
+                stage: {
+                    'last_ms': entry['last'] * 1000,
+                    'avg_ms': entry['avg'] * 1000,
+                    'count': entry['count'],
+                }
+                for stage, entry in self._stages.items()
+            }
+
+    def samples(self, stage):
+        """返回某阶段最近的耗时样本（秒），需要构造时指定 history"""
+        with self._lock:
+            entry = self._stages.get(stage)
+            return list(entry['samples']) if entry and 'samples' in entry else []
+
+    def stages(self):
+        with self._lock:
+            return list(self._stages)
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+
+class FramePacket:
+    """在流水线各阶段之间传递的单帧数据"""
+
+    __slots__ = ('frame_id', 'image', 'rect', 'timestamp', 'capture_time',
+                 'detections', 'inference_time', 'change', 'skipped', 'scroll_offset')
+
+    def __init__(self, frame_id, image, rect, timestamp, capture_time):
+        self.frame_id = frame_id
+        self.image = image
+        self.rect = rect
+        self.timestamp = timestamp
+        self.capture_time = capture_time
+        self.detections = []
+        self.inference_time = 0.0
+        self.change = None
+        self.skipped = False
+        # 截至本帧累计的滚动量（像素，内容向上滚动为正），按帧序在差分阶段累加
+        self.scroll_offset = 0
+
+
+class MonitorPipeline:
+    """
+    捕获 → 推理 → 决策/渲染 的多线程流水线
+
+    捕获和推理各自运行在独立线程中，决策阶段运行在调用 run() 的线程中，
+    渲染阶段可选地运行在单独线程中，不会拖慢点击决策。
+
+    Args:
+        capture_fn: 无参函数，返回 (image, rect) 或 None
+        detect_fn: 接收 image，返回检测结果列表
+        decide_fn: 接收 FramePacket，执行点击决策
+        render_fn: 接收 FramePacket，绘制预览，可选
+        min_capture_interval: 两次捕获之间的最小间隔（秒），用于限制空转
+        stats: StageStats 实例，可选
+        change_detector: FrameChangeDetector 实例，可选；画面未变化时复用上一次的检测结果
+        incremental_fn: 接收 (image, change, previous_detections) 的增量检测函数，可选；
+            需配合 change_detector 使用，只对变化区域推理
+        pace_fn: 每次捕获前调用的无参函数，可选；用于按节奏回放的帧源（等待时间不计入捕获耗时）
+        metrics: metrics.MetricsRegistry，可选；各阶段耗时同时记入其中的直方图，并统计帧数和失败次数
+        inference_threads: 推理线程数；detect_fn 背后是推理进程池时，多个线程可以同时推理相邻的帧。
+            大于 1 时不使用增量检测（增量检测依赖上一帧的结果），晚于更新帧完成的结果直接丢弃
+    """
+
+    # 流水线的 inference 阶段是整个 detect 调用（含前处理和解码），
+    # 在指标中记为 detect，inference 留给推理后端记录纯模型推理耗时
+    METRIC_STAGES = {'inference': 'detect'}
+
+    def __init__(self, capture_fn, detect_fn, decide_fn, render_fn=None,
+                 min_capture_interval=0.03, stats=None, logger=None,
+                 change_detector=None, incremental_fn=None, pace_fn=None, metrics=None,
+                 inference_threads=1):
+        self.capture_fn = capture_fn
+        self.pace_fn = pace_fn
+        self.metrics = metrics
+        self.detect_fn = detect_fn
+        self.decide_fn = decide_fn
+        self.render_fn = render_fn
+        self.min_capture_interval = min_capture_interval
+        self.stats = stats or StageStats()
+        self.logger = logger or logging.getLogger('MonitorPipeline')
+        self.change_detector = change_detector
+        self.incremental_fn = incremental_fn if inference_threads <= 1 else None
+        self.inference_threads = max(1, inference_threads)
+
+        self.frame_queue = LatestFrameQueue(1)
+        self.result_queue = LatestFrameQueue(1)
+        self.render_queue = LatestFrameQueue(1)
+
+        self.fps = 0.0
+        self._last_detections = None
+        self._last_frame_id = 0
+        self._result_lock = threading.Lock()
+        self._diff_lock = threading.Lock()
+        self._in_flight = 0
+        self._scroll_offset = 0
+        self._running = False
+        self._threads = []
+        self._frame_counter = 0
+
+    def _record(self, stage, seconds):
+        self.stats.record(stage, seconds)
+        if self.metrics is not None:
+            self.metrics.stage(self.METRIC_STAGES.get(stage, stage)).record(seconds)
+
+    def _count(self, name, help_text):
+        if self.metrics is not None:
+            self.metrics.counter(name, help_text).inc()
+
+    def _failure(self, kind):
+        if self.metrics is not None:
+            self.metrics.failure(kind)
+
+    @property
+    def is_running(self):
+        return self._running
+
+    @property
+    def skip_ratio(self):
+        """因画面未变化而跳过推理的帧占比"""
+        if self.change_detector is None:
+            return 0.0
+        return self.change_detector.skip_ratio
+
+    def _capture_loop(self):
+        while self._running:
+            if self.pace_fn is not None:
+                self.pace_fn()
+            start = time.perf_counter()
+            try:
+                result = self.capture_fn()
+            except Exception as e:
+                self.logger.error(f"捕获阶段错误: {e}")
+                result = None
+            elapsed = time.perf_counter() - start
+
+            if result is None:
+                self._failure('capture')
+                self.logger.warning("无法捕获窗口")
+                time.sleep(0.3)
+                continue
+
+            self._record('capture', elapsed)
+            self._count('redpocket_frames_total', '捕获的帧数')
+            image, rect = result
+            self._frame_counter += 1
+            self.frame_queue.put(FramePacket(self._frame_counter, image, rect, time.time(), elapsed))
+
+            wait = self.min_capture_interval - (time.perf_counter() - start)
+            if wait > 0:
+                time.sleep(wait)
+
+    def _next_packet(self):
+        """
+        取出下一帧并做帧差分，返回 (packet, 是否需要推理)
+
+        取帧和差分在同一把锁内完成：多个推理线程时差分仍按帧序进行，
+        帧差分的参考帧不会倒退。
+        """
+        with self._diff_lock:
+            packet = self.frame_queue.get(timeout=0.1)
+            if packet is None:
+                return None, False
+            if self.change_detector is not None:
+                start = time.perf_counter()
+                packet.change = self.change_detector.check(packet.image)
+                self._record('diff', time.perf_counter() - start)
+                # 在这里累加而不是在决策阶段：结果队列只保留最新一帧，决策阶段会漏掉中间帧的滚动
+                self._scroll_offset += packet.change.scroll_dy
+                packet.scroll_offset = self._scroll_offset
+                if not packet.change.changed and self._last_detections is not None:
+                    return packet, False
+            with self._result_lock:
+                self._in_flight += 1
+            return packet, True
+
+    def _inference_loop(self):
+        while self._running:
+            packet, infer = self._next_packet()
+            if packet is None:
+                continue
+            if not infer:
+                self._count('redpocket_frames_skipped_total', '画面未变化而跳过推理的帧数')
+                packet.skipped = True
+                self._accept(packet)
+                continue
+
+            start = time.perf_counter()
+            try:
+                if (self.incremental_fn is not None and packet.change is not None
+                        and self._last_detections is not None):
+                    packet.detections = self.incremental_fn(
+                        packet.image, packet.change, self._last_detections
+                    )
+                else:
+                    packet.detections = self.detect_fn(packet.image)
+            except Exception as e:
+                self._failure('inference')
+                self.logger.error(f"推理阶段错误: {e}")
+                with self._diff_lock:
+                    if self.change_detector is not None:
+                        self.change_detector.reset()
+                with self._result_lock:
+                    self._in_flight -= 1
+                continue
+            packet.inference_time = time.perf_counter() - start
+            self._record('inference', packet.inference_time)
+            self._accept(packet, inferred=True)
+
+    def _accept(self, packet, inferred=False):
+        """
+        按帧序发布结果；多个推理线程时，比已发布的帧更旧的结果直接丢弃
+
+        未变化的帧复用最近一次的检测结果；若更早的变化帧还在推理中，
+        该帧的画面与之相同，由那一帧的结果代表，不再发布过期的检测结果。
+        """
+        with self._result_lock:
+            if inferred:
+                self._in_flight -= 1
+            elif self._in_flight:
+                return
+            if packet.frame_id <= self._last_frame_id:
+                self._count('redpocket_frames_stale_total', '推理完成时已有更新帧结果而丢弃的帧数')
+                return
+            self._last_frame_id = packet.frame_id
+            if inferred:
+                self._last_detections = packet.detections
+            else:
+                packet.detections = self._last_detections
+            self._publish(packet)
+
+    def _publish(self, packet):
+        self.result_queue.put(packet)
+        if self.render_fn is not None:
+            self.render_queue.put(packet)
+
+    def _render_loop(self):
+        while self._running:
+            packet = self.render_queue.get(timeout=0.1)
+            if packet is None:
+                continue
+            start = time.perf_counter()
+            try:
+                self.render_fn(packet)
+            except Exception as e:
+                self._failure('render')
+                self.logger.error(f"渲染阶段错误: {e}")
+            self._record('render', time.perf_counter() - start)
+
+    def _spawn(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self.stats.reset()
+        self._last_detections = None
+        self._last_frame_id = 0
+        self._in_flight = 0
+        self._scroll_offset = 0
+        self._frame_counter = 0
+        if self.change_detector is not None:
+            self.change_detector.reset()
+            self.change_detector.reset_stats()
+        for queue in (self.frame_queue, self.result_queue, self.render_queue):
+            queue.reopen()
+        self._spawn(self._capture_loop, 'pipeline-capture')
+        for index in range(self.inference_threads):
+            self._spawn(self._inference_loop,
+                        'pipeline-inference' if index == 0 else f'pipeline-inference-{index}')
+        if self.render_fn is not None:
+            self._spawn(self._render_loop, 'pipeline-render')
+
+    def stop(self, timeout=1.0):
+        self._running = False
+        for queue in (self.frame_queue, self.result_queue, self.render_queue):
+            queue.close()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+        self._threads = []
+
+    def run(self, should_continue=lambda: True):
+        """
+        启动流水线并在当前线程中运行决策阶段，直到 should_continue() 返回 False
+
+        Args:
+            should_continue: 无参函数，返回 False 时停止流水线
+        """
+        self.start()
+        last_fps_time = time.time()
+        frame_count = 0
+        try:
+            while self._running and should_continue():
+                packet = self.result_queue.get(timeout=0.1)
+                if packet is None:
+                    continue
+
+                start = time.perf_counter()
+                try:
+                    self.decide_fn(packet)
+                except Exception as e:
+                    self._failure('decide')
+                    self.logger.error(f"决策阶段错误: {e}")
+                    time.sleep(0.3)
+                self._record('decide', time.perf_counter() - start)
+
+                frame_count += 1
+                now = time.time()
+                if now - last_fps_time >= 1.0:
+                    self.fps = frame_count / (now - last_fps_time)
+                    if self.metrics is not None:
+                        self.metrics.gauge('redpocket_fps', '决策阶段帧率').set(self.fps)
+                    frame_count = 0
+                    last_fps_time = now
+        finally:
+            self.stop()
@@ -3,7 +3,8 @@
 """
 import sys
 import logging
-from typing import Optional, Tuple
+import threading
+from typing import List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +19,11 @@ class PlatformAdapter:
         """查找包含指定标题的窗口"""
         raise NotImplementedError
     
+    def find_target_windows(self, title_contains: str) -> List[dict]:
+        """查找所有包含指定标题的窗口（多开时每个实例一个窗口）"""
+        window = self.find_target_window(title_contains)
+        return [window] if window else []
+    
     def bring_window_to_front(self, window_info: dict) -> bool:
         """将窗口带到前台"""
         raise NotImplementedError
@@ -25,6 +31,14 @@ class PlatformAdapter:
     def get_window_rect(self, window_info: dict) -> Optional[Tuple[int, int, int, int]]:
         """获取窗口位置和大小 (x1, y1, x2, y2)"""
         raise NotImplementedError
+    
+    def geometry_changed(self, window_info: dict) -> bool:
+        """
+        窗口自上次调用以来是否收到了移动/缩放事件（非阻塞）
+        
+        不支持窗口事件的平台返回 False，由调用方依靠缓存过期时间刷新。
+        """
+        return False
 
 
 class WindowsAdapter(PlatformAdapter):
@@ -40,6 +54,10 @@ class WindowsAdapter(PlatformAdapter):
         self.win32api = win32api
     
     def find_target_window(self, title_contains: str) -> Optional[dict]:
+        windows = self.find_target_windows(title_contains)
+        return windows[0] if windows else None
+    
+    def find_target_windows(self, title_contains: str) -> List[dict]:
         windows = []
         
         def callback(hwnd, _):
@@ -53,7 +71,7 @@ class WindowsAdapter(PlatformAdapter):
             return True
         
         self.win32gui.EnumWindows(callback, None)
-        return windows[0] if windows else None
+        return windows
     
     def bring_window_to_front(self, window_info: dict) -> bool:
         try:
@@ -93,9 +111,14 @@ class MacOSAdapter(PlatformAdapter):
             logger.warning("未安装 pyobjc，macOS 窗口管理功能受限")
     
     def find_target_window(self, title_contains: str) -> Optional[dict]:
+        windows = self.find_target_windows(title_contains)
+        return windows[0] if windows else None
+    
+    def find_target_windows(self, title_contains: str) -> List[dict]:
         if not self.has_appkit:
-            return None
+            return []
         
+        found = []
         try:
             windows = self.CGWindowListCopyWindowInfo(
                 self.kCGWindowListOptionOnScreenOnly,
@@ -105,15 +128,15 @@ class MacOSAdapter(PlatformAdapter):
             for window in windows:
                 window_name = window.get('kCGWindowName', '')
                 if title_contains in window_name:
-                    return {
+                    found.append({
                         'window_id': window.get('kCGWindowNumber'),
                         'title': window_name,
                         'owner_pid': window.get('kCGWindowOwnerPID')
-                    }
+                    })
         except Exception as e:
             logger.error(f"查找窗口失败: {e}")
         
-        return None
+        return found
     
     def bring_window_to_front(self, window_info: dict) -> bool:
         if not self.has_appkit:
@@ -136,73 +159,269 @@ class MacOSAdapter(PlatformAdapter):
 
 
 class LinuxAdapter(PlatformAdapter):
-    """Linux 平台适配器 (RK 系列等)"""
+    """
+    Linux 平台适配器 (RK 系列等)
+    
+    窗口查找基于 EWMH 的 _NET_CLIENT_LIST 建立索引：首次查找时批量发送所有
+    标题属性请求再统一读取应答，之后通过根窗口和各客户窗口上的 PropertyNotify
+    事件增量更新，不再逐个递归遍历窗口树。窗口管理器不支持 EWMH 时回退到
+    递归遍历（找到第一个匹配即停止）。可在 Xvfb + 任意 EWMH 窗口管理器下测试。
+    """
     
     def __init__(self):
         super().__init__()
+        self._watched_windows = set()
+        self._configured_windows = set()
+        self._event_masks = {}
+        self._window_index = None
+        self._stale_titles = set()
+        self._client_list_dirty = False
+        # python-xlib 的连接不是线程安全的：捕获线程（geometry_changed）和
+        # 动作执行器线程（激活窗口、读取位置）对同一连接的访问都经过这把锁
+        self._lock = threading.RLock()
         try:
             import Xlib.display
             import Xlib.X
+            import Xlib.protocol.request
+            self.X = Xlib.X
+            self._request = Xlib.protocol.request
             self.display = Xlib.display.Display()
+            self.root = self.display.screen().root
+            self._atoms = {
+                name: self.display.intern_atom(name)
+                for name in ('_NET_CLIENT_LIST', '_NET_WM_NAME', 'WM_NAME', 'UTF8_STRING')
+            }
             self.has_xlib = True
         except ImportError:
             self.has_xlib = False
             logger.warning("未安装 python-xlib，Linux 窗口管理功能受限")
     
+    def _select_events(self, window, mask):
+        """在窗口上追加事件掩码（X 的事件掩码按客户端整体替换，需要自行合并）"""
+        current = self._event_masks.get(window.id, 0)
+        if current & mask == mask:
+            return
+        self._event_masks[window.id] = current | mask
+        window.change_attributes(event_mask=current | mask)
+    
+    def _get_client_ids(self):
+        prop = self.root.get_full_property(self._atoms['_NET_CLIENT_LIST'], self.X.AnyPropertyType)
+        if prop is None:
+            return None
+        return list(prop.value)
+    
+    def _fetch_titles(self, window_ids):
+        """
+        批量获取窗口标题
+        
+        先为所有窗口发送 _NET_WM_NAME / WM_NAME 请求（不等待应答），
+        再统一读取，整批只需要一次往返延迟。
+        """
+        requests = []
+        for wid in window_ids:
+            pair = []
+            for atom_name in ('_NET_WM_NAME', 'WM_NAME'):
+                pair.append(self._request.GetProperty(
+                    display=self.display.display,
+                    defer=True,
+                    delete=False,
+                    window=wid,
+                    property=self._atoms[atom_name],
+                    type=self.X.AnyPropertyType,
+                    long_offset=0,
+                    long_length=1024
+                ))
+            requests.append((wid, pair))
+        self.display.flush()
+        
+        titles = {}
+        for wid, pair in requests:
+            title = ''
+            for req in pair:
+                try:
+                    req.reply()
+                    if not req.property_type:
+                        continue
+                    _, value = req.value
+                    if isinstance(value, bytes):
+                        encoding = 'utf-8' if req.property_type == self._atoms['UTF8_STRING'] else 'latin-1'
+                        value = value.decode(encoding, errors='replace')
+                    if value:
+                        title = value
+                        break
+                except Exception:
+                    continue
+            titles[wid] = title
+        return titles
+    
+    def _add_windows(self, window_ids):
+        titles = self._fetch_titles(window_ids)
+        for wid, title in titles.items():
+            window = self.display.create_resource_object('window', wid)
+            self._window_index[wid] = {'window': window, 'title': title}
+            try:
+                self._select_events(window, self.X.PropertyChangeMask)
+            except Exception:
+                pass
+    
+    def _build_window_index(self):
+        """从 _NET_CLIENT_LIST 建立窗口索引，窗口管理器不支持时返回 False"""
+        client_ids = self._get_client_ids()
+        if client_ids is None:
+            return False
+        self._window_index = {}
+        self._select_events(self.root, self.X.PropertyChangeMask)
+        self._add_windows(client_ids)
+        self.display.flush()
+        return True
+    
+    def _refresh_window_index(self):
+        """根据已收到的 PropertyNotify 事件增量更新索引"""
+        if self._client_list_dirty:
+            self._client_list_dirty = False
+            client_ids = self._get_client_ids() or []
+            current = set(client_ids)
+            for wid in list(self._window_index):
+                if wid not in current:
+                    del self._window_index[wid]
+                    self._event_masks.pop(wid, None)
+            new_ids = [wid for wid in client_ids if wid not in self._window_index]
+            if new_ids:
+                self._add_windows(new_ids)
+        
+        stale = [wid for wid in self._stale_titles if wid in self._window_index]
+        self._stale_titles.clear()
+        if stale:
+            for wid, title in self._fetch_titles(stale).items():
+                self._window_index[wid]['title'] = title
+    
     def find_target_window(self, title_contains: str) -> Optional[dict]:
         if not self.has_xlib:
             return None
         
-        try:
-            root = self.display.screen().root
-            windows = self._search_windows(root, title_contains)
-            return windows[0] if windows else None
-        except Exception as e:
-            logger.error(f"查找窗口失败: {e}")
-            return None
+        with self._lock:
+            try:
+                if self._window_index is None and not self._build_window_index():
+                    return self._search_windows(self.root, title_contains)
+            
+                self._drain_events()
+                self._refresh_window_index()
+                for entry in self._window_index.values():
+                    if title_contains in entry['title']:
+                        return dict(entry)
+                return None
+            except Exception as e:
+                logger.error(f"查找窗口失败: {e}")
+                return None
+    
+    def find_target_windows(self, title_contains: str) -> List[dict]:
+        if not self.has_xlib:
+            return []
+        
+        with self._lock:
+            try:
+                if self._window_index is None and not self._build_window_index():
+                    found = []
+                    self._search_windows(self.root, title_contains, found)
+                    return found
+            
+                self._drain_events()
+                self._refresh_window_index()
+                return [dict(entry) for entry in self._window_index.values() if title_contains in entry['title']]
+            except Exception as e:
+                logger.error(f"查找窗口失败: {e}")
+                return []
     
-    def _search_windows(self, window, title_contains: str):
-        """递归搜索窗口"""
-        result = []
+    def _search_windows(self, window, title_contains: str, found=None):
+        """
+        递归搜索窗口（不支持 EWMH 时的回退方案）
+        
+        found 为 None 时找到第一个匹配即返回；传入列表时收集所有匹配的窗口。
+        """
         try:
             title = window.get_wm_name()
             if title and title_contains in title:
-                result.append({
+                entry = {
                     'window': window,
                     'title': title
-                })
+                }
+                if found is None:
+                    return entry
+                found.append(entry)
             
             for child in window.query_tree().children:
-                result.extend(self._search_windows(child, title_contains))
+                result = self._search_windows(child, title_contains, found)
+                if result:
+                    return result
         except:
             pass
-        return result
+        return None
     
     def bring_window_to_front(self, window_info: dict) -> bool:
         if not self.has_xlib:
             return False
         
-        try:
-            window = window_info['window']
-            window.set_input_focus(Xlib.X.RevertToParent, Xlib.X.CurrentTime)
-            window.configure(stack_mode=Xlib.X.Above)
-            self.display.flush()
-            return True
-        except Exception as e:
-            logger.error(f"激活窗口失败: {e}")
-            return False
+        with self._lock:
+            try:
+                window = window_info['window']
+                window.set_input_focus(self.X.RevertToParent, self.X.CurrentTime)
+                window.configure(stack_mode=self.X.Above)
+                self.display.flush()
+                return True
+            except Exception as e:
+                logger.error(f"激活窗口失败: {e}")
+                return False
     
     def get_window_rect(self, window_info: dict) -> Optional[Tuple[int, int, int, int]]:
         if not self.has_xlib:
             return None
         
-        try:
-            window = window_info['window']
-            geom = window.get_geometry()
-            return (geom.x, geom.y, geom.x + geom.width, geom.y + geom.height)
-        except Exception as e:
-            logger.error(f"获取窗口位置失败: {e}")
-            return None
+        with self._lock:
+            try:
+                window = window_info['window']
+                geom = window.get_geometry()
+                return (geom.x, geom.y, geom.x + geom.width, geom.y + geom.height)
+            except Exception as e:
+                logger.error(f"获取窗口位置失败: {e}")
+                return None
+    
+    def _drain_events(self):
+        """处理所有已到达的 X 事件（非阻塞）"""
+        while self.display.pending_events():
+            event = self.display.next_event()
+            if event.type == self.X.ConfigureNotify:
+                self._configured_windows.add(event.window.id)
+            elif event.type == self.X.DestroyNotify:
+                self._configured_windows.add(event.window.id)
+                self._watched_windows.discard(event.window.id)
+            elif event.type == self.X.PropertyNotify and self._window_index is not None:
+                if event.window.id == self.root.id:
+                    if event.atom == self._atoms['_NET_CLIENT_LIST']:
+                        self._client_list_dirty = True
+                elif event.atom in (self._atoms['_NET_WM_NAME'], self._atoms['WM_NAME']):
+                    self._stale_titles.add(event.window.id)
+    
+    def geometry_changed(self, window_info: dict) -> bool:
+        if not self.has_xlib:
+            return False
+        
+        with self._lock:
+            try:
+                window = window_info['window']
+                if window.id not in self._watched_windows:
+                    self._select_events(window, self.X.StructureNotifyMask)
+                    self.display.flush()
+                    self._watched_windows.add(window.id)
+                    return True
+            
+                self._drain_events()
+                if window.id in self._configured_windows:
+                    self._configured_windows.discard(window.id)
+                    return True
+                return False
+            except Exception as e:
+                logger.error(f"处理窗口事件失败: {e}")
+                return True
 
 
 def get_platform_adapter() -> PlatformAdapter:
@@ -0,0 +1,149 @@
+"""
+预览渲染器 - 在 Tk 主线程中按固定帧率拉取最新帧并绘制到画布
+
+流水线只把最新的 FramePacket 交给 submit()（一次引用赋值），
+缩放、叠加层绘制、颜色转换和 PhotoImage 更新都在 Tk 的 after 回调中完成，
+不再占用捕获/推理/决策线程，也不会从工作线程调用 Tk。
+
+- 先缩放到预览分辨率，再在小图上绘制叠加层
+- 缩放和颜色转换写入复用的缓冲区
+- 画布上的图像条目只创建一次，之后用 PhotoImage.paste() 原地更新
+- headless=True 时完全不渲染
+"""
+import time
+
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+from metrics import REGISTRY
+
+
+class PreviewRenderer:
+    """
+    Tk after 驱动的限速预览渲染器
+
+    Args:
+        root: Tk 根窗口（用于 after 调度）
+        canvas: 预览画布
+        draw_fn: 叠加层绘制函数 draw_fn(preview_bgr, packet, scale)，在预览分辨率的
+            BGR 图像上绘制并返回要显示的图像；scale 为预览相对原图的缩放比例
+        fps: 最大预览帧率
+        headless: 为 True 时不渲染任何内容
+        on_frame: 每次绘制完成后调用 on_frame(packet)，可选（用于更新状态标签等）
+
+    Attributes:
+        scale: 当前预览缩放比例
+        offset_x / offset_y: 预览图在画布中的偏移
+        rendered: 已绘制的帧数
+    """
+
+    def __init__(self, root, canvas, draw_fn=None, fps=15, headless=False, on_frame=None):
+        self.root = root
+        self.canvas = canvas
+        self.draw_fn = draw_fn
+        self.fps = fps
+        self.headless = headless
+        self.on_frame = on_frame
+
+        self.scale = 1.0
+        self.offset_x = 0
+        self.offset_y = 0
+        self.rendered = 0
+
+        self._packet = None
+        self._drawn_packet = None
+        self._after_id = None
+        self._running = False
+        self._item = None
+        self._photo = None
+        self._resized = None
+        self._rgb = None
+        self._offset = None
+
+    def submit(self, packet):
+        """提交最新帧（任意线程调用，只保留最后一帧）"""
+        if not self.headless:
+            self._packet = packet
+
+    def start(self):
+        if self.headless or self._running:
+            return
+        self._running = True
+        self._schedule(0)
+
+    def stop(self):
+        self._running = False
+        if self._after_id is not None:
+            try:
+                self.root.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
+        self._packet = None
+        self._drawn_packet = None
+
+    def _schedule(self, delay_ms):
+        self._after_id = self.root.after(max(1, int(delay_ms)), self._tick)
+
+    def _tick(self):
+        self._after_id = None
+        if not self._running:
+            return
+        start = time.perf_counter()
+        packet = self._packet
+        if packet is not None and packet is not self._drawn_packet:
+            try:
+                self._render(packet)
+            finally:
+                self._drawn_packet = packet
+            REGISTRY.stage('preview').record(time.perf_counter() - start)
+        interval = 1000.0 / max(1, self.fps)
+        self._schedule(interval - (time.perf_counter() - start) * 1000)
+
+    def _buffer(self, name, shape):
+        buffer = getattr(self, name)
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape, dtype=np.uint8)
+            setattr(self, name, buffer)
+        return buffer
+
+    def _render(self, packet):
+        image = packet.image
+        h, w = image.shape[:2]
+        canvas_w = self.canvas.winfo_width()
+        canvas_h = self.canvas.winfo_height()
+        if canvas_w < 10 or canvas_h < 10:
+            return
+
+        self.scale = min(canvas_w / w, canvas_h / h)
+        new_w, new_h = max(1, int(w * self.scale)), max(1, int(h * self.scale))
+        self.offset_x = (canvas_w - new_w) // 2
+        self.offset_y = (canvas_h - new_h) // 2
+
+        display = self._buffer('_resized', (new_h, new_w, 3))
+        cv2.resize(image, (new_w, new_h), dst=display, interpolation=cv2.INTER_LINEAR)
+        if self.draw_fn is not None:
+            display = self.draw_fn(display, packet, self.scale)
+        rgb = self._buffer('_rgb', (new_h, new_w, 3))
+        cv2.cvtColor(display, cv2.COLOR_BGR2RGB, dst=rgb)
+        pil_image = Image.fromarray(rgb)
+
+        if self._photo is None or (self._photo.width(), self._photo.height()) != (new_w, new_h):
+            self._photo = ImageTk.PhotoImage(pil_image)
+            if self._item is None:
+                self._item = self.canvas.create_image(self.offset_x, self.offset_y,
+                                                      image=self._photo, anchor='nw')
+                self.canvas.tag_lower(self._item)
+            else:
+                self.canvas.itemconfigure(self._item, image=self._photo)
+        else:
+            self._photo.paste(pil_image)
+
+        if self._offset != (self.offset_x, self.offset_y):
+            self.canvas.coords(self._item, self.offset_x, self.offset_y)
+            self._offset = (self.offset_x, self.offset_y)
+
+        self.rendered += 1
+        if self.on_frame is not None:
+            self.on_frame(packet)
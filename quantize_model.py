@@ -0,0 +1,298 @@
+import sys
+import time
+import yaml
+import argparse
+import logging
+import statistics
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from config_utils import load_classes_from_config
+from inference_backends import create_backend, export_model, letterbox, to_blob
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg')
+
+
+def list_images(image_dir, limit=None):
+    images = sorted(p for p in Path(image_dir).iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    return images[:limit] if limit else images
+
+
+class ValImageCalibrationReader:
+    """
+    ONNX Runtime 静态量化的校准数据读取器
+
+    按推理时相同的方式（letterbox + 归一化）预处理 dataset/images/val 中的图像。
+    校准时使用固定的方形输入，保证所有批次形状一致。
+    """
+
+    def __init__(self, images, input_name, imgsz):
+        self.images = list(images)
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self._iter = iter(self.images)
+
+    def get_next(self):
+        for image_path in self._iter:
+            image = cv2.imread(str(image_path))
+            if image is None:
+                continue
+            padded, _, _ = letterbox(image, self.imgsz, auto=False)
+            return {self.input_name: to_blob(padded)}
+        return None
+
+    def rewind(self):
+        self._iter = iter(self.images)
+
+
+def quantize_onnx(weights_path, calib_images, imgsz):
+    """使用 ONNX Runtime 静态量化生成 QDQ 格式的 INT8 ONNX 模型"""
+    import onnx
+    import onnxruntime as ort
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+
+    fp32_path = export_model(weights_path, 'onnx', imgsz, logger)
+    int8_path = fp32_path.with_name(f'{fp32_path.stem}_int8.onnx')
+
+    source_path = fp32_path
+    try:
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+        prepared_path = fp32_path.with_name(f'{fp32_path.stem}_prep.onnx')
+        quant_pre_process(str(fp32_path), str(prepared_path))
+        source_path = prepared_path
+    except Exception as e:
+        logger.warning(f"量化前处理失败，直接使用原始 ONNX 模型: {e}")
+
+    input_name = ort.InferenceSession(str(source_path), providers=['CPUExecutionProvider']).get_inputs()[0].name
+    logger.info(f"使用 {len(calib_images)} 张验证集图像进行校准...")
+    quantize_static(
+        str(source_path),
+        str(int8_path),
+        ValImageCalibrationReader(calib_images, input_name, imgsz),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+
+    fp32_model = onnx.load(str(fp32_path))
+    int8_model = onnx.load(str(int8_path))
+    existing = {prop.key for prop in int8_model.metadata_props}
+    for prop in fp32_model.metadata_props:
+        if prop.key not in existing:
+            int8_model.metadata_props.add(key=prop.key, value=prop.value)
+    onnx.save(int8_model, str(int8_path))
+
+    if source_path != fp32_path:
+        source_path.unlink(missing_ok=True)
+    return fp32_path, int8_path
+
+
+def quantize_openvino(weights_path, data_yaml, imgsz, fraction):
+    """使用 ultralytics + NNCF 生成 INT8 OpenVINO IR，校准集为 data_yaml 中的 val 划分"""
+    from ultralytics import YOLO
+
+    fp32_path = export_model(weights_path, 'openvino', imgsz, logger)
+    logger.info("正在导出 INT8 OpenVINO 模型 (NNCF 校准)...")
+    int8_path = Path(YOLO(str(weights_path)).export(
+        format='openvino', int8=True, data=data_yaml, imgsz=imgsz, fraction=fraction
+    ))
+    return fp32_path, int8_path
+
+
+def evaluate_map(model_path, data_yaml, imgsz):
+    """与 train_with_best_practices.py 相同的验证指标"""
+    from ultralytics import YOLO
+
+    val_results = YOLO(str(model_path), task='detect').val(
+        data=data_yaml,
+        split='val',
+        imgsz=imgsz,
+        device='cpu',
+        verbose=False
+    )
+    return {
+        'mAP50': float(val_results.box.map50),
+        'mAP50-95': float(val_results.box.map),
+        'precision': float(val_results.box.mp),
+        'recall': float(val_results.box.mr),
+    }
+
+
+def _current_rss_mb():
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    except ImportError:
+        return None
+
+
+def _measure_latency_worker(backend_name, model_path, class_names, image_paths, imgsz, num_threads, warmup):
+    rss_before = _current_rss_mb()
+    backend = create_backend(backend_name, model_path, class_names, imgsz=imgsz, num_threads=num_threads)
+    rss_loaded = _current_rss_mb()
+
+    images = [img for img in (cv2.imread(str(p)) for p in image_paths) if img is not None]
+    for image in images[:warmup]:
+        backend.predict(image)
+
+    latencies = []
+    for image in images:
+        start = time.perf_counter()
+        backend.predict(image)
+        latencies.append((time.perf_counter() - start) * 1000)
+    rss_after = _current_rss_mb()
+    return latencies, rss_before, rss_loaded, rss_after
+
+
+def measure_latency(backend_name, model_path, class_names, image_paths, imgsz, num_threads=None, warmup=3):
+    """
+    在独立子进程中测量推理延迟和内存占用，避免两个模型的内存互相干扰
+
+    Returns:
+        dict: 延迟 (ms) 中位数 / p95 / 平均值，以及模型加载后和推理后的常驻内存增量 (MB)
+    """
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        latencies, rss_before, rss_loaded, rss_after = pool.submit(
+            _measure_latency_worker, backend_name, str(model_path), class_names,
+            [str(p) for p in image_paths], imgsz, num_threads, warmup
+        ).result()
+
+    report = {
+        'latency_median_ms': statistics.median(latencies) if latencies else None,
+        'latency_p95_ms': float(np.percentile(latencies, 95)) if latencies else None,
+        'latency_mean_ms': statistics.fmean(latencies) if latencies else None,
+        'model_size_mb': _path_size_mb(model_path),
+    }
+    if rss_before is not None:
+        report['rss_model_mb'] = rss_loaded - rss_before
+        report['rss_peak_mb'] = rss_after - rss_before
+    return report
+
+
+def _path_size_mb(path):
+    path = Path(path)
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob('*') if p.is_file()) / 1024 ** 2
+    return path.stat().st_size / 1024 ** 2
+
+
+def _log_comparison(title, fp32, int8, keys, fmt):
+    logger.info(f"\n{title}:")
+    logger.info(f"  {'指标':<20}{'FP32':>12}{'INT8':>12}{'变化':>12}")
+    for key in keys:
+        a, b = fp32.get(key), int8.get(key)
+        if a is None or b is None:
+            continue
+        logger.info(f"  {key:<20}{a:>12{fmt}}{b:>12{fmt}}{b - a:>+12{fmt}}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='使用项目验证集对 YOLO 模型做 INT8 训练后量化')
+    parser.add_argument('--weights', default='models/best.pt', help='FP32 .pt 权重路径')
+    parser.add_argument('--format', choices=['onnx', 'openvino'], default='onnx', help='量化模型格式')
+    parser.add_argument('--data', default='dataset.yaml', help='数据集配置文件')
+    parser.add_argument('--imgsz', type=int, default=800, help='输入尺寸，与训练保持一致')
+    parser.add_argument('--calib-limit', type=int, default=300, help='最多使用的校准图像数')
+    parser.add_argument('--threads', type=int, default=None, help='延迟测试时的推理线程数')
+    parser.add_argument('--skip-map', action='store_true', help='跳过 mAP 评估，只测延迟和内存')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    logger.info("=" * 100)
+    logger.info(f"YOLO INT8 训练后量化 - {args.format}")
+    logger.info("=" * 100)
+
+    weights_path = Path(args.weights)
+    if not weights_path.exists():
+        logger.error(f"权重文件不存在: {weights_path}")
+        sys.exit(1)
+
+    with open(args.data, 'r', encoding='utf-8') as f:
+        data_config = yaml.safe_load(f)
+    val_dir = Path(data_config.get('path', '.')) / data_config['val']
+    if not val_dir.exists():
+        logger.error(f"验证集目录不存在: {val_dir}")
+        sys.exit(1)
+
+    calib_images = list_images(val_dir, args.calib_limit)
+    if not calib_images:
+        logger.error(f"验证集中没有图像: {val_dir}")
+        sys.exit(1)
+    class_names = load_classes_from_config(args.data, logger)
+
+    start_time = datetime.now()
+    if args.format == 'onnx':
+        fp32_path, int8_path = quantize_onnx(weights_path, calib_images, args.imgsz)
+    else:
+        total = len(list_images(val_dir))
+        fraction = min(1.0, args.calib_limit / total) if total else 1.0
+        fp32_path, int8_path = quantize_openvino(weights_path, args.data, args.imgsz, fraction)
+    logger.info(f"INT8 模型已保存到: {int8_path}")
+    logger.info(f"量化耗时: {(datetime.now() - start_time).total_seconds():.1f} 秒")
+
+    report = {
+        'timestamp': datetime.now().strftime("%Y%m%d_%H%M%S"),
+        'format': args.format,
+        'weights': str(weights_path),
+        'fp32_model': str(fp32_path),
+        'int8_model': str(int8_path),
+        'calibration_images': len(calib_images),
+        'imgsz': args.imgsz,
+    }
+
+    if not args.skip_map:
+        logger.info("\n正在评估 FP32 模型精度...")
+        fp32_metrics = evaluate_map(fp32_path, args.data, args.imgsz)
+        logger.info("正在评估 INT8 模型精度...")
+        int8_metrics = evaluate_map(int8_path, args.data, args.imgsz)
+        _log_comparison("验证结果", fp32_metrics, int8_metrics,
+                        ['mAP50', 'mAP50-95', 'precision', 'recall'], '.4f')
+        report['metrics'] = {'fp32': fp32_metrics, 'int8': int8_metrics}
+
+    latency_images = list_images(val_dir, 50)
+    logger.info(f"\n正在测量推理延迟 ({len(latency_images)} 张图像)...")
+    fp32_perf = measure_latency(args.format, fp32_path, class_names, latency_images, args.imgsz, args.threads)
+    int8_perf = measure_latency(args.format, int8_path, class_names, latency_images, args.imgsz, args.threads)
+    _log_comparison("性能对比", fp32_perf, int8_perf,
+                    ['latency_median_ms', 'latency_p95_ms', 'latency_mean_ms',
+                     'model_size_mb', 'rss_model_mb', 'rss_peak_mb'], '.1f')
+    if fp32_perf['latency_median_ms'] and int8_perf['latency_median_ms']:
+        speedup = fp32_perf['latency_median_ms'] / int8_perf['latency_median_ms']
+        logger.info(f"  INT8 加速比: {speedup:.2f}x")
+        report['speedup'] = speedup
+    report['performance'] = {'fp32': fp32_perf, 'int8': int8_perf}
+
+    report_file = weights_path.parent / f'{weights_path.stem}_int8_{args.format}_report.yaml'
+    with open(report_file, 'w', encoding='utf-8') as f:
+        yaml.dump(report, f, allow_unicode=True, sort_keys=False)
+    logger.info(f"\n量化报告已保存到: {report_file}")
+    logger.info(f"在主程序中通过 \"加载模型\" 选择 {int8_path} 即可直接使用量化模型")
+
+    logger.info("\n" + "=" * 100)
+    logger.info("所有任务完成!")
+    logger.info("=" * 100)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+推理分辨率策略 - 空闲时用小尺寸推理，出现红包候选后切换到全分辨率
+
+配合 FrameResizer 在送入模型之前按目标尺寸预缩放，
+缩放结果写入按线程复用的缓冲区，避免每帧重新分配整帧内存。
+"""
+import time
+import threading
+
+import cv2
+import numpy as np
+
+
+def round_up_to_stride(value, stride=32):
+    return int(-(-value // stride) * stride)
+
+
+class ResolutionPolicy:
+    """
+    自适应推理分辨率策略
+
+    空闲状态使用 idle_imgsz 并以略低的置信度寻找候选目标；一旦出现
+    trigger_classes 中的目标就切换到 active_imgsz，并在最后一次看到候选后
+    保持 hold_seconds 秒再回到空闲状态。
+
+    Args:
+        class_names: 类别名称列表
+        idle_imgsz: 空闲时的推理尺寸
+        active_imgsz: 活跃时的推理尺寸，None 表示使用模型默认（训练）尺寸
+        hold_seconds: 候选消失后保持全分辨率的时间
+        idle_conf_margin: 空闲时用于发现候选的置信度降低量
+        trigger_classes: 触发全分辨率的类别名称
+    """
+
+    def __init__(self, class_names, idle_imgsz=480, active_imgsz=None, hold_seconds=2.0,
+                 idle_conf_margin=0.15, trigger_classes=('red_packet', 'open_button')):
+        self.enabled = True
+        self.idle_imgsz = idle_imgsz
+        self.active_imgsz = active_imgsz
+        self.hold_seconds = hold_seconds
+        self.idle_conf_margin = idle_conf_margin
+        self.trigger_class_ids = {
+            i for i, name in enumerate(class_names) if name in trigger_classes
+        }
+        self._active_until = 0.0
+
+    def is_active(self, now=None):
+        return (now or time.monotonic()) < self._active_until
+
+    def activate(self, now=None):
+        self._active_until = (now or time.monotonic()) + self.hold_seconds
+
+    def deactivate(self):
+        self._active_until = 0.0
+
+    def observe(self, detections, now=None):
+        """根据检测结果更新状态，发现触发类别时返回 True"""
+        for class_id in self.trigger_class_ids:
+            if detections.has_class(class_id):
+                self.activate(now)
+                return True
+        return False
+
+
+class FrameResizer:
+    """
+    将帧按最长边缩放到目标尺寸，缩放结果写入复用的缓冲区
+
+    缓冲区按线程和目标形状缓存（空闲/活跃两种尺寸各一份），
+    多个线程同时调用 detect() 时互不干扰。
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def resize(self, image, imgsz, reuse=True):
+        """
+        Args:
+            image: 原图
+            imgsz: 目标最长边
+            reuse: 为 False 时写入新分配的数组（同一批内的多张图像需要各自的结果）
+
+        Returns:
+            tuple: (缩放后的图像, (x 方向缩放比例, y 方向缩放比例))；无需缩小时原样返回
+        """
+        h, w = image.shape[:2]
+        scale = imgsz / max(h, w)
+        if scale >= 1.0:
+            return image, (1.0, 1.0)
+
+        new_w, new_h = max(1, int(round(w * scale))), max(1, int(round(h * scale)))
+        shape = (new_h, new_w) + image.shape[2:]
+        if not reuse:
+            return (cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_AREA),
+                    (new_w / w, new_h / h))
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        key = (shape, image.dtype.str)
+        buffer = buffers.get(key)
+        if buffer is None:
+            if len(buffers) >= 4:
+                buffers.clear()
+            buffer = buffers[key] = np.empty(shape, dtype=image.dtype)
+        cv2.resize(image, (new_w, new_h), dst=buffer, interpolation=cv2.INTER_AREA)
+        return buffer, (new_w / w, new_h / h)
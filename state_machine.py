@@ -0,0 +1,280 @@
+"""
+抢红包状态机 - 由单一检测流驱动的红包处理流程
+
+    CHAT → PACKET_CLICKED → OPEN_DIALOG → RESULT → RETURNING → CHAT
+
+每帧通过 DetectionBus 的订阅调用 update(event)，状态机只根据流水线已经产生的检测结果推进，
+不再额外捕获或推理；点击等动作提交给 ActionExecutor 执行，不为每个事件创建线程。
+每个状态都有超时，超时后转入预定的状态，不会卡死在某一步。
+
+动作执行期间以及动作结束前捕获的帧不会触发新的动作，避免对同一画面重复点击。
+ObjectTracker 在每帧上更新：返回/关闭按钮以"已连续出现 N 毫秒"确认，
+点击过的红包在 track 上标记为已处理，不会被再次点击；
+可选的 OpenedPacketMemory 按视觉指纹记住点过的红包，返回群聊后（track 已丢失）也能跳过。
+"""
+import enum
+import logging
+import time
+
+from metrics import REGISTRY
+from tracker import ObjectTracker
+
+
+class GrabState(enum.Enum):
+    CHAT = 'chat'                      # 群聊界面，寻找红包
+    PACKET_CLICKED = 'packet_clicked'  # 已点击红包，等待开红包弹窗
+    OPEN_DIALOG = 'open_dialog'        # 开红包弹窗，连续点击"开"
+    RESULT = 'result'                  # 已点开，等待结果页稳定
+    RETURNING = 'returning'            # 点击返回/关闭，直到回到群聊
+
+
+# 各状态的超时（秒）及超时后转入的状态
+STATE_TIMEOUTS = {
+    GrabState.PACKET_CLICKED: (1.5, GrabState.CHAT),
+    GrabState.OPEN_DIALOG: (2.0, GrabState.RETURNING),
+    GrabState.RESULT: (0.3, GrabState.RETURNING),
+    GrabState.RETURNING: (5.0, GrabState.CHAT),
+}
+
+# 在群聊界面看到返回/关闭按钮时，要求按钮在检测流中连续出现一段时间再点击，避免误点
+BUTTON_STABLE_DURATIONS = {'back_button': 0.2, 'close_button': 2.0}
+BUTTON_NAMES = {'back_button': '返回按钮', 'close_button': '关闭按钮'}
+
+
+class GrabStateMachine:
+    """
+    红包处理状态机
+
+    Args:
+        detector: RedPocketDetector（只使用 select_target / find_best 等查询方法）
+        executor: ActionExecutor
+        focus_fn: 点击前调用，激活窗口并刷新窗口位置
+        click_fn: click_fn(bbox) -> (x, y, success)，在执行器线程中调用
+        logger: 日志记录器
+        burst_duration: 开红包按钮连续点击的时长（秒）
+        timeouts: 覆盖 STATE_TIMEOUTS 中的超时秒数，{GrabState: 秒}
+        tracker: ObjectTracker，默认新建
+        memory: OpenedPacketMemory，可选
+    """
+
+    def __init__(self, detector, executor, focus_fn, click_fn, logger=None,
+                 burst_duration=0.2, timeouts=None, tracker=None, memory=None):
+        self.detector = detector
+        self.executor = executor
+        self.tracker = tracker or ObjectTracker()
+        self.memory = memory
+        self.focus_fn = focus_fn
+        self.click_fn = click_fn
+        self.logger = logger or logging.getLogger(__name__)
+        self.burst_duration = burst_duration
+        self.timeouts = {state: seconds for state, (seconds, _) in STATE_TIMEOUTS.items()}
+        self.timeouts.update(timeouts or {})
+
+        self.state = GrabState.CHAT
+        self.state_since = time.monotonic()
+        self._action = None
+        self._ready_at = 0.0
+        self._image = None
+        self._scroll_offset = 0
+
+    @property
+    def expects_dialog(self):
+        """是否在等待弹窗/结果页/返回（此时画面中的目标不一定是红色，颜色预筛选应放行）"""
+        return self.state is not GrabState.CHAT
+
+    @property
+    def needs_full_inference(self):
+        """
+        颜色预筛选是否应放行：等待弹窗/结果页/返回时，或群聊中正在确认返回/关闭按钮时
+
+        按钮不是红色，预筛选拒绝的帧里没有按钮，会打断 track 的连续出现计时；
+        强制放行发现按钮后，在按钮的 track 存在期间每帧都推理，直到按钮消失；
+        点过的按钮（保留 handled_ttl 秒）只在仍然可见时放行，以便点击无效时再次点击。
+        """
+        if self.expects_dialog:
+            return True
+        return any(not track.handled or track.visible
+                   for name in BUTTON_STABLE_DURATIONS
+                   for track in self.tracker.tracks(name, visible_only=False))
+
+    def detection_conf(self, conf):
+        """返回群聊时放宽置信度阈值，以便找到返回/关闭按钮"""
+        if self.state is GrabState.RETURNING:
+            return max(0.3, conf - 0.2)
+        return conf
+
+    def reset(self):
+        """取消所有动作并回到 CHAT（暂停或停止抢红包时调用）"""
+        if self.state is GrabState.CHAT and not self.executor.busy():
+            return
+        self.executor.cancel(reason='状态机重置')
+        self._action = None
+        self.tracker.reset()
+        self._enter(GrabState.CHAT, time.monotonic())
+
+    def update(self, packet):
+        """根据一帧的检测结果推进状态机（在决策线程中调用）"""
+        now = time.monotonic()
+        self.tracker.update(packet.detections, packet.timestamp)
+        self._image = packet.image
+        self._scroll_offset = getattr(packet, 'scroll_offset', 0)
+        timeout = STATE_TIMEOUTS.get(self.state)
+        if timeout is not None and now - self.state_since >= self.timeouts[self.state]:
+            self._on_timeout(timeout[1], now)
+
+        # 动作执行期间以及动作结束前捕获的帧不触发新动作
+        if self._action is not None and not self._action.done.is_set():
+            return
+        if packet.timestamp < self._ready_at:
+            return
+        handler = getattr(self, f'_on_{self.state.value}')
+        handler(packet.detections, now)
+
+    def _enter(self, state, now):
+        previous = self.state
+        if previous is GrabState.RETURNING and state is not GrabState.RETURNING:
+            REGISTRY.stage('return_to_chat').record(now - self.state_since)
+        self.state = state
+        self.state_since = now
+        REGISTRY.counter('redpocket_state_transitions_total', '状态机转移次数', state=state.value).inc()
+        self.logger.debug(f"状态: {previous.value} → {state.value}")
+
+    def _on_timeout(self, target, now):
+        if self.state is GrabState.RETURNING:
+            REGISTRY.failure('return_to_chat')
+            self.logger.warning("多次尝试后仍未返回群聊，继续监控...")
+        elif self.state is not GrabState.RESULT:
+            self.logger.info(f"状态 {self.state.value} 超时，转入 {target.value}")
+        self.executor.cancel(reason='状态超时')
+        self._enter(target, now)
+
+    def _submit(self, fn, name, group, delay=0.0, validate=None):
+        """提交动作；动作结束之前的帧不再触发新动作"""
+        def run(action):
+            try:
+                return fn(action)
+            finally:
+                self._ready_at = time.time()
+
+        self._action = self.executor.submit(run, delay=delay, name=name, group=group, validate=validate)
+        return self._action
+
+    # ---------- 各状态的处理 ----------
+
+    def _on_chat(self, detections, now):
+        open_button = self.detector.find_best(detections, 'open_button')
+        if open_button:
+            self._start_burst(open_button, now)
+            return
+
+        packet_track = self._next_packet()
+        if packet_track is not None:
+            self.tracker.mark_handled(packet_track)
+            if self.memory is not None:
+                self.memory.remember(self._image, packet_track.bbox, self._scroll_offset)
+            red_packet = packet_track.as_detection()
+            self.logger.info(f"[第二优先级] 检测到红包! 置信度: {red_packet['confidence']:.2f}")
+            self._submit(lambda action: self._click_packet(red_packet), '点击红包', 'packet')
+            self._enter(GrabState.PACKET_CLICKED, now)
+            return
+
+        for class_name in ('back_button', 'close_button'):
+            track = self.tracker.stable(class_name, BUTTON_STABLE_DURATIONS[class_name])
+            if track is None:
+                continue
+            self.tracker.mark_handled(track)
+            button = track.as_detection()
+            button_type = BUTTON_NAMES[class_name]
+            self.logger.info(f"[第三优先级] {button_type}已连续出现 {BUTTON_STABLE_DURATIONS[class_name]} 秒，"
+                             f"置信度: {button['confidence']:.2f}")
+            self._submit(lambda action: self._click_button(button, button_type),
+                         f'点击{button_type}', 'button')
+            return
+
+    def _next_packet(self):
+        """未处理过的红包中置信度最高的一个；指纹命中记忆的红包标记为已处理并跳过"""
+        for track in self.tracker.tracks('red_packet'):
+            if track.handled:
+                continue
+            if self.memory is not None and self.memory.contains(self._image, track.bbox, self._scroll_offset):
+                self.tracker.mark_handled(track)
+                REGISTRY.counter('redpocket_packets_skipped_total', '因已处理过而跳过的红包数').inc()
+                self.logger.info(f"跳过已处理过的红包 (track #{track.track_id})")
+                continue
+            return track
+        return None
+
+    def _on_packet_clicked(self, detections, now):
+        target_class, target = self.detector.select_target(detections)
+        if target_class == 'open_button':
+            self._start_burst(target, now)
+        elif target_class in ('back_button', 'close_button'):
+            # 红包已领取或已过期，直接显示详情页
+            self._enter(GrabState.RETURNING, now)
+            self._on_returning(detections, now)
+
+    def _on_open_dialog(self, detections, now):
+        open_button = self.detector.find_best(detections, 'open_button')
+        if open_button is not None:
+            # 连续点击结束后按钮仍在，再点一轮（受 OPEN_DIALOG 超时限制）
+            self._start_burst(open_button, now)
+        else:
+            self._enter(GrabState.RESULT, now)
+
+    def _on_result(self, detections, now):
+        # 等待结果页稳定，由超时转入 RETURNING
+        pass
+
+    def _on_returning(self, detections, now):
+        if self.detector.find_best(detections, 'red_packet'):
+            self.logger.info("已返回群聊")
+            self._enter(GrabState.CHAT, now)
+            return
+
+        for class_name in ('back_button', 'close_button'):
+            button = self.detector.find_best(detections, class_name)
+            if button:
+                button_type = BUTTON_NAMES[class_name]
+                self.logger.info(f"检测到{button_type}，点击返回")
+                self._submit(lambda action: self._click_button(button, button_type),
+                             f'点击{button_type}', 'return')
+                return
+
+    # ---------- 在执行器线程中运行的动作 ----------
+
+    def _start_burst(self, open_button, now):
+        self.logger.info(f"[最高优先级] 检测到开红包按钮! 置信度: {open_button['confidence']:.2f}")
+        started = time.time()
+        self._submit(
+            lambda action: self._burst_click(action, open_button['bbox']),
+            '连续点击开红包按钮', 'open',
+            validate=lambda p: p.timestamp < started + 0.05
+            or self.detector.find_best(p.detections, 'open_button') is not None
+        )
+        if self.state is not GrabState.OPEN_DIALOG:
+            self._enter(GrabState.OPEN_DIALOG, now)
+
+    def _burst_click(self, action, bbox):
+        self.focus_fn()
+        click_start = time.time()
+        click_count = 0
+        while time.time() - click_start < self.burst_duration and not action.cancelled:
+            _, _, success = self.click_fn(bbox)
+            if success:
+                click_count += 1
+            time.sleep(0.01)
+        self.logger.info(f"开红包按钮连续点击 {click_count} 次!")
+
+    def _click_packet(self, red_packet):
+        self.focus_fn()
+        center_x, center_y, success = self.click_fn(red_packet['bbox'])
+        if success:
+            self.logger.info(f"点击红包位置: ({center_x}, {center_y})")
+        else:
+            self.logger.error(f"点击红包失败: ({center_x}, {center_y})")
+
+    def _click_button(self, button, button_type):
+        self.focus_fn()
+        _, _, success = self.click_fn(button['bbox'])
+        if success:
+            self.logger.info(f"已点击{button_type}")
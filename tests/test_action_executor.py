@@ -0,0 +1,95 @@
+import threading
+import time
+
+from action_executor import ActionExecutor
+
+
+def test_actions_run_in_schedule_order():
+    executor = ActionExecutor()
+    executor.start()
+    order = []
+    late = executor.submit(lambda action: order.append('late'), delay=0.05)
+    executor.submit(lambda action: order.append('now'))
+    assert late.done.wait(1.0)
+    executor.stop()
+    assert order == ['now', 'late']
+
+
+def test_cancel_group_and_validate():
+    executor = ActionExecutor()
+    executor.start()
+    ran = []
+    cancelled = executor.submit(lambda action: ran.append('a'), delay=0.2, group='packet')
+    invalid = executor.submit(lambda action: ran.append('b'), delay=0.2, validate=lambda packet: packet != 'gone')
+    kept = executor.submit(lambda action: ran.append('c'), delay=0.05, group='button')
+
+    assert executor.cancel(group='packet') == 1
+    executor.observe('gone')
+    assert cancelled.done.is_set() and invalid.cancelled
+    assert kept.done.wait(1.0)
+    time.sleep(0.25)
+    executor.stop()
+    assert ran == ['c']
+
+
+def test_restart_while_previous_thread_is_exiting_keeps_a_worker():
+    exiting, resume = threading.Event(), threading.Event()
+
+    class PausingExecutor(ActionExecutor):
+        def _next_action(self):
+            action = super()._next_action()
+            if action is None and not exiting.is_set():
+                # 原线程已决定退出但尚未结束时重新 start()
+                exiting.set()
+                resume.wait(1.0)
+            return action
+
+    executor = PausingExecutor()
+    executor.start()
+    executor.stop(timeout=0)
+    assert exiting.wait(1.0)
+    executor.start()
+    resume.set()
+    action = executor.submit(lambda action: 'ran')
+    assert action.done.wait(1.0)
+    assert action.result == 'ran'
+    executor.stop()
+
+
+def test_restart_after_stop_timed_out_reuses_running_thread():
+    executor = ActionExecutor()
+    executor.start()
+    release = threading.Event()
+    executor.submit(lambda action: release.wait(1.0))
+    time.sleep(0.05)
+    executor.stop(timeout=0.01)
+    executor.start()
+    release.set()
+    action = executor.submit(lambda action: 'after restart')
+    assert action.done.wait(1.0)
+    assert action.result == 'after restart'
+    assert sum(t.name == 'action-executor' for t in threading.enumerate()) <= 1
+    executor.stop()
+
+
+def test_shared_lock_serializes_executors():
+    lock = threading.Lock()
+    executors = [ActionExecutor(lock=lock) for _ in range(3)]
+    active, peak = [0], [0]
+    guard = threading.Lock()
+
+    def click(action):
+        with guard:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.01)
+        with guard:
+            active[0] -= 1
+
+    for executor in executors:
+        executor.start()
+    actions = [executor.submit(click) for executor in executors for _ in range(3)]
+    assert all(action.done.wait(2.0) for action in actions)
+    for executor in executors:
+        executor.stop()
+    assert peak[0] == 1
@@ -0,0 +1,64 @@
+import time
+
+import numpy as np
+
+from benchmark import MockClicker, run_benchmark, run_multi_benchmark
+from frame_sources import FrameSource
+from test_detector import CLASSES, make_detector
+
+PACKET = (100, 100, 200, 160)
+
+
+class StillSource(FrameSource):
+    """固定画面的帧源：一个带标注的红包，按固定间隔出帧"""
+
+    name = 'still'
+
+    def __init__(self, frames, interval=0.01):
+        super().__init__()
+        self.frames = frames
+        self.interval = interval
+        self.image = np.zeros((320, 480, 3), np.uint8)
+        self.clicks = []
+
+    def wait(self):
+        time.sleep(self.interval)
+
+    def read(self):
+        if self.frame_index + 1 >= self.frames:
+            self.exhausted = True
+            return None
+        self.frame_index += 1
+        self.ground_truth = [{'bbox': PACKET, 'class': CLASSES.index('red_packet'), 'class_name': 'red_packet'}]
+        return self.image, (0, 0, 480, 320)
+
+    def on_click(self, x, y):
+        self.clicks.append((x, y))
+
+
+def test_benchmark_clicks_through_state_machine_once_per_packet():
+    detector = make_detector(boxes=[PACKET], class_ids=[CLASSES.index('red_packet')])
+    detector.resolution_policy.enabled = False
+    source = StillSource(30)
+    clicker = MockClicker()
+
+    report = run_benchmark(detector, source, change_detection=False, incremental=False,
+                           clicker=clicker, drain_timeout=1.0)
+
+    # 状态机点过的红包 track 标记为已处理，等待弹窗期间不会每帧重复点击
+    assert report['clicks'] == 1
+    assert source.clicks == [(150, 130)]
+    assert report['reaction']['targets_clicked'] == 1
+    assert report['reaction']['repeat_clicks'] == 0
+    assert report['stages']['click']['count'] == 1
+
+
+def test_multi_window_benchmark_uses_one_state_machine_per_window():
+    detector = make_detector(boxes=[PACKET], class_ids=[CLASSES.index('red_packet')])
+    detector.resolution_policy.enabled = False
+    sources = [StillSource(20), StillSource(20)]
+
+    report = run_multi_benchmark(detector, sources, change_detection=False, drain_timeout=1.0)
+
+    assert [window['clicks'] for window in report['per_window']] == [1, 1]
+    assert [source.clicks for source in sources] == [[(150, 130)], [(150, 130)]]
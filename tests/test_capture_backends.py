@@ -0,0 +1,66 @@
+import ctypes
+
+from capture_backends import _XErrorEvent, _XErrorHandler, _XErrorRouter
+
+
+class FakeX11:
+    """只模拟 XSetErrorHandler：记录当前处理函数并返回上一个的地址"""
+
+    def __init__(self, initial):
+        self.current = initial
+
+    def XSetErrorHandler(self, handler):
+        previous = self.current
+        self.current = ctypes.cast(handler, ctypes.c_void_p).value
+        return previous
+
+
+def error_event(code):
+    event = _XErrorEvent(error_code=code)
+    return event, ctypes.addressof(event)
+
+
+def test_router_records_own_displays_and_chains_others():
+    seen = []
+    previous = _XErrorHandler(lambda display, event: seen.append(display) or 0)
+    x11 = FakeX11(ctypes.cast(previous, ctypes.c_void_p).value)
+    router = _XErrorRouter()
+
+    router.register(x11, 1001)
+    router.register(x11, 1002)
+    event, address = error_event(10)
+    router._dispatch(1001, address)
+    router._dispatch(4242, address)
+
+    assert router.take_error(1001) == 10
+    assert router.take_error(1001) is None
+    assert router.take_error(1002) is None
+    assert seen == [4242]
+
+
+def test_router_installs_once_and_restores_previous_handler():
+    previous = _XErrorHandler(lambda display, event: 0)
+    previous_address = ctypes.cast(previous, ctypes.c_void_p).value
+    x11 = FakeX11(previous_address)
+    router = _XErrorRouter()
+    ours = ctypes.cast(router._callback, ctypes.c_void_p).value
+
+    router.register(x11, 1)
+    router.register(x11, 2)
+    assert x11.current == ours
+    router.unregister(x11, 1)
+    assert x11.current == ours
+    router.unregister(x11, 2)
+    assert x11.current == previous_address
+
+
+def test_router_leaves_newer_handler_in_place():
+    x11 = FakeX11(None)
+    router = _XErrorRouter()
+    router.register(x11, 1)
+    newer = _XErrorHandler(lambda display, event: 0)
+    newer_address = ctypes.cast(newer, ctypes.c_void_p).value
+    x11.current = newer_address
+
+    router.unregister(x11, 1)
+    assert x11.current == newer_address
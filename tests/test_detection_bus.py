@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+from detection_bus import DetectionBus
+from detections import Detections
+from metrics import REGISTRY
+
+NAMES = ['red_packet', 'back_button']
+
+
+def make_packet():
+    detections = Detections([(0, 0, 10, 10), (20, 20, 30, 30), (40, 40, 50, 50)],
+                            [0.9, 0.55, 0.35], [0, 1, 1], NAMES)
+    return SimpleNamespace(frame_id=7, image=None, rect=(0, 0, 100, 100), timestamp=1.5,
+                           scroll_offset=12, detections=detections)
+
+
+def test_each_subscriber_gets_detections_filtered_by_its_own_threshold():
+    bus = DetectionBus()
+    received = {}
+    threshold = {'value': 0.5}
+    bus.subscribe('strict', conf=0.8, callback=lambda event: received.__setitem__('strict', event))
+    bus.subscribe('dynamic', conf=lambda: threshold['value'],
+                  callback=lambda event: received.__setitem__('dynamic', event))
+    bus.subscribe('all', conf=None, callback=lambda event: received.__setitem__('all', event))
+
+    packet = make_packet()
+    bus.publish(packet)
+    assert len(received['strict'].detections) == 1
+    assert len(received['dynamic'].detections) == 2
+    assert len(received['all'].detections) == 3
+    event = received['dynamic']
+    assert (event.frame_id, event.timestamp, event.scroll_offset, event.conf) == (7, 1.5, 12, 0.5)
+    assert event.packet is packet
+
+    # 函数形式的阈值每帧重新求值
+    threshold['value'] = 0.3
+    bus.publish(make_packet())
+    assert len(received['dynamic'].detections) == 3
+
+
+def test_subscribers_with_equal_thresholds_share_one_event():
+    bus = DetectionBus()
+    events = []
+    bus.subscribe('a', conf=0.5, callback=events.append)
+    bus.subscribe('b', conf=lambda: 0.5, callback=events.append)
+    bus.subscribe('c', conf=0.3, callback=events.append)
+    bus.publish(make_packet())
+    assert events[0] is events[1]
+    assert events[2] is not events[0]
+
+
+def test_min_conf_uses_lowest_subscriber_threshold():
+    bus = DetectionBus()
+    assert bus.min_conf(0.5) == 0.5
+    bus.subscribe('none', conf=None)
+    assert bus.min_conf(0.5) == 0.5
+    low = bus.subscribe('low', conf=lambda: 0.3)
+    bus.subscribe('high', conf=0.7)
+    assert bus.min_conf(0.5) == 0.3
+    low.close()
+    assert bus.min_conf(0.5) == 0.7
+
+
+def test_failing_subscriber_does_not_block_others():
+    bus = DetectionBus()
+    received = []
+
+    def broken(event):
+        raise ValueError('boom')
+
+    bus.subscribe('broken', conf=0.5, callback=broken)
+    bus.subscribe('ok', conf=0.5, callback=received.append)
+    failures = REGISTRY.counter('redpocket_failures_total', kind='subscriber').value
+
+    bus.publish(make_packet())
+    assert len(received) == 1
+    assert REGISTRY.counter('redpocket_failures_total', kind='subscriber').value == failures + 1
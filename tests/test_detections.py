@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from detections import Detections
+
+NAMES = ['red_packet', 'open_button', 'close_button']
+
+
+def sample():
+    return Detections(
+        [(0, 0, 10, 10), (20, 20, 40, 40), (5, 5, 15, 15), (50, 50, 60, 60)],
+        [0.6, 0.9, 0.8, 0.4],
+        [0, 1, 0, 2],
+        NAMES,
+    )
+
+
+def test_list_compatible_access():
+    detections = sample()
+    assert len(detections) == 4 and detections
+    assert not Detections.empty(NAMES)
+    assert detections[1] == {'bbox': (20, 20, 40, 40), 'confidence': pytest.approx(0.9),
+                             'class': 1, 'class_name': 'open_button'}
+    assert detections[-1]['class_name'] == 'close_button'
+    assert [d['class'] for d in detections] == [0, 1, 0, 2]
+    assert [d['class'] for d in detections[1:3]] == [1, 0]
+    with pytest.raises(IndexError):
+        detections[4]
+
+
+def test_class_buckets_sorted_by_confidence():
+    detections = sample()
+    assert detections.class_indices(0).tolist() == [2, 0]
+    assert detections.best_index(0) == 2
+    assert detections.best(0)['bbox'] == (5, 5, 15, 15)
+    assert detections.best(5) is None
+    assert detections.has_class(2) and not detections.has_class(5)
+    assert [d['confidence'] for d in detections.of_class_list(0)] == pytest.approx([0.8, 0.6])
+    assert len(detections.of_class(0)) == 2
+
+
+def test_unknown_class_name_falls_back_to_id():
+    detections = Detections([(0, 0, 1, 1)], [0.5], [7], NAMES)
+    assert detections[0]['class_name'] == 'class_7'
+
+
+def test_filter_select_and_geometry_return_copies():
+    detections = sample()
+    assert detections.filter_confidence(0.6).class_ids.tolist() == [0, 1, 0]
+    assert detections.select(np.array([3])).best(2)['bbox'] == (50, 50, 60, 60)
+
+    scaled = detections.scale(2.0, 0.5)
+    assert scaled.boxes[1].tolist() == [40, 10, 80, 20]
+    moved = detections.translate(dx=3, dy=-2)
+    assert moved.boxes[0].tolist() == [3, -2, 13, 8]
+    assert detections.boxes[0].tolist() == [0, 0, 10, 10]
+    assert moved.best(1) is not None
+
+
+def test_concat_skips_empty_parts_and_rebuilds_index():
+    first, second = sample(), Detections([(1, 1, 2, 2)], [0.95], [0], NAMES)
+    merged = Detections.concat([Detections.empty(NAMES), first, second], NAMES)
+    assert len(merged) == 5
+    assert merged.best(0)['confidence'] == pytest.approx(0.95)
+    assert Detections.concat([Detections.empty(NAMES)], NAMES).boxes.shape == (0, 4)
+    assert Detections.concat([first], NAMES) is first
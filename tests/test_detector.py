@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+
+from config_utils import load_classes_from_config
+from detections import Detections
+from detector import RedPocketDetector
+from frame_diff import FrameChange
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dataset.yaml')
+CLASSES = load_classes_from_config(CONFIG)
+
+
+class FakeModel:
+    """按调用时的图像尺寸返回固定检测结果的推理后端"""
+
+    name = 'fake'
+
+    def __init__(self, classes, boxes=(), class_ids=(), imgsz=640):
+        self.classes = classes
+        self.boxes = boxes
+        self.class_ids = class_ids
+        self.imgsz = imgsz
+        self.calls = []
+
+    def predict(self, image, conf_threshold=0.5, imgsz=None):
+        self.calls.append((image.shape[:2], imgsz))
+        return Detections(np.array(self.boxes, np.float32).reshape(-1, 4),
+                          np.full(len(self.class_ids), 0.9, np.float32),
+                          self.class_ids, self.classes)
+
+    def predict_batch(self, images, conf_threshold=0.5, imgsz=None):
+        return [self.predict(image, conf_threshold, imgsz) for image in images]
+
+
+class RejectAll:
+    def allow(self, image):
+        return False
+
+
+def make_detector(**model_kwargs):
+    detector = RedPocketDetector(config_path=CONFIG)
+    detector.model = FakeModel(detector.classes, **model_kwargs)
+    return detector
+
+
+def test_incremental_crop_bypasses_prefilter_and_keeps_previous_boxes():
+    detector = make_detector(boxes=[(5, 5, 25, 25)], class_ids=[CLASSES.index('back_button')])
+    detector.prefilter = RejectAll()
+    previous = Detections([(10, 10, 50, 50)], [0.8], [detector.class_id('red_packet')], detector.classes)
+    image = np.zeros((800, 600, 3), np.uint8)
+
+    merged = detector.detect_incremental(image, FrameChange(True, (300, 600, 400, 700), 4), previous)
+
+    assert [d['class_name'] for d in merged] == ['red_packet', 'back_button']
+    assert merged.boxes[1].tolist() == [273.0, 573.0, 293.0, 593.0]
+    assert detector.model.calls[0][0] == (164, 164)
+
+
+def test_carried_over_packet_keeps_full_resolution_active():
+    detector = make_detector()
+    detector.resolution_policy.deactivate()
+    previous = Detections([(10, 10, 50, 50)], [0.8], [detector.class_id('red_packet')], detector.classes)
+    image = np.zeros((800, 600, 3), np.uint8)
+
+    detector.detect_incremental(image, FrameChange(True, (300, 600, 400, 700), 4), previous)
+
+    assert detector.resolution_policy.is_active()
+
+
+def test_idle_frame_runs_small_and_candidate_reruns_full_resolution():
+    detector = make_detector()
+    image = np.zeros((1000, 1000, 3), np.uint8)
+    detector.detect(image)
+    assert detector.model.calls == [((480, 480), 480)]
+
+    detector.model.boxes, detector.model.class_ids = [(0, 0, 10, 10)], [CLASSES.index('red_packet')]
+    detector.model.calls.clear()
+    detector.detect(image)
+    assert detector.model.calls == [((480, 480), 480), ((640, 640), 640)]
+    assert detector.resolution_policy.is_active()
+
+
+def test_batch_frames_are_resized_before_the_model_and_boxes_scaled_back():
+    detector = make_detector(boxes=[(10, 10, 50, 50)], class_ids=[CLASSES.index('red_packet')])
+    detector.resolution_policy.enabled = False
+    seen = []
+    predict = detector.model.predict
+
+    def recording_predict(image, conf_threshold=0.5, imgsz=None):
+        seen.append(image)
+        return predict(image, conf_threshold, imgsz)
+
+    detector.model.predict = recording_predict
+    images = [np.full((1440, 2560, 3), value, np.uint8) for value in (10, 200)]
+
+    results = detector.detect_batch(images)
+
+    assert detector.model.calls == [((360, 640), 640), ((360, 640), 640)]
+    # 同一批内尺寸相同的两张图像不能共用一个缩放缓冲区
+    assert [int(image[0, 0, 0]) for image in seen] == [10, 200]
+    assert [result.boxes[0].tolist() for result in results] == [[40.0, 40.0, 200.0, 200.0]] * 2
+
+
+def test_batch_of_small_frames_caps_inference_size():
+    detector = make_detector()
+    detector.resolution_policy.enabled = False
+    detector.detect_batch([np.zeros((200, 300, 3), np.uint8), np.zeros((100, 100, 3), np.uint8)])
+    assert detector.model.calls == [((200, 300), 320), ((100, 100), 320)]
@@ -0,0 +1,55 @@
+import cv2
+import numpy as np
+
+from frame_buffers import FrameRing
+
+
+def bgra(value, shape=(4, 6)):
+    return np.full(shape + (4,), value, np.uint8)
+
+
+def convert(ring, value):
+    return ring.convert(bgra(value), cv2.COLOR_BGRA2BGR)
+
+
+def test_buffer_held_by_a_view_or_slice_is_not_reused():
+    ring = FrameRing(size=2, max_size=4)
+    first = convert(ring, 1)
+    row = convert(ring, 2)[1:2]
+    assert ring.allocations == 2
+
+    third = convert(ring, 3)
+    assert ring.allocations == 3
+    assert int(first[0, 0, 0]) == 1 and int(row[0, 0, 0]) == 2 and int(third[0, 0, 0]) == 3
+    assert not np.shares_memory(first, third) and not np.shares_memory(row, third)
+    assert not first.flags.writeable
+
+
+def test_released_buffers_are_reused_without_allocating():
+    ring = FrameRing(size=2, max_size=4)
+    for value in range(20):
+        frame = convert(ring, value)
+        assert int(frame[0, 0, 0]) == value
+        del frame
+    assert ring.allocations == 2
+
+
+def test_ring_grows_to_max_size_then_allocates_outside_the_ring():
+    ring = FrameRing(size=1, max_size=3)
+    held = [convert(ring, value) for value in range(5)]
+    assert ring.allocations == 5
+    assert len(ring._buffers) == 3
+    assert [int(frame[0, 0, 0]) for frame in held] == [0, 1, 2, 3, 4]
+
+    # 放开环内的缓冲区后重新复用，环外临时分配的不再计入
+    del held[:3]
+    convert(ring, 9)
+    assert ring.allocations == 5
+
+
+def test_shape_change_reallocates_ring():
+    ring = FrameRing(size=2)
+    convert(ring, 1)
+    frame = ring.convert(bgra(5, (8, 8)), cv2.COLOR_BGRA2BGR)
+    assert frame.shape == (8, 8, 3)
+    assert ring.allocations == 4
@@ -0,0 +1,90 @@
+import numpy as np
+
+from frame_diff import FrameChangeDetector
+
+
+def chat_frame(seed=0, height=480, width=320):
+    """每行灰度不同的模拟聊天画面，行均值剖面足以估计滚动"""
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, 256, size=(height, 1), dtype=np.uint8)
+    return np.repeat(np.repeat(rows, width, axis=1)[:, :, None], 3, axis=2)
+
+
+def test_first_frame_is_full_change():
+    detector = FrameChangeDetector()
+    frame = chat_frame()
+    change = detector.check(frame)
+    assert change.changed and change.is_full_frame
+    assert change.dirty_rect == (0, 0, 320, 480)
+
+
+def test_identical_and_tiny_changes_are_skipped():
+    detector = FrameChangeDetector()
+    frame = chat_frame()
+    detector.check(frame)
+    assert not detector.check(frame.copy()).changed
+
+    flicker = frame.copy()
+    flicker[100, 100] = 255 - flicker[100, 100]
+    assert not detector.check(flicker).changed
+    assert detector.skip_ratio == 2 / 3
+
+
+def test_local_change_reports_tile_aligned_dirty_rect():
+    detector = FrameChangeDetector(downscale=4, tile_size=16, detect_scroll=False)
+    frame = chat_frame()
+    detector.check(frame)
+    changed = frame.copy()
+    changed[200:230, 70:130] = 255 - changed[200:230, 70:130]
+    change = detector.check(changed)
+    assert change.changed and not change.is_full_frame
+    x1, y1, x2, y2 = change.dirty_rect
+    assert (x1, y1) == (64, 192) and (x2, y2) == (192, 256)
+    assert x1 <= 70 and y1 <= 200 and x2 >= 130 and y2 >= 230
+
+
+def test_ignore_regions_mask_out_changes():
+    detector = FrameChangeDetector(ignore_regions=[(0.0, 0.0, 1.0, 0.1)])
+    frame = chat_frame()
+    detector.check(frame)
+    clock = frame.copy()
+    clock[:40] = 255 - clock[:40]
+    assert not detector.check(clock).changed
+
+
+def test_max_skip_frames_forces_full_change():
+    detector = FrameChangeDetector(max_skip_frames=2)
+    frame = chat_frame()
+    detector.check(frame)
+    assert [detector.check(frame).changed for _ in range(3)] == [False, False, True]
+    assert detector.check(frame).is_full_frame is False
+
+
+def test_baseline_only_moves_on_change_so_slow_drift_accumulates():
+    detector = FrameChangeDetector(detect_scroll=False)
+    frame = chat_frame().astype(np.int16)
+    detector.check(frame.astype(np.uint8))
+    results = []
+    for step in range(1, 5):
+        results.append(detector.check(np.clip(frame + 5 * step, 0, 255).astype(np.uint8)).changed)
+    assert results == [False, False, True, False]
+
+
+def test_scroll_is_estimated_and_only_new_content_is_dirty():
+    detector = FrameChangeDetector(downscale=4, tile_size=16)
+    frame = chat_frame(0)
+    detector.check(frame)
+    scrolled = np.concatenate([frame[64:], chat_frame(1, height=64)], axis=0)
+    change = detector.check(scrolled)
+    assert change.changed
+    assert change.scroll_dy == 64
+    x1, y1, x2, y2 = change.dirty_rect
+    assert y1 >= 480 - 64 - 16 * 4 and y2 == 480
+
+
+def test_reset_forgets_baseline():
+    detector = FrameChangeDetector()
+    frame = chat_frame()
+    detector.check(frame)
+    detector.reset()
+    assert detector.check(frame).is_full_frame
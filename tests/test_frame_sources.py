@@ -0,0 +1,48 @@
+import cv2
+import numpy as np
+
+from frame_sources import ReplaySource
+
+
+def write_images(directory, names, corrupt=()):
+    directory.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        path = directory / name
+        if name in corrupt:
+            path.write_bytes(b'not an image')
+        else:
+            cv2.imwrite(str(path), np.full((20, 30, 3), len(name), np.uint8))
+
+
+def test_replay_skips_many_corrupt_images_without_recursion(tmp_path):
+    names = [f'{i:05d}.png' for i in range(2000)] + ['99999.png']
+    directory = tmp_path / 'frames'
+    directory.mkdir()
+    for name in names[:-1]:
+        (directory / name).write_bytes(b'broken')
+    write_images(directory, names[-1:])
+
+    source = ReplaySource(directory, mode='max')
+    image, rect = source.read()
+    assert rect == (0, 0, 30, 20)
+    assert source.frame_index == 2000
+    assert source.read() is None and source.exhausted
+
+
+def test_replay_loop_with_only_corrupt_images_ends(tmp_path):
+    directory = tmp_path / 'frames'
+    write_images(directory, ['a.png', 'b.png'], corrupt=('a.png', 'b.png'))
+    source = ReplaySource(directory, mode='max', loop=True)
+    assert source.read() is None
+    assert source.exhausted
+
+
+def test_replay_loop_wraps_past_corrupt_tail(tmp_path):
+    directory = tmp_path / 'frames'
+    write_images(directory, ['a.png', 'b.png', 'c.png'], corrupt=('c.png',))
+    source = ReplaySource(directory, mode='max', loop=True)
+    indices = []
+    for _ in range(4):
+        source.read()
+        indices.append(source.frame_index)
+    assert indices == [0, 1, 0, 1]
@@ -0,0 +1,38 @@
+from detections import Detections
+from inference_backends import compare_detections
+
+NAMES = ['red_packet', 'open_button']
+
+
+def detections(boxes, confidences, class_ids):
+    return Detections(boxes, confidences, class_ids, NAMES)
+
+
+def test_identical_outputs_match():
+    reference = detections([(0, 0, 10, 10), (20, 20, 40, 40)], [0.9, 0.8], [0, 1])
+    ok, problems = compare_detections(reference, reference, 0.5)
+    assert ok and problems == []
+
+
+def test_one_candidate_cannot_match_two_reference_boxes():
+    reference = detections([(0, 0, 100, 100), (1, 1, 101, 101)], [0.9, 0.85], [0, 0])
+    candidate = detections([(0, 0, 100, 100)], [0.9], [0])
+    ok, problems = compare_detections(reference, candidate, 0.5)
+    assert not ok
+    assert len(problems) == 1 and '缺少目标' in problems[0]
+
+
+def test_boxes_near_threshold_may_appear_on_one_side_only():
+    reference = detections([(0, 0, 10, 10)], [0.52], [0])
+    ok, _ = compare_detections(reference, Detections.empty(NAMES), 0.5)
+    assert ok
+    ok, problems = compare_detections(Detections.empty(NAMES), detections([(0, 0, 10, 10)], [0.9], [1]), 0.5)
+    assert not ok and '多出目标' in problems[0]
+
+
+def test_confidence_and_class_mismatches_are_reported():
+    reference = detections([(0, 0, 10, 10)], [0.9], [0])
+    ok, problems = compare_detections(reference, detections([(0, 0, 10, 10)], [0.7], [0]), 0.5)
+    assert not ok and '置信度差异' in problems[0]
+    ok, _ = compare_detections(reference, detections([(0, 0, 10, 10)], [0.9], [1]), 0.5)
+    assert not ok
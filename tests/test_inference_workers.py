@@ -0,0 +1,69 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from detections import Detections
+from inference_workers import WorkerPoolBackend
+
+NAMES = ['red_packet']
+
+
+class SlowModel:
+    """在工作进程中运行的假后端：每次推理固定耗时"""
+
+    imgsz = 64
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def predict(self, image, conf_threshold=0.5, imgsz=None):
+        time.sleep(self.delay)
+        return Detections([(1, 2, 3, 4)], [0.9], [0], NAMES)
+
+
+def slow_factory(backend, model_path, class_names, device, imgsz, num_threads=1):
+    return SlowModel(0.5)
+
+
+@pytest.fixture
+def pool():
+    pool = WorkerPoolBackend('fake.pt', NAMES, num_workers=1, threads_per_worker=1,
+                             factory=slow_factory, start_timeout=30)
+    yield pool
+    pool.close()
+
+
+def test_worker_returns_detections_through_shared_memory(pool):
+    result = pool.predict(np.zeros((32, 32, 3), np.uint8))
+    assert result.boxes.tolist() == [[1.0, 2.0, 3.0, 4.0]]
+
+
+def test_close_wakes_callers_waiting_for_an_idle_worker(pool):
+    image = np.zeros((32, 32, 3), np.uint8)
+    errors = []
+
+    def call():
+        try:
+            pool.predict(image)
+        except RuntimeError as e:
+            errors.append((time.perf_counter(), e))
+
+    busy = threading.Thread(target=call, daemon=True)
+    busy.start()
+    time.sleep(0.1)
+    waiting = threading.Thread(target=call, daemon=True)
+    waiting.start()
+    time.sleep(0.1)
+
+    closed_at = time.perf_counter()
+    pool.close()
+    waiting.join(2)
+    busy.join(5)
+
+    assert not waiting.is_alive()
+    assert errors and '已关闭' in str(errors[0][1])
+    assert errors[0][0] - closed_at < 0.3
+    with pytest.raises(RuntimeError):
+        pool.predict(image)
@@ -0,0 +1,140 @@
+"""
+LinuxAdapter 的 _NET_CLIENT_LIST 窗口索引测试
+
+需要 Xvfb：测试启动一个独立的 Xvfb，并用第二个 X 连接扮演 EWMH 窗口管理器
+（维护根窗口的 _NET_CLIENT_LIST、设置 _NET_WM_NAME），未安装 Xvfb 时跳过。
+"""
+import os
+import select
+import shutil
+import subprocess
+import sys
+import time
+
+import pytest
+
+XVFB = shutil.which('Xvfb')
+
+pytestmark = pytest.mark.skipif(
+    XVFB is None or not sys.platform.startswith('linux'), reason='需要 Linux 和 Xvfb'
+)
+
+Xlib_display = pytest.importorskip('Xlib.display')
+Xatom = pytest.importorskip('Xlib.Xatom')
+
+
+@pytest.fixture
+def xvfb(monkeypatch):
+    read_fd, write_fd = os.pipe()
+    process = subprocess.Popen(
+        [XVFB, '-displayfd', str(write_fd), '-screen', '0', '640x480x24', '-nolisten', 'tcp'],
+        pass_fds=(write_fd,), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    os.close(write_fd)
+    try:
+        ready, _, _ = select.select([read_fd], [], [], 10)
+        if not ready:
+            pytest.skip('Xvfb 启动超时')
+        number = os.read(read_fd, 16).decode().strip()
+        monkeypatch.setenv('DISPLAY', f':{number}')
+        yield
+    finally:
+        os.close(read_fd)
+        process.terminate()
+        process.wait(5)
+
+
+class FakeWindowManager:
+    """代替 EWMH 窗口管理器维护根窗口的 _NET_CLIENT_LIST"""
+
+    def __init__(self):
+        self.display = Xlib_display.Display()
+        self.root = self.display.screen().root
+        self.atoms = {name: self.display.intern_atom(name) for name in ('_NET_CLIENT_LIST', '_NET_WM_NAME', 'UTF8_STRING')}
+        self.clients = []
+        self.publish()
+
+    def create(self, title):
+        window = self.root.create_window(0, 0, 100, 100, 0, self.display.screen().root_depth)
+        self.set_title(window, title)
+        self.clients.append(window)
+        self.publish()
+        return window
+
+    def set_title(self, window, title):
+        window.change_property(self.atoms['_NET_WM_NAME'], self.atoms['UTF8_STRING'], 8, title.encode('utf-8'))
+        self.display.sync()
+
+    def remove(self, window):
+        self.clients.remove(window)
+        self.publish()
+        window.destroy()
+        self.display.sync()
+
+    def publish(self):
+        self.root.change_property(self.atoms['_NET_CLIENT_LIST'], Xatom.WINDOW, 32,
+                                  [window.id for window in self.clients])
+        self.display.sync()
+
+    def close(self):
+        self.display.close()
+
+
+@pytest.fixture
+def window_manager(xvfb):
+    manager = FakeWindowManager()
+    yield manager
+    manager.close()
+
+
+def titles(adapter, text):
+    return sorted(entry['title'] for entry in adapter.find_target_windows(text))
+
+
+def wait_for(condition, timeout=3.0):
+    """PropertyNotify 经由 X 服务器异步到达，轮询直到条件成立"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def test_index_built_from_client_list(window_manager):
+    from platform_adapter import LinuxAdapter
+
+    first = window_manager.create('微信 A')
+    other = window_manager.create('终端')
+    adapter = LinuxAdapter()
+
+    assert titles(adapter, '微信') == ['微信 A']
+    assert set(adapter._window_index) == {first.id, other.id}
+    assert adapter.find_target_window('终端')['window'].id == other.id
+
+
+def test_title_change_is_picked_up_through_property_notify(window_manager):
+    from platform_adapter import LinuxAdapter
+
+    window_manager.create('微信 A')
+    other = window_manager.create('终端')
+    adapter = LinuxAdapter()
+    assert titles(adapter, '微信') == ['微信 A']
+
+    window_manager.set_title(other, '微信 B')
+    assert wait_for(lambda: titles(adapter, '微信') == ['微信 A', '微信 B'])
+
+
+def test_client_list_add_and_remove_update_index(window_manager):
+    from platform_adapter import LinuxAdapter
+
+    first = window_manager.create('微信 A')
+    adapter = LinuxAdapter()
+    assert titles(adapter, '微信') == ['微信 A']
+
+    added = window_manager.create('微信 C')
+    assert wait_for(lambda: titles(adapter, '微信') == ['微信 A', '微信 C'])
+
+    window_manager.remove(first)
+    assert wait_for(lambda: titles(adapter, '微信') == ['微信 C'])
+    assert set(adapter._window_index) == {added.id}
@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+from metrics import Histogram, MetricsRegistry
+
+
+def test_small_values_are_exact_and_buckets_cover_range_contiguously():
+    histogram = Histogram()
+    previous_high = -1
+    for index in range(len(histogram._counts)):
+        low, high = histogram._bucket_range(index)
+        assert low == previous_high + 1 and high >= low
+        assert histogram._index(low) == index and histogram._index(high) == index
+        previous_high = high
+    assert histogram._bucket_range(10) == (10, 10)
+
+
+def test_quantiles_within_relative_error():
+    rng = random.Random(0)
+    samples = [rng.lognormvariate(-4, 1) for _ in range(20000)]
+    histogram = Histogram()
+    for value in samples:
+        histogram.record(value)
+
+    ordered = sorted(samples)
+    qs = (0.5, 0.9, 0.99, 0.999)
+    for q, value in zip(qs, histogram.quantiles(qs)):
+        exact = ordered[int(q * len(ordered)) - 1]
+        assert value == pytest.approx(exact, rel=0.04)
+    assert histogram.count == len(samples)
+    assert histogram.sum == pytest.approx(sum(samples))
+
+
+def test_quantiles_clamped_to_observed_range_and_overflow_bucket():
+    histogram = Histogram(max_seconds=1.0)
+    histogram.record(0.0105)
+    assert histogram.quantiles([0.5]) == [pytest.approx(0.0105)]
+    histogram.record(30.0)
+    # 超出范围的样本计入最后一个桶，分位数约为 max_seconds，max 仍是真实值
+    assert 1.0 <= histogram.quantiles([0.999])[0] < 1.1
+    assert histogram.snapshot()['max_ms'] == 30000.0
+
+
+def test_empty_and_reset():
+    histogram = Histogram()
+    assert histogram.quantiles([0.5, 0.99]) == [0.0, 0.0]
+    histogram.record(0.002)
+    histogram.reset()
+    assert histogram.count == 0 and histogram.snapshot()['p50_ms'] == 0.0
+
+
+def test_registry_snapshot_and_prometheus_export():
+    registry = MetricsRegistry()
+    with registry.timer('capture'):
+        pass
+    registry.failure('capture')
+    registry.counter('redpocket_clicks_total', '点击次数').inc(2)
+    registry.gauge('redpocket_fps', '帧率').set(29.5)
+
+    snapshot = registry.snapshot()
+    assert snapshot['stages']['capture']['count'] == 1
+    assert snapshot['counters'] == {'redpocket_failures_total{kind="capture"}': 1,
+                                    'redpocket_clicks_total': 2}
+    assert snapshot['gauges'] == {'redpocket_fps': 29.5}
+
+    text = registry.render_prometheus()
+    assert '# TYPE redpocket_stage_seconds summary' in text
+    assert 'redpocket_stage_seconds{stage="capture",quantile="0.5"}' in text
+    assert 'redpocket_stage_seconds_count{stage="capture"} 1' in text
+    assert 'redpocket_fps 29.5' in text
@@ -0,0 +1,103 @@
+import threading
+import time
+
+import numpy as np
+
+from frame_diff import FrameChange
+from multi_monitor import FairScheduler, LatestResults, MonitorTarget, MultiWindowMonitor
+
+
+class Unchanged:
+    """总是报告画面未变化的帧差分"""
+
+    def check(self, image):
+        return FrameChange(False)
+
+    def reset(self):
+        pass
+
+
+def make_target(name, capture_fn=lambda: None, decide_fn=lambda packet: None, **kwargs):
+    return MonitorTarget(name, capture_fn, decide_fn, **kwargs)
+
+
+def test_newer_frame_replaces_pending_frame_of_same_window():
+    scheduler = FairScheduler(max_batch=4)
+    a, b = make_target('a'), make_target('b')
+    scheduler.submit([(a, 'a1'), (b, 'b1')])
+    scheduler.submit([(a, 'a2')])
+
+    batch = scheduler.next_batch(timeout=0)
+    assert sorted(packet for _, packet in batch) == ['a2', 'b1']
+    assert a.replaced == 1 and b.replaced == 0
+    assert a.in_flight and b.in_flight
+    assert scheduler.pending() == 0
+
+
+def test_small_batches_rotate_through_all_windows():
+    scheduler = FairScheduler(max_batch=2)
+    targets = [make_target(name) for name in 'abc']
+    served = []
+    for _ in range(6):
+        # 每轮所有窗口都有新帧，a 总是最先提交
+        scheduler.submit([(target, target.name) for target in targets])
+        served.append([target.name for target, _ in scheduler.next_batch(timeout=0)])
+
+    assert all(len(batch) == 2 for batch in served)
+    flat = [name for batch in served for name in batch]
+    assert {name: flat.count(name) for name in 'abc'} == {'a': 4, 'b': 4, 'c': 4}
+    # 连续两批之间，没有进入上一批的窗口一定进入下一批
+    for previous, current in zip(served, served[1:]):
+        assert set('abc') - set(previous) <= set(current)
+
+
+def test_close_wakes_waiting_consumer_and_reopen_clears():
+    scheduler = FairScheduler()
+    result = []
+    thread = threading.Thread(target=lambda: result.append(scheduler.next_batch(timeout=5)))
+    thread.start()
+    time.sleep(0.05)
+    scheduler.close()
+    thread.join(1)
+    assert result == [[]]
+
+    target = make_target('a')
+    scheduler.submit([(target, 'ignored')])
+    assert scheduler.pending() == 0
+    scheduler.reopen()
+    scheduler.submit([(target, 'a1')])
+    scheduler.reopen()
+    assert scheduler.pending() == 0 and not target.in_flight
+
+
+def test_latest_results_only_overwrite_same_window():
+    results = LatestResults()
+    a, b = make_target('a'), make_target('b')
+    results.put(b, 'b-inferred')
+    for i in range(10):
+        results.put(a, f'a-skipped-{i}')
+
+    assert results.get(0) == (b, 'b-inferred')
+    assert results.get(0) == (a, 'a-skipped-9')
+    assert results.get(0) is None
+    assert results.dropped == 9
+
+
+def test_inferred_result_survives_other_window_skipped_frames():
+    """画面不变的窗口持续发出复用结果时，另一个窗口的推理结果仍然交给决策阶段"""
+    frame = np.zeros((8, 8, 3), np.uint8)
+    quiet = make_target('quiet', lambda: (frame, None), change_detector=Unchanged())
+    busy = make_target('busy', lambda: (frame, None))
+    monitor = MultiWindowMonitor([quiet, busy], lambda images, targets: [])
+
+    monitor.result_queue.put(busy, 'busy-inferred')
+    quiet.last_detections = ['cached']
+    for _ in range(20):
+        assert monitor._capture(quiet) is None
+
+    drained = []
+    while (item := monitor.result_queue.get(0)) is not None:
+        drained.append(item)
+    assert drained[0] == (busy, 'busy-inferred')
+    assert [target for target, _ in drained] == [busy, quiet]
+    assert drained[1][1].skipped and drained[1][1].detections == ['cached']
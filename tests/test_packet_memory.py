@@ -0,0 +1,163 @@
+import numpy as np
+
+from packet_memory import Fingerprint, OpenedPacketMemory, fingerprint
+
+WIDTH, HEIGHT = 400, 800
+SLOT = (660, 740)
+STEP = 120
+
+
+def draw_packet(image, top):
+    """同一发送者的红包：头像 + 红色气泡 + 金色圆形图案，外观完全相同"""
+    image[top:top + 40, 10:50] = (200, 120, 40)
+    image[top:top + 80, 60:260] = (60, 90, 250)
+    image[top + 20:top + 60, 90:130] = (40, 200, 250)
+
+
+def draw_text(image, top):
+    """一条文字消息：白色气泡里几行深色"文字"，长短不一"""
+    image[top:top + 40, 10:50] = (80, 160, 80)
+    image[top:top + 60, 60:300] = (255, 255, 255)
+    for row, length in enumerate((200, 120, 170)):
+        y = top + 10 + row * 16
+        image[y:y + 8, 70:70 + length] = (30, 30, 30)
+
+
+def chat(messages):
+    """按从下到上的顺序排列消息，最后一条占据底部槽位"""
+    image = np.full((HEIGHT, WIDTH, 3), 235, np.uint8)
+    top = SLOT[0]
+    for draw in reversed(messages):
+        draw(image, top)
+        top -= STEP
+    return image
+
+
+def packet_bbox(slot_index):
+    """倒数第 slot_index 条消息（0 为底部槽位）的红包框"""
+    top = SLOT[0] - slot_index * STEP
+    return [60, top, 260, top + 80]
+
+
+def test_fingerprint_has_above_context_and_scroll_adjusted_position():
+    image = chat([draw_text, draw_packet])
+    fp = fingerprint(image, packet_bbox(0), scroll_offset=STEP)
+    assert fp.above is not None
+    assert fp.cy == (sum(SLOT) / 2 + STEP) / HEIGHT
+
+    # 紧贴顶部的气泡没有足够的上方区域
+    assert fingerprint(image, [60, 10, 260, 90]).above is None
+
+
+def test_identical_packet_arriving_in_same_slot_is_not_skipped():
+    memory = OpenedPacketMemory()
+    before = chat([draw_text, draw_packet])
+    memory.remember(before, packet_bbox(0), scroll_offset=0)
+
+    # 同一发送者又发了一个外观相同的红包：旧红包被顶上去一条，新红包占据底部槽位
+    after = chat([draw_text, draw_packet, draw_packet])
+    assert not memory.contains(after, packet_bbox(0), scroll_offset=STEP)
+    assert memory.contains(after, packet_bbox(1), scroll_offset=STEP)
+
+
+def test_above_context_separates_packets_when_scroll_is_unknown():
+    memory = OpenedPacketMemory()
+    memory.remember(chat([draw_text, draw_packet]), packet_bbox(0))
+
+    # 滚动估计失败（偏移仍为 0）时，新红包与旧记录位置相同，靠上方内容区分
+    after = chat([draw_text, draw_packet, draw_packet])
+    assert not memory.contains(after, packet_bbox(0))
+
+
+def test_scroll_offset_separates_a_run_of_identical_packets():
+    memory = OpenedPacketMemory()
+    memory.remember(chat([draw_text, draw_packet, draw_packet]), packet_bbox(0), scroll_offset=0)
+
+    # 连发第三个：新红包上方同样是一个红包，只能靠位置区分
+    after = chat([draw_text, draw_packet, draw_packet, draw_packet])
+    assert not memory.contains(after, packet_bbox(0), scroll_offset=STEP)
+    assert memory.contains(after, packet_bbox(1), scroll_offset=STEP)
+
+
+def test_same_packet_is_matched_while_still_in_place():
+    memory = OpenedPacketMemory()
+    image = chat([draw_text, draw_packet])
+    memory.remember(image, packet_bbox(0))
+    assert memory.contains(image, packet_bbox(0))
+    assert memory.hits == 1
+
+
+def test_capacity_evicts_least_recently_used():
+    memory = OpenedPacketMemory(capacity=2)
+    first = Fingerprint(0x0, 0x0, 0.2, 0.2)
+    second = Fingerprint(0xffff, 0xffff, 0.5, 0.5)
+    third = Fingerprint(0xffff0000, 0xffff0000, 0.8, 0.8)
+    memory.remember_fingerprint(first)
+    memory.remember_fingerprint(second)
+    assert memory.match(Fingerprint(0x0, 0x0, 0.2, 0.2)) is not None
+    memory.remember_fingerprint(third)
+    assert len(memory) == 2
+    assert memory.match(Fingerprint(0xffff, 0xffff, 0.5, 0.5)) is None
+    assert memory.match(Fingerprint(0x0, 0x0, 0.2, 0.2)) is not None
+
+
+def test_thresholds_and_position_tolerance():
+    memory = OpenedPacketMemory(phash_threshold=8, dhash_threshold=10, above_threshold=8,
+                                position_tolerance=0.06)
+    memory.remember_fingerprint(Fingerprint(0x0, 0x0, 0.5, 0.5, above=0x0))
+    assert memory.match(Fingerprint(0xff, 0x3ff, 0.55, 0.45, above=0xff)) is not None
+    assert memory.match(Fingerprint(0x1ff, 0x0, 0.5, 0.5)) is None
+    assert memory.match(Fingerprint(0x0, 0x7ff, 0.5, 0.5)) is None
+    assert memory.match(Fingerprint(0x0, 0x0, 0.5, 0.5, above=0x1ff)) is None
+    assert memory.match(Fingerprint(0x0, 0x0, 0.5, 0.57)) is None
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / 'memory' / 'opened.json')
+    memory = OpenedPacketMemory(path=path)
+    memory.remember_fingerprint(Fingerprint(0x1234, 0x5678, 0.25, 1.5, above=0x9abc))
+    memory.remember_fingerprint(Fingerprint(0x4321, 0x8765, 0.75, 0.5))
+    memory.save()
+
+    loaded = OpenedPacketMemory(path=path)
+    assert loaded.load() == 2
+    entry = loaded.match(Fingerprint(0x1234, 0x5678, 0.25, 1.5, above=0x9abc))
+    assert entry is not None and entry.above == 0x9abc
+    # 没有上方区域哈希的记录跨会话无法与新到达的相同红包区分，不再参与匹配
+    assert loaded.match(Fingerprint(0x4321, 0x8765, 0.75, 0.5, above=0xffff)) is None
+    assert OpenedPacketMemory(path=str(tmp_path / 'missing.json')).load() == 0
+
+
+def test_snapshot_matches_scrolled_packet_after_restart(tmp_path):
+    path = str(tmp_path / 'opened.json')
+    memory = OpenedPacketMemory(path=path)
+    # 上一次会话中已经滚动了很多，记录的位置带着较大的累计滚动量
+    memory.remember(chat([draw_text, draw_packet]), packet_bbox(0), scroll_offset=5 * STEP)
+    memory.save()
+
+    # 重启后滚动量从 0 开始；旧红包已被新消息顶上去一条，下面是同一发送者的新红包
+    restarted = OpenedPacketMemory(path=path)
+    restarted.load()
+    after = chat([draw_text, draw_packet, draw_packet])
+    assert not restarted.contains(after, packet_bbox(0))
+    assert restarted.contains(after, packet_bbox(1))
+
+    # 命中后记录回到当前会话，位置重新参与匹配
+    restarted.begin_session()
+    assert restarted.contains(after, packet_bbox(1))
+    restarted.begin_session()
+    moved = chat([draw_text, draw_packet, draw_packet, draw_text])
+    assert restarted.contains(moved, packet_bbox(2))
+
+
+def test_begin_session_drops_position_check_for_earlier_entries():
+    memory = OpenedPacketMemory()
+    memory.remember(chat([draw_text, draw_packet]), packet_bbox(0), scroll_offset=3 * STEP)
+    image = chat([draw_text, draw_packet])
+    # 同一会话内位置不符：视为不同的红包
+    assert not memory.contains(image, packet_bbox(0), scroll_offset=0)
+
+    # 重新开始监控，滚动量归零：按哈希和上方内容匹配，之后按新的位置匹配
+    memory.begin_session()
+    assert memory.contains(image, packet_bbox(0), scroll_offset=0)
+    assert memory.contains(image, packet_bbox(0), scroll_offset=0)
@@ -0,0 +1,88 @@
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from pipeline import LatestFrameQueue, MonitorPipeline
+
+
+class RecordingChangeDetector:
+    """记录差分的调用顺序；每 3 帧中有 2 帧视为未变化，每帧报告向上滚动 1 像素"""
+
+    def __init__(self):
+        self.order = []
+        self.skip_ratio = 0.0
+
+    def check(self, image):
+        frame_id = int(image[0, 0])
+        self.order.append(frame_id)
+        return SimpleNamespace(changed=frame_id % 3 == 0, scroll_dy=1)
+
+    def reset(self):
+        pass
+
+    def reset_stats(self):
+        pass
+
+
+def run_pipeline(pipeline, seconds):
+    deadline = time.perf_counter() + seconds
+    pipeline.run(lambda: time.perf_counter() < deadline)
+
+
+def test_latest_frame_queue_drops_oldest():
+    queue = LatestFrameQueue(2)
+    for item in range(5):
+        queue.put(item)
+    assert queue.dropped == 3
+    assert [queue.get(0), queue.get(0)] == [3, 4]
+    assert queue.get(0) is None
+
+
+def test_multi_thread_inference_diffs_and_publishes_in_frame_order():
+    counter = {'n': 0}
+    lock = threading.Lock()
+    decided = []
+    offsets = {}
+
+    def decide(packet):
+        decided.append((packet.frame_id, packet.skipped, packet.detections))
+        offsets[int(packet.image[0, 0])] = packet.scroll_offset
+
+    def capture():
+        with lock:
+            counter['n'] += 1
+            value = counter['n']
+        return np.full((4, 4), value, np.int64), None
+
+    def detect(image):
+        time.sleep(random.uniform(0.0, 0.01))
+        return [int(image[0, 0])]
+
+    change_detector = RecordingChangeDetector()
+    pipeline = MonitorPipeline(
+        capture, detect, decide,
+        min_capture_interval=0.001, change_detector=change_detector, inference_threads=3
+    )
+    run_pipeline(pipeline, 0.5)
+
+    assert decided
+    order = change_detector.order
+    assert order == sorted(order)
+    frame_ids = [frame_id for frame_id, _, _ in decided]
+    assert frame_ids == sorted(frame_ids)
+    # 未变化的帧复用的检测结果来自之前的帧，而不是更新的帧
+    for frame_id, skipped, detections in decided:
+        if skipped:
+            assert detections[0] <= frame_id
+    # 滚动量按差分顺序累加，决策阶段漏掉的中间帧也计算在内
+    for value, offset in offsets.items():
+        assert offset == order.index(value) + 1
+
+
+def test_incremental_disabled_with_multiple_inference_threads():
+    pipeline = MonitorPipeline(lambda: None, lambda image: [], lambda packet: None,
+                               incremental_fn=lambda *args: [], inference_threads=2)
+    assert pipeline.incremental_fn is None
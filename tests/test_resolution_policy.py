@@ -0,0 +1,58 @@
+import threading
+
+import numpy as np
+
+from detections import Detections
+from resolution_policy import FrameResizer, ResolutionPolicy, round_up_to_stride
+
+NAMES = ['red_packet', 'open_button', 'amount_text', 'close_button']
+
+
+def detections(class_ids):
+    return Detections(np.zeros((len(class_ids), 4)), np.full(len(class_ids), 0.9), class_ids, NAMES)
+
+
+def test_trigger_class_activates_and_holds():
+    policy = ResolutionPolicy(NAMES, hold_seconds=2.0)
+    assert not policy.is_active(100.0)
+    assert policy.observe(detections([0]), now=100.0)
+    assert policy.is_active(101.9)
+    assert not policy.is_active(102.1)
+
+
+def test_non_trigger_classes_do_not_activate():
+    policy = ResolutionPolicy(NAMES)
+    assert not policy.observe(detections([2, 3]), now=100.0)
+    assert not policy.is_active(100.0)
+    assert policy.observe(detections([3, 1]), now=100.0)
+    policy.deactivate()
+    assert not policy.is_active(100.0)
+
+
+def test_round_up_to_stride():
+    assert [round_up_to_stride(v) for v in (1, 32, 33, 479)] == [32, 32, 64, 480]
+
+
+def test_resizer_scales_longest_side_and_reuses_buffer():
+    resizer = FrameResizer()
+    image = np.random.default_rng(0).integers(0, 255, (1000, 500, 3), dtype=np.uint8)
+    resized, (sx, sy) = resizer.resize(image, 400)
+    assert resized.shape == (400, 200, 3)
+    assert (sx, sy) == (0.4, 0.4)
+    again, _ = resizer.resize(image, 400)
+    assert again is resized
+
+    small = np.zeros((100, 80, 3), np.uint8)
+    same, scale = resizer.resize(small, 400)
+    assert same is small and scale == (1.0, 1.0)
+
+
+def test_resizer_buffers_are_per_thread():
+    resizer = FrameResizer()
+    image = np.zeros((800, 800, 3), np.uint8)
+    main_buffer, _ = resizer.resize(image, 320)
+    other = []
+    thread = threading.Thread(target=lambda: other.append(resizer.resize(image, 320)[0]))
+    thread.start()
+    thread.join()
+    assert other[0] is not main_buffer
@@ -0,0 +1,71 @@
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+
+from color_gate import ColorGate
+from state_machine import GrabStateMachine
+from test_detector import CLASSES, make_detector
+
+
+class FakeExecutor:
+    """只记录提交的动作，不执行"""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, delay=0.0, name=None, group=None, validate=None):
+        self.submitted.append(name)
+        return SimpleNamespace(done=threading.Event())
+
+    def busy(self):
+        return False
+
+    def cancel(self, reason=None):
+        pass
+
+
+def make_state_machine(detector):
+    executor = FakeExecutor()
+    state = GrabStateMachine(detector, executor, focus_fn=lambda: None,
+                             click_fn=lambda bbox: (0, 0, True))
+    return state, executor
+
+
+def feed(state, detector, image, timestamp):
+    detections = detector.detect(image)
+    state.update(SimpleNamespace(detections=detections, timestamp=timestamp, image=image))
+    return detections
+
+
+def test_gate_keeps_passing_while_back_button_is_being_confirmed():
+    detector = make_detector(boxes=[(20, 20, 60, 60)], class_ids=[CLASSES.index('back_button')])
+    state, executor = make_state_machine(detector)
+    detector.prefilter = ColorGate(force_interval=1.0, bypass_fn=lambda: state.needs_full_inference)
+    image = np.full((720, 400, 3), 235, np.uint8)
+
+    # 画面里没有红色：第一帧强制放行发现按钮，之后按钮的 track 让预筛选持续放行
+    for i in range(8):
+        assert len(feed(state, detector, image, i * 0.05)) == 1
+
+    assert executor.submitted == ['点击返回按钮']
+    assert len(detector.model.calls) == 8
+
+
+def test_gate_rejects_again_after_clicked_button_disappears():
+    detector = make_detector(boxes=[(20, 20, 60, 60)], class_ids=[CLASSES.index('back_button')])
+    state, executor = make_state_machine(detector)
+    detector.prefilter = ColorGate(force_interval=1.0, bypass_fn=lambda: state.needs_full_inference)
+    image = np.full((720, 400, 3), 235, np.uint8)
+    for i in range(6):
+        feed(state, detector, image, i * 0.05)
+    assert executor.submitted == ['点击返回按钮']
+    assert state.needs_full_inference
+
+    # 点击生效，按钮消失：点过的 track 不再让预筛选放行
+    detector.model.boxes, detector.model.class_ids = [], []
+    feed(state, detector, image, 0.3)
+    assert not state.needs_full_inference
+    calls = len(detector.model.calls)
+    assert len(feed(state, detector, image, 0.35)) == 0
+    assert len(detector.model.calls) == calls
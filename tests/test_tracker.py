@@ -0,0 +1,76 @@
+from tracker import ObjectTracker
+
+
+def det(class_name, bbox, confidence=0.9):
+    return {'class_name': class_name, 'bbox': bbox, 'confidence': confidence}
+
+
+def test_ids_are_stable_across_scroll_and_scale_change():
+    tracker = ObjectTracker()
+    first = tracker.update([det('red_packet', (100, 500, 200, 600)), det('back_button', (0, 0, 20, 20))], 0.0)
+    ids = {t.class_name: t.track_id for t in first}
+    # 滚动 20 像素（按 IoU 匹配），再缩小到中心区域（IoU 低于阈值，按质心匹配）
+    tracker.update([det('red_packet', (100, 480, 200, 580)), det('back_button', (0, 0, 20, 20))], 0.1)
+    tracks = tracker.update([det('red_packet', (130, 510, 170, 550)), det('back_button', (0, 0, 20, 20))], 0.2)
+    assert {t.class_name: t.track_id for t in tracks} == ids
+    assert tracker.best('red_packet').hit_streak == 3
+
+
+def test_classes_are_matched_separately():
+    tracker = ObjectTracker()
+    tracker.update([det('red_packet', (0, 0, 50, 50))], 0.0)
+    tracker.update([det('opened_red_packet', (0, 0, 50, 50))], 0.1)
+    assert tracker.best('opened_red_packet').track_id != tracker.tracks('red_packet', visible_only=False)[0].track_id
+
+
+def test_stable_duration_resets_after_a_miss():
+    tracker = ObjectTracker()
+    button = det('close_button', (10, 10, 40, 40))
+    tracker.update([button], 0.0)
+    tracker.update([button], 0.15)
+    assert tracker.stable('close_button', 0.2) is None
+    tracker.update([button], 0.25)
+    assert tracker.stable('close_button', 0.2) is not None
+
+    tracker.update([], 0.3)
+    assert tracker.stable('close_button', 0.2) is None
+    tracker.update([button], 0.35)
+    assert tracker.best('close_button').stable_for() == 0.0
+
+
+def test_unmatched_tracks_expire_by_misses_and_idle_time():
+    tracker = ObjectTracker(max_misses=2, max_idle=1.0)
+    tracker.update([det('red_packet', (0, 0, 50, 50))], 0.0)
+    assert len(tracker.update([], 0.1)) == 1
+    assert len(tracker.update([], 0.2)) == 1
+    assert tracker.update([], 0.3) == []
+
+    tracker.update([det('red_packet', (0, 0, 50, 50))], 1.0)
+    assert tracker.update([], 2.5) == []
+
+
+def test_handled_track_survives_occlusion_and_restarts_stable_timer():
+    tracker = ObjectTracker(max_misses=1, handled_ttl=30.0)
+    packet = det('red_packet', (100, 100, 200, 160))
+    tracker.update([packet], 0.0)
+    track = tracker.best('red_packet')
+    tracker.mark_handled(track)
+
+    for t in (0.1, 0.2, 0.3, 5.0):
+        tracker.update([], t)
+    tracker.update([packet], 5.1)
+    again = tracker.best('red_packet')
+    assert again.track_id == track.track_id and again.handled
+    assert tracker.best('red_packet', include_handled=False) is None
+
+    tracker.update([packet], 5.6)
+    assert tracker.stable('red_packet', 0.4) is again
+    assert again.as_detection()['track_id'] == track.track_id
+
+
+def test_smoothed_confidence_moves_towards_new_values():
+    tracker = ObjectTracker(smoothing=0.5)
+    tracker.update([det('open_button', (0, 0, 50, 50), 0.4)], 0.0)
+    tracker.update([det('open_button', (0, 0, 50, 50), 0.8)], 0.1)
+    track = tracker.best('open_button')
+    assert abs(track.smoothed_confidence - 0.6) < 1e-6 and track.confidence == 0.8
@@ -0,0 +1,65 @@
+import time
+
+from metrics import REGISTRY
+from window_control import ScreenCapture
+
+
+class FakeAdapter:
+    """记录查询次数的平台适配器；changed 为 True 时报告窗口被移动/缩放"""
+
+    platform = 'linux'
+
+    def __init__(self):
+        self.queries = 0
+        self.changed = False
+        self.rect = (10, 20, 410, 820)
+
+    def get_window_rect(self, window_info):
+        self.queries += 1
+        return self.rect
+
+    def geometry_changed(self, window_info):
+        changed, self.changed = self.changed, False
+        return changed
+
+
+def counts():
+    return (REGISTRY.counter('redpocket_geometry_cache_hits_total').value,
+            REGISTRY.counter('redpocket_geometry_cache_misses_total').value)
+
+
+def make_capture():
+    adapter = FakeAdapter()
+    capture = ScreenCapture(platform_adapter=adapter)
+    capture.set_window({'title': 'test'})
+    return capture, adapter
+
+
+def test_rect_is_cached_within_ttl_and_counted_as_metrics():
+    capture, adapter = make_capture()
+    hits, misses = counts()
+    for _ in range(5):
+        assert capture.get_window_rect() == (10, 20, 410, 820)
+    assert adapter.queries == 1
+    assert counts() == (hits + 5, misses)
+    assert capture.geometry_hit_rate == 5 / 6
+
+
+def test_cache_refreshes_on_geometry_change_invalidate_and_ttl():
+    capture, adapter = make_capture()
+    hits, misses = counts()
+
+    adapter.changed = True
+    adapter.rect = (0, 0, 300, 600)
+    assert capture.get_window_rect() == (0, 0, 300, 600)
+    assert adapter.queries == 2
+
+    capture.invalidate_geometry()
+    capture.get_window_rect()
+    assert adapter.queries == 3
+
+    capture.geometry_ttl = 0.01
+    time.sleep(0.02)
+    capture.get_window_rect()
+    assert adapter.queries == 4
+    assert counts() == (hits, misses + 3)
@@ -0,0 +1,259 @@
+"""
+目标跟踪 - 在检测流上做轻量的 IoU / 质心关联，给检测框分配稳定的 track ID
+
+每个 track 记录年龄、连续命中次数、平滑后的置信度和连续出现的起始时间，
+可以直接回答"这个按钮是否已经稳定出现了 N 毫秒"，
+不再需要"等待 N 秒后重新捕获、重新推理"的复查；
+track 上的 handled 标记则用来避免对同一个红包重复点击。
+
+关联按类别分别进行：先按 IoU 贪心匹配，剩余的再按质心距离（相对框尺寸）匹配，
+连续 max_misses 帧未匹配或超过 max_idle 秒未出现的 track 被移除；
+已处理的 track 保留 handled_ttl 秒，被弹窗遮挡后重新出现时仍能认出，不会被再次点击。
+"""
+import itertools
+
+import numpy as np
+
+
+class Track:
+    """
+    单个跟踪目标
+
+    Attributes:
+        track_id: 跟踪 ID（进程内递增）
+        class_name: 类别名称
+        bbox: 最近一次匹配的边界框 [x1, y1, x2, y2]（int）
+        confidence: 最近一次的原始置信度
+        smoothed_confidence: 指数平滑后的置信度
+        first_seen / last_seen: 首次 / 最近一次出现的时间戳
+        streak_since: 本次连续出现的起始时间戳（漏检后重置）
+        age: 自创建以来经过的帧数
+        hits: 累计匹配次数
+        hit_streak: 连续匹配次数
+        misses: 连续漏检次数
+        handled: 是否已处理（点击过）
+        handled_at: 最近一次处理的时间戳
+    """
+
+    __slots__ = ('track_id', 'class_name', 'bbox', 'confidence', 'smoothed_confidence',
+                 'first_seen', 'last_seen', 'streak_since', 'age', 'hits', 'hit_streak',
+                 'misses', 'handled', 'handled_at')
+
+    def __init__(self, track_id, class_name, bbox, confidence, timestamp):
+        self.track_id = track_id
+        self.class_name = class_name
+        self.bbox = bbox
+        self.confidence = confidence
+        self.smoothed_confidence = confidence
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.streak_since = timestamp
+        self.age = 1
+        self.hits = 1
+        self.hit_streak = 1
+        self.misses = 0
+        self.handled = False
+        self.handled_at = None
+
+    @property
+    def visible(self):
+        """本帧是否被匹配到"""
+        return self.misses == 0
+
+    def stable_for(self, now=None):
+        """连续出现的时长（秒）；处理过的目标从处理时刻重新计时"""
+        since = self.streak_since
+        if self.handled_at is not None and self.handled_at > since:
+            since = self.handled_at
+        return max(0.0, (self.last_seen if now is None else now) - since)
+
+    def as_detection(self):
+        """转换为与检测结果相同的字典格式，便于直接交给点击逻辑"""
+        return {
+            'bbox': list(self.bbox),
+            'confidence': self.smoothed_confidence,
+            'class_name': self.class_name,
+            'track_id': self.track_id,
+        }
+
+    def __repr__(self):
+        return (f"Track(#{self.track_id} {self.class_name} streak={self.hit_streak} "
+                f"conf={self.smoothed_confidence:.2f} handled={self.handled})")
+
+
+def _iou_matrix(a, b):
+    """a: (N, 4), b: (M, 4) → (N, M) IoU"""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+def _centroid_cost(a, b):
+    """质心距离除以两框平均对角线长度的一半 → (N, M)"""
+    ca = (a[:, :2] + a[:, 2:]) / 2
+    cb = (b[:, :2] + b[:, 2:]) / 2
+    dist = np.linalg.norm(ca[:, None, :] - cb[None, :, :], axis=2)
+    diag_a = np.linalg.norm(a[:, 2:] - a[:, :2], axis=1)
+    diag_b = np.linalg.norm(b[:, 2:] - b[:, :2], axis=1)
+    scale = (diag_a[:, None] + diag_b[None, :]) / 4
+    return dist / np.maximum(scale, 1e-6)
+
+
+def _greedy_match(score, threshold, higher_is_better=True):
+    """按分数贪心匹配，返回 [(row, col)]"""
+    if score.size == 0:
+        return []
+    flat = score.ravel()
+    order = np.argsort(-flat if higher_is_better else flat, kind='stable')
+    used_rows, used_cols, pairs = set(), set(), []
+    cols = score.shape[1]
+    for index in order:
+        value = flat[index]
+        if (value < threshold) if higher_is_better else (value > threshold):
+            break
+        row, col = divmod(int(index), cols)
+        if row in used_rows or col in used_cols:
+            continue
+        used_rows.add(row)
+        used_cols.add(col)
+        pairs.append((row, col))
+    return pairs
+
+
+class ObjectTracker:
+    """
+    IoU / 质心跟踪器
+
+    Args:
+        iou_threshold: IoU 匹配的最小值
+        centroid_threshold: 质心匹配的最大相对距离（相对两框平均半对角线）
+        smoothing: 置信度指数平滑系数（新值权重）
+        max_misses: 连续漏检多少帧后移除 track
+        max_idle: 超过多少秒未出现后移除 track
+        handled_ttl: 已处理的 track 在未出现后保留的秒数
+    """
+
+    def __init__(self, iou_threshold=0.3, centroid_threshold=0.5, smoothing=0.4,
+                 max_misses=5, max_idle=1.0, handled_ttl=30.0):
+        self.iou_threshold = iou_threshold
+        self.centroid_threshold = centroid_threshold
+        self.smoothing = smoothing
+        self.max_misses = max_misses
+        self.max_idle = max_idle
+        self.handled_ttl = handled_ttl
+        self._tracks = []
+        self._ids = itertools.count(1)
+        self.timestamp = None
+
+    def reset(self):
+        self._tracks = []
+        self.timestamp = None
+
+    def update(self, detections, timestamp):
+        """
+        用一帧的检测结果更新跟踪状态
+
+        Args:
+            detections: Detections 或字典列表
+            timestamp: 帧的捕获时间戳（秒）
+
+        Returns:
+            list[Track]: 当前所有 track（包括短暂漏检的）
+        """
+        self.timestamp = timestamp
+        by_class = {}
+        for det in detections:
+            by_class.setdefault(det['class_name'], []).append(det)
+
+        matched = set()
+        for class_name, dets in by_class.items():
+            tracks = [t for t in self._tracks if t.class_name == class_name]
+            boxes = np.array([d['bbox'] for d in dets], dtype=np.float32).reshape(-1, 4)
+            pairs = []
+            if tracks:
+                track_boxes = np.array([t.bbox for t in tracks], dtype=np.float32).reshape(-1, 4)
+                pairs = _greedy_match(_iou_matrix(track_boxes, boxes), self.iou_threshold)
+                rows = {r for r, _ in pairs}
+                cols = {c for _, c in pairs}
+                rest_rows = [r for r in range(len(tracks)) if r not in rows]
+                rest_cols = [c for c in range(len(dets)) if c not in cols]
+                if rest_rows and rest_cols:
+                    cost = _centroid_cost(track_boxes[rest_rows], boxes[rest_cols])
+                    pairs += [(rest_rows[r], rest_cols[c]) for r, c in
+                              _greedy_match(cost, self.centroid_threshold, higher_is_better=False)]
+
+            for row, col in pairs:
+                self._hit(tracks[row], dets[col], timestamp)
+                matched.add(id(tracks[row]))
+            used = {c for _, c in pairs}
+            for col, det in enumerate(dets):
+                if col not in used:
+                    track = Track(next(self._ids), class_name, [int(v) for v in det['bbox']],
+                                  float(det['confidence']), timestamp)
+                    self._tracks.append(track)
+                    matched.add(id(track))
+
+        alive = []
+        for track in self._tracks:
+            if id(track) not in matched:
+                track.age += 1
+                track.misses += 1
+                track.hit_streak = 0
+            idle = timestamp - track.last_seen
+            if track.handled:
+                if idle <= self.handled_ttl:
+                    alive.append(track)
+            elif track.misses <= self.max_misses and idle <= self.max_idle:
+                alive.append(track)
+        self._tracks = alive
+        return list(alive)
+
+    def _hit(self, track, det, timestamp):
+        if track.misses > 0:
+            track.streak_since = timestamp
+        confidence = float(det['confidence'])
+        track.bbox = [int(v) for v in det['bbox']]
+        track.confidence = confidence
+        track.smoothed_confidence += self.smoothing * (confidence - track.smoothed_confidence)
+        track.last_seen = timestamp
+        track.age += 1
+        track.hits += 1
+        track.hit_streak += 1
+        track.misses = 0
+
+    def tracks(self, class_name=None, visible_only=True):
+        """当前 track，可按类别筛选，按平滑置信度降序"""
+        result = [
+            t for t in self._tracks
+            if (class_name is None or t.class_name == class_name) and (t.visible or not visible_only)
+        ]
+        result.sort(key=lambda t: t.smoothed_confidence, reverse=True)
+        return result
+
+    def best(self, class_name, include_handled=True):
+        """本帧可见的某类别中平滑置信度最高的 track"""
+        for track in self.tracks(class_name):
+            if include_handled or not track.handled:
+                return track
+        return None
+
+    def stable(self, class_name, duration):
+        """
+        连续出现至少 duration 秒的 track（平滑置信度最高者），没有则返回 None
+
+        处理过的 track 从处理时刻重新计时，因此点击后按钮仍在时会在 duration 后再次返回。
+        """
+        for track in self.tracks(class_name):
+            if track.stable_for(self.timestamp) >= duration:
+                return track
+        return None
+
+    def mark_handled(self, track, timestamp=None):
+        track.handled = True
+        track.handled_at = self.timestamp if timestamp is None else timestamp
@@ -0,0 +1,263 @@
+"""
+窗口捕获与鼠标点击 - 不依赖 GUI 的窗口操作，供主程序和多窗口监控共用
+
+- ScreenCapture: 查找/设置目标窗口，缓存窗口位置，通过捕获后端抓取窗口画面
+- AutoClicker: 按窗口相对坐标点击，Windows 上用 win32api，否则退回 pyautogui
+
+pyautogui 只在退回时导入：没有图形会话的环境（回放帧源、模拟点击）也能使用本模块。
+"""
+import time
+import logging
+
+import cv2
+
+from capture_backends import create_capture_backend
+from frame_buffers import FrameRing
+from metrics import REGISTRY
+from platform_adapter import get_platform_adapter
+
+try:
+    import win32api
+    import win32con
+    HAS_WIN32 = True
+except ImportError:
+    HAS_WIN32 = False
+
+
+class ScreenCapture:
+    """
+    窗口捕获
+    
+    窗口位置缓存的命中/未命中次数同时计入 REGISTRY 的
+    redpocket_geometry_cache_hits_total / redpocket_geometry_cache_misses_total。
+
+    Args:
+        capture_backend: 捕获后端 'auto' / 'mss' / 'xshm'，'auto' 在 Linux 上优先使用 MIT-SHM
+        platform_adapter: 平台适配器，默认为 get_platform_adapter()
+    """
+    
+    def __init__(self, capture_backend='auto', platform_adapter=None):
+        self.platform_adapter = platform_adapter or get_platform_adapter()
+        self.window_info = None
+        self.window_rect = None
+        self.window_title = ""
+        self.capture_backend_name = capture_backend
+        self._capture_backend = None
+        self.frame_ring = FrameRing()
+        
+        self.geometry_ttl = 0.5
+        self.geometry_hits = 0
+        self.geometry_misses = 0
+        self._geometry_valid = False
+        self._geometry_time = 0.0
+    
+    def _get_capture_backend(self):
+        if self._capture_backend is None:
+            self._capture_backend = create_capture_backend(self.capture_backend_name)
+            logging.info(f"捕获后端: {self._capture_backend.name}")
+        return self._capture_backend
+    
+    def set_capture_backend(self, name):
+        """切换捕获后端，下一次捕获时生效"""
+        self.reset_mss()
+        self._capture_backend = None
+        self.capture_backend_name = name
+    
+    def reset_mss(self):
+        """释放捕获后端持有的资源（窗口变化或停止监控时调用）"""
+        if self._capture_backend is not None:
+            self._capture_backend.close()
+        
+    def find_wechat_window(self):
+        """查找微信窗口（跨平台）"""
+        window_info = self.platform_adapter.find_target_window('微信')
+        if window_info:
+            self.set_window(window_info)
+            return True
+        return False
+    
+    def set_window(self, window_info):
+        """设置要捕获的窗口（platform_adapter 返回的窗口信息）"""
+        self.window_info = window_info
+        self.window_title = window_info.get('title', '')
+        self.get_window_rect(force=True)
+    
+    def set_window_by_point(self, x, y):
+        """通过坐标设置窗口（目前仅 Windows 支持）"""
+        if self.platform_adapter.platform.startswith('win'):
+            try:
+                import win32gui
+                hwnd = win32gui.WindowFromPoint((x, y))
+                while win32gui.GetParent(hwnd) != 0:
+                    hwnd = win32gui.GetParent(hwnd)
+                
+                if hwnd and win32gui.IsWindowVisible(hwnd):
+                    self.window_info = {'hwnd': hwnd}
+                    self.window_title = win32gui.GetWindowText(hwnd)
+                    self.get_window_rect(force=True)
+                    return True
+            except Exception as e:
+                logging.warning(f"通过坐标选择窗口失败: {e}")
+        return False
+    
+    def get_window_rect(self, force=False):
+        """
+        获取窗口位置（跨平台，带缓存）
+        
+        缓存在以下情况下失效：超过 geometry_ttl 秒、平台适配器报告窗口移动/缩放、
+        捕获失败或调用 invalidate_geometry()。
+        
+        Args:
+            force: 为 True 时忽略缓存，直接查询窗口位置
+        """
+        if not self.window_info:
+            return None
+        
+        now = time.monotonic()
+        if (not force and self._geometry_valid
+                and now - self._geometry_time < self.geometry_ttl
+                and not self.platform_adapter.geometry_changed(self.window_info)):
+            self.geometry_hits += 1
+            REGISTRY.counter('redpocket_geometry_cache_hits_total', '窗口位置缓存命中次数').inc()
+            return self.window_rect
+        
+        self.geometry_misses += 1
+        REGISTRY.counter('redpocket_geometry_cache_misses_total', '窗口位置缓存未命中次数').inc()
+        rect = self.platform_adapter.get_window_rect(self.window_info)
+        if rect:
+            self.window_rect = rect
+            self._geometry_valid = True
+            self._geometry_time = now
+            return rect
+        self._geometry_valid = False
+        return None
+    
+    def invalidate_geometry(self):
+        """使窗口位置缓存失效，下一次 get_window_rect() 会重新查询"""
+        self._geometry_valid = False
+    
+    @property
+    def geometry_hit_rate(self):
+        """窗口位置缓存命中率"""
+        total = self.geometry_hits + self.geometry_misses
+        return self.geometry_hits / total if total else 0.0
+    
+    def capture_window(self):
+        """
+        捕获窗口内容（跨平台）
+
+        直接在捕获后端的原始缓冲区（mss 截图或 MIT-SHM 共享内存段）上做
+        BGRA→BGR 转换，结果写入复用的帧缓冲环，返回的图像是只读视图，需要修改时请先 copy()。
+        """
+        if not self.window_info:
+            return None
+            
+        rect = self.get_window_rect()
+        if not rect:
+            return None
+            
+        left, top, right, bottom = rect
+        width = right - left
+        height = bottom - top
+        
+        if width <= 0 or height <= 0:
+            self.invalidate_geometry()
+            return None
+        
+        try:
+            bgra = self._get_capture_backend().grab(self.window_info, rect)
+            im = self.frame_ring.convert(bgra, cv2.COLOR_BGRA2BGR)
+            return im, rect
+        except Exception as e:
+            self.invalidate_geometry()
+            return None
+    
+    def bring_window_to_front(self):
+        """将窗口带到前台（跨平台）"""
+        if self.window_info:
+            self.platform_adapter.bring_window_to_front(self.window_info)
+    
+    def set_always_on_top(self, enable=True):
+        """设置窗口置顶（目前仅 Windows 支持）"""
+        if self.window_info and self.platform_adapter.platform.startswith('win'):
+            try:
+                import win32gui
+                import win32con
+                hwnd = self.window_info.get('hwnd')
+                if hwnd:
+                    if enable:
+                        win32gui.SetWindowPos(
+                            hwnd,
+                            win32con.HWND_TOPMOST,
+                            0, 0, 0, 0,
+                            win32con.SWP_NOMOVE | win32con.SWP_NOSIZE
+                        )
+                    else:
+                        win32gui.SetWindowPos(
+                            hwnd,
+                            win32con.HWND_NOTOPMOST,
+                            0, 0, 0, 0,
+                            win32con.SWP_NOMOVE | win32con.SWP_NOSIZE
+                        )
+            except Exception as e:
+                pass
+
+
+class AutoClicker:
+    """
+    鼠标点击
+    
+    Attributes:
+        dry_run: 为 True 时只记录点击而不移动鼠标（回放/合成帧源时使用）
+    """
+    
+    def __init__(self, screen_capture):
+        self.screen_capture = screen_capture
+        self.click_delay = 0.02
+        self.dry_run = False
+        
+    def click_at_position(self, x, y, relative_to_window=True):
+        start = time.perf_counter()
+        success = self._click(x, y, relative_to_window)
+        REGISTRY.stage('click').record(time.perf_counter() - start)
+        if success:
+            REGISTRY.counter('redpocket_clicks_total', '点击次数').inc()
+        else:
+            REGISTRY.failure('click')
+        return success
+    
+    def _click(self, x, y, relative_to_window):
+        if relative_to_window and self.screen_capture.window_rect:
+            window_x, window_y, _, _ = self.screen_capture.window_rect
+            x += window_x
+            y += window_y
+        
+        if self.dry_run:
+            logging.debug(f"[模拟点击] ({x}, {y})")
+            return True
+        
+        try:
+            if not HAS_WIN32:
+                raise RuntimeError('win32api 不可用')
+            win32api.SetCursorPos((x, y))
+            time.sleep(0.01)
+            win32api.mouse_event(win32con.MOUSEEVENTF_LEFTDOWN, x, y, 0, 0)
+            time.sleep(0.01)
+            win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP, x, y, 0, 0)
+            time.sleep(self.click_delay)
+            return True
+        except Exception as e:
+            try:
+                import pyautogui
+                pyautogui.click(x, y)
+                time.sleep(self.click_delay)
+                return True
+            except:
+                return False
+    
+    def click_center(self, bbox, relative_to_window=True):
+        x1, y1, x2, y2 = bbox
+        center_x = (x1 + x2) // 2
+        center_y = (y1 + y2) // 2
+        success = self.click_at_position(center_x, center_y, relative_to_window)
+        return center_x, center_y, success